@@ -0,0 +1,226 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+
+import gymnasium as gym
+import numpy as np
+
+# Don't delete this! It allows the environment to be registered
+import octospace
+from octospace.envs.game_config import VERSION, BOARD_SIZE, PLAYER_1_ORIGIN, PLAYER_2_ORIGIN
+
+from dummy_agent import Agent as DummyAgent
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is not reported there
+    resource = None
+
+
+# Ships of the benchmark fleets are placed randomly in this distance from their base
+SPAWN_RANGE = 15
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Benchmark the step throughput of the environment')
+    parser.add_argument('--agents', type=str, nargs='+', default=['dummy', 'random'], help='Agents controlling both players: dummy, random')
+    parser.add_argument('--fleet_sizes', type=int, nargs='+', default=[10, 100, 500], help='Number of ships of each player')
+    parser.add_argument('--n_steps', type=int, default=200, help='Number of measured steps in each scenario')
+    parser.add_argument('--n_resets', type=int, default=10, help='Number of measured resets in each scenario')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the maps and the random agent')
+    parser.add_argument('--profile', action='store_true', help='Record the time spent in every phase of the step')
+    parser.add_argument('--output', type=str, default=None, help='Path to the JSON file with the results')
+    parser.add_argument('--baseline', type=str, default=None, help='Path to the JSON file with the results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed relative slowdown compared to the baseline')
+    return parser
+
+
+class RandomAgent:
+    def __init__(self, side: int, seed: int = 0):
+        self.side = side
+        self.rng = np.random.default_rng(seed + side)
+
+    def get_action(self, obs: dict, info = {}) -> dict:
+        ships_actions = []
+        for ship in obs["allied_ships"]:
+            if self.rng.random() < 0.3:
+                ships_actions.append([ship[0], 1, int(self.rng.integers(0, 4))])
+            else:
+                ships_actions.append([ship[0], 0, int(self.rng.integers(0, 4)), int(self.rng.integers(1, 4))])
+        return {
+            "ships_actions": ships_actions,
+            "construction": int(self.rng.integers(0, 2))
+        }
+
+
+def _spawn_fleets(env, fleet_size: int, rng: np.random.Generator):
+    """
+    Adds ships to both players, so each of them has fleet_size ships, placed randomly around their bases
+    """
+    for fleet, origin in [(env._player_1_fleet, PLAYER_1_ORIGIN), (env._player_2_fleet, PLAYER_2_ORIGIN)]:
+        for _ in range(fleet_size - len(fleet)):
+            x, y = np.clip(origin + rng.integers(-SPAWN_RANGE, SPAWN_RANGE + 1, size=2), 0, BOARD_SIZE - 1)
+            fleet.add(ship_id=fleet.new_ship_id(), x=int(x), y=int(y))
+
+
+def _latency_stats(latencies: list) -> dict:
+    latencies = np.array(latencies) * 1e3
+    return {
+        "mean": float(np.mean(latencies)),
+        "p50": float(np.percentile(latencies, 50)),
+        "p99": float(np.percentile(latencies, 99)),
+        "max": float(np.max(latencies))
+    }
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak_rss / 2 ** 20 if sys.platform == 'darwin' else peak_rss / 2 ** 10
+
+
+def run_scenario(scenario: dict) -> dict:
+    """
+    Plays a match with the given agents and fleet sizes, measuring the time of every step and reset
+    """
+    agent, fleet_size, n_steps, n_resets, seed, profile = (scenario["agent"], scenario["fleet_size"], scenario["n_steps"],
+                                                           scenario["n_resets"], scenario["seed"], scenario["profile"])
+    gym.logger.min_level = 40
+    rng = np.random.default_rng(seed)
+
+    env = gym.make('OctoSpace-v0', player_1_id=46, player_2_id=47, max_steps=2000, disable_env_checker=True)
+    game = env.unwrapped
+
+    reset_latencies = []
+    for i in range(n_resets):
+        start = time.perf_counter()
+        env.reset(seed=seed if i == 0 else None)
+        reset_latencies.append(time.perf_counter() - start)
+
+    if agent == 'dummy':
+        agent_1, agent_2 = DummyAgent(side=0), DummyAgent(side=1)
+    else:
+        agent_1, agent_2 = RandomAgent(side=0, seed=seed), RandomAgent(side=1, seed=seed)
+
+    profiler = game.enable_profiling() if profile else None
+
+    step_latencies = []
+    ships = []
+    env.reset()
+    _spawn_fleets(game, fleet_size=fleet_size, rng=rng)
+    obs = game._get_obs()
+
+    while len(step_latencies) < n_steps:
+        action_1 = agent_1.get_action(obs["player_1"])
+        action_2 = agent_2.get_action(obs["player_2"])
+
+        start = time.perf_counter()
+        obs, reward, terminated, _, _ = env.step({"player_1": action_1, "player_2": action_2})
+        step_latencies.append(time.perf_counter() - start)
+        ships.append([len(game._player_1_fleet), len(game._player_2_fleet)])
+
+        if terminated or sum(reward.values()) != 0:
+            env.reset()
+            _spawn_fleets(game, fleet_size=fleet_size, rng=rng)
+            obs = game._get_obs()
+
+    env.close()
+
+    result = {
+        "agent": agent,
+        "fleet_size": fleet_size,
+        "seed": seed,
+        "steps": n_steps,
+        "steps_per_sec": n_steps / sum(step_latencies),
+        "step_latency_ms": _latency_stats(step_latencies),
+        "reset_latency_ms": _latency_stats(reset_latencies),
+        "mean_ships": np.mean(ships, axis=0).tolist(),
+        "peak_rss_mb": _peak_rss_mb()
+    }
+    if profiler is not None:
+        result["phases_mean_ms"] = {name: phase["mean_time"] * 1e3 for name, phase in profiler.aggregate()["phases"].items()}
+    return result
+
+
+def compare_with_baseline(results: list, baseline: list, tolerance: float) -> list:
+    """
+    Returns descriptions of all scenarios, which got slower than in the baseline by more than the tolerance
+    """
+    baseline = {(result["agent"], result["fleet_size"]): result for result in baseline}
+
+    regressions = []
+    for result in results:
+        base = baseline.get((result["agent"], result["fleet_size"]))
+        if base is None:
+            continue
+        if result["steps_per_sec"] < base["steps_per_sec"] * (1 - tolerance):
+            regressions.append(f'{result["agent"]}/{result["fleet_size"]}: steps/sec {result["steps_per_sec"]:.1f} '
+                               f'(baseline {base["steps_per_sec"]:.1f})')
+        if result["step_latency_ms"]["p99"] > base["step_latency_ms"]["p99"] * (1 + tolerance):
+            regressions.append(f'{result["agent"]}/{result["fleet_size"]}: p99 step latency '
+                               f'{result["step_latency_ms"]["p99"]:.2f} ms (baseline {base["step_latency_ms"]["p99"]:.2f} ms)')
+    return regressions
+
+
+def run_benchmark(
+        agents: list,
+        fleet_sizes: list,
+        n_steps: int = 200,
+        n_resets: int = 10,
+        seed: int = 0,
+        profile: bool = False
+) -> dict:
+    scenarios = [{"agent": agent, "fleet_size": fleet_size, "n_steps": n_steps, "n_resets": n_resets, "seed": seed,
+                  "profile": profile} for agent in agents for fleet_size in fleet_sizes]
+
+    # Every scenario runs in a fresh process, so the peak memory usage is measured separately for each of them
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes=1, maxtasksperchild=1) as pool:
+        results = pool.map(run_scenario, scenarios, chunksize=1)
+
+    return {
+        "version": VERSION,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results
+    }
+
+
+if __name__ == '__main__':
+    parse = get_parser()
+    args = parse.parse_args()
+
+    benchmark = run_benchmark(agents=args.agents, fleet_sizes=args.fleet_sizes, n_steps=args.n_steps,
+                              n_resets=args.n_resets, seed=args.seed, profile=args.profile)
+
+    print(f'{"agent":<8}{"ships":>7}{"steps/s":>10}{"p50 [ms]":>10}{"p99 [ms]":>10}{"reset [ms]":>12}{"RSS [MB]":>10}')
+    for result in benchmark["results"]:
+        rss = f'{result["peak_rss_mb"]:.1f}' if result["peak_rss_mb"] is not None else '-'
+        print(f'{result["agent"]:<8}{result["fleet_size"]:>7}{result["steps_per_sec"]:>10.1f}'
+              f'{result["step_latency_ms"]["p50"]:>10.2f}{result["step_latency_ms"]["p99"]:>10.2f}'
+              f'{result["reset_latency_ms"]["mean"]:>12.2f}{rss:>10}')
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(benchmark, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(benchmark["results"], json.load(f)["results"], tolerance=args.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}')
+        if regressions:
+            sys.exit(1)
+
+    """
+    Example execution:
+        python benchmark.py --output benchmark.json
+        python benchmark.py --baseline benchmark.json
+    """
@@ -1,10 +1,10 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
+import os
 import random
 import numpy as np
-from collections import deque
-from utils import obs_to_state, val_to_action, action_to_val
+from utils import obs_to_states, val_to_action, action_to_val
 import datetime
 
 
@@ -22,17 +22,61 @@ class DQN(nn.Module):
 
 
 class ReplayBuffer:
-    def __init__(self, capacity):
-        self.buffer = deque(maxlen=capacity)
+    """
+    Ring buffer of the experiences stored in preallocated arrays, the oldest experiences are overwritten once it is full.
+
+    Args:
+        capacity: maximal number of stored experiences
+        state_dim: length of the states
+        path: optional directory, in which the arrays are kept as memory-mapped .npy files, so the buffer can be larger
+            than the memory. Experiences already stored there are loaded again
+    """
+
+    def __init__(self, capacity, state_dim=28, path=None):
+        self.capacity = capacity
+        columns = {
+            "states": ((capacity, state_dim), np.float32),
+            "actions": ((capacity,), np.int64),
+            "rewards": ((capacity,), np.float32),
+            "next_states": ((capacity, state_dim), np.float32),
+            "dones": ((capacity,), np.float32),
+            # Number of stored experiences and the index of the next one
+            "counters": ((2,), np.int64)
+        }
+        for name, (shape, dtype) in columns.items():
+            if path is None:
+                array = np.zeros(shape, dtype=dtype)
+            else:
+                os.makedirs(path, exist_ok=True)
+                filename = os.path.join(path, f"{name}.npy")
+                exists = os.path.exists(filename)
+                array = np.lib.format.open_memmap(filename, mode="r+" if exists else "w+", dtype=dtype, shape=None if exists else shape)
+                assert array.shape == shape, f"{filename} holds a buffer of a different shape"
+            setattr(self, name, array)
+
+        self._rng = np.random.default_rng()
 
     def add(self, experience):
-        self.buffer.append(experience)
+        state, action, reward, next_state, done = experience
+        position = self.counters[1]
+        self.states[position] = state
+        self.actions[position] = action
+        self.rewards[position] = reward
+        self.next_states[position] = next_state
+        self.dones[position] = done
+        self.counters[:] = min(self.counters[0] + 1, self.capacity), (position + 1) % self.capacity
 
     def sample(self, batch_size):
-        return random.sample(self.buffer, batch_size)
+        """
+        Returns a batch of random experiences as tensors: states, actions, rewards, next states and dones
+        """
+        # Sorted indices read the memory-mapped arrays sequentially
+        indices = np.sort(self._rng.choice(self.size(), batch_size, replace=False))
+        return tuple(torch.from_numpy(np.asarray(array[indices]))
+                     for array in (self.states, self.actions, self.rewards, self.next_states, self.dones))
 
     def size(self):
-        return len(self.buffer)
+        return int(self.counters[0])
 
 
 class Ship:
@@ -55,15 +99,24 @@ class Ship:
         You should implement your logic here to decide the best action.
         This is typically the epsilon-greedy policy.
         """
-        if random.random() < self.epsilon:
-            # Exploration: Choose a random action
-            return random.randint(0, self.action_dim - 1)
-        else:
-            # Exploitation: Choose the best action based on the current Q-values
-            with torch.no_grad():
-                state_tensor = torch.tensor(state, dtype=torch.float32).unsqueeze(0)
-                q_values = self.q_network(state_tensor)
-                return torch.argmax(q_values, dim=1).item()
+        return int(self.predict_actions([state])[0])
+
+    def predict_actions(self, states) -> np.ndarray:
+        """
+        Predict actions for the states of many ships at once, with a single forward pass of the Q-network.
+        Every ship explores independently with the probability epsilon.
+        """
+        device = next(self.q_network.parameters()).device
+        states = torch.as_tensor(np.asarray(states, dtype=np.float32).reshape(-1, self.state_dim), device=device)
+
+        # Exploitation: Choose the best actions based on the current Q-values
+        with torch.no_grad():
+            actions = torch.argmax(self.q_network(states), dim=1).cpu()
+
+        # Exploration: Replace some of them with random actions
+        explore = torch.rand(len(actions)) < self.epsilon
+        actions[explore] = torch.randint(0, self.action_dim, (int(explore.sum()),))
+        return actions.numpy()
 
     def update(self):
         """
@@ -72,16 +125,11 @@ class Ship:
         if self.replay_buffer.size() < self.batch_size:
             return  # Not enough samples to update
 
-        # Sample a batch from the replay buffer
-        batch = self.replay_buffer.sample(self.batch_size)
-        states, actions, rewards, next_states, dones = zip(*batch)
-
-        # Convert batch to tensors
-        states = torch.tensor(states, dtype=torch.float32)
-        actions = torch.tensor(actions, dtype=torch.long)
-        rewards = torch.tensor(rewards, dtype=torch.float32)
-        next_states = torch.tensor(next_states, dtype=torch.float32)
-        dones = torch.tensor(dones, dtype=torch.float32)
+        # Sample a batch from the replay buffer, already as tensors
+        device = next(self.q_network.parameters()).device
+        states, actions, rewards, next_states, dones = (
+            tensor.to(device) for tensor in self.replay_buffer.sample(self.batch_size)
+        )
 
         # Compute Q-values for the current states
         q_values = self.q_network(states)
@@ -136,16 +184,21 @@ class Agent:
     target_network = None
 
 
-    def __init__(self, side: int):
+    def __init__(self, side: int, buffer_path: str = None):
         """
         :param side: Indicates whether the player is on left side (0) or right side (1)
+        :param buffer_path: optional directory for a memory-mapped replay buffer, which can be larger than the memory
+            (see ReplayBuffer). By default the buffer is kept in the memory
         """
         self.side = side
+        self.buffer_path = buffer_path
 
     def get_action(self, obs: dict, info: dict = None) -> dict:
-        ship = Ship(
-            self.q_network, self.target_network, self.optimizer, self.replay_buffer
-        )
+        ship = self.ship
+
+        # States of the ships are used both for learning and predicting the actions
+        ship_ids = [id for id, *_ in obs["allied_ships"]]
+        states = obs_to_states(obs, self.side)
 
         if info:
             reward = info["reward"]
@@ -155,13 +208,15 @@ class Agent:
 
             # print(reward)
 
-            for id, x, y, *_ in obs["allied_ships"]:
+            prev_states = dict(zip([id for id, *_ in prev_obs["allied_ships"]], obs_to_states(prev_obs, self.side)))
+
+            for id, state in zip(ship_ids, states):
                 if any(map(lambda x: x[0] == id, prev_obs["allied_ships"])) and id in reward.keys():
                     ship.train(
-                        obs_to_state(prev_obs, id, self.side),
+                        prev_states[id],
                         action_to_val(list(filter(lambda x: x[0] == id, prev_actions["ships_actions"]))[0]),
                         reward[id],
-                        obs_to_state(obs, id, self.side),
+                        state,
                         reward[id] > 100,
                     )
             
@@ -179,20 +234,8 @@ class Agent:
             # Periodically update target network
             # if random.random() < 0.1: ship.update_target_network()
 
-        ship = Ship(
-            self.q_network, self.target_network, self.optimizer, self.replay_buffer
-        )
-
-        ships_actions = []
-
-        for id, x, y, *_ in obs["allied_ships"]:
-            state = obs_to_state(obs, id, self.side)
-            # print(len(state))
-            # print(state)
-            # print(len(state))
-            
-            action = val_to_action(id, ship.predict_action(state))
-            ships_actions.append(action)
+        # All ships are handled by a single forward pass, instead of one per ship
+        ships_actions = [val_to_action(id, int(val)) for id, val in zip(ship_ids, ship.predict_actions(states))]
 
         if info and random.random() < 0.1:
             ship.update_target_network()
@@ -209,6 +252,31 @@ class Agent:
         """
         filename = abs_path + "/agents32/7_37.pth"
 
+        self._set_hyperparameters()
+
+        if Agent.target_network is None:
+            Agent.target_network = DQN(self.state_dim, self.action_dim)
+            Agent.target_network.load_state_dict(torch.load(filename))
+        self.target_network = Agent.target_network
+        # self.target_network.load_state_dict(torch.load(filename))
+        print(f"Model loaded from {filename}")
+        self._setup_networks()
+
+    def load_checkpoint(self, filename: str):
+        """
+        Loads the weights from a single checkpoint (e.g. agents/1_15.pth). Unlike load, the target network isn't shared
+        with the other agents, so agents with different checkpoints can play against each other.
+
+        :param filename:
+        :return:
+        """
+        self._set_hyperparameters()
+
+        self.target_network = DQN(self.state_dim, self.action_dim)
+        self.target_network.load_state_dict(torch.load(filename, map_location="cpu"))
+        self._setup_networks()
+
+    def _set_hyperparameters(self):
         self.state_dim = 28
         self.action_dim = 17
         self.epsilon = 0.1  # Exploration factor
@@ -217,12 +285,7 @@ class Agent:
         self.batch_size = 256
         self.buffer_size = 10000
 
-        if Agent.target_network is None:
-            Agent.target_network = DQN(self.state_dim, self.action_dim)
-            Agent.target_network.load_state_dict(torch.load(filename))
-        self.target_network = Agent.target_network
-        # self.target_network.load_state_dict(torch.load(filename))
-        print(f"Model loaded from {filename}")
+    def _setup_networks(self):
         self.q_network = DQN(self.state_dim, self.action_dim)
         self.q_network.load_state_dict(self.target_network.state_dict())
 
@@ -230,7 +293,12 @@ class Agent:
         self.optimizer = optim.Adam(self.q_network.parameters(), lr=self.lr)
 
         # Replay buffer
-        self.replay_buffer = ReplayBuffer(self.buffer_size)
+        self.replay_buffer = ReplayBuffer(self.buffer_size, self.state_dim, path=self.buffer_path)
+
+        # Networks are shared by all ships of the agent
+        self.ship = Ship(
+            self.q_network, self.target_network, self.optimizer, self.replay_buffer
+        )
 
     def eval(self):
         """
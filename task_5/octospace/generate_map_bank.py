@@ -0,0 +1,28 @@
+import argparse
+
+from octospace.envs.map_bank import generate_map_bank
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Generate maps in advance, to be loaded by the environment')
+    parser.add_argument('path', type=str, help='Path to the created .npy file')
+    parser.add_argument('--n_maps', type=int, default=1000, help='Number of maps to generate')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the map generation')
+    return parser
+
+
+if __name__ == '__main__':
+    parse = get_parser()
+    args = parse.parse_args()
+
+    generate_map_bank(path=args.path, n_maps=args.n_maps, seed=args.seed)
+    print(f'Saved {args.n_maps} maps to {args.path}')
+
+    """
+    Example execution:
+        python generate_map_bank.py maps.npy --n_maps=1000
+        
+    The maps can be then used with:
+        env = gym.make('OctoSpace-v0', player_1_id=46, player_2_id=47, map_bank='maps.npy')
+        env.reset(options={'map_index': 0})
+    """
@@ -3,4 +3,5 @@ from gymnasium.envs.registration import register
 register(
     id="OctoSpace-v0",
     entry_point="octospace.envs:OctoSpaceEnv",
+    vector_entry_point="octospace.envs:OctoSpaceVectorEnv",
 )
@@ -1 +1,5 @@
-from octospace.envs.octospace import OctoSpaceEnv
\ No newline at end of file
+from octospace.envs.octospace import OctoSpaceEnv
+from octospace.envs.vector import OctoSpaceVectorEnv
+from octospace.envs.profiler import StepProfiler
+from octospace.envs.map_bank import MapBank, generate_map_bank
+from octospace.envs.match_recording import MatchRecorder, MatchReplay
@@ -0,0 +1,193 @@
+import weakref
+
+import numpy as np
+import pygame
+
+from octospace.envs.game_config import BOARD_SIZE, WINDOW_SIZE, RF_CODING_TO_ID
+from octospace.envs.map_assets import (BACKGROUND, LAND, ASTEROIDS, ROUGH_TERRAIN, RESOURCE_FIELDS_MARKERS, IONIZED_FIELDS,
+                                       TEAM_COLORS)
+from octospace.envs.rendering import _render_background, _render_planets, _render_planet_occupation, _render_players
+from octospace.envs.fleet import Fleet
+
+
+# Images are painted onto a canvas padded with this many pixels on every side, so they never have to be clipped
+CANVAS_MARGIN = 128
+
+# Pixels of the images, which are more transparent than that, are not painted
+ALPHA_THRESHOLD = 128
+
+
+class _Sprite:
+    """
+    Opaque pixels of an image: their offsets in the flattened canvas (relative to the upper left corner of the image)
+    and their colors
+    """
+
+    def __init__(self, surface: pygame.Surface, stride: int):
+        if not surface.get_flags() & pygame.SRCALPHA:
+            # Transparency of the images without the alpha channel (e.g. texts) is given by their color key
+            rgba_surface = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
+            rgba_surface.blit(surface, (0, 0))
+            surface = rgba_surface
+
+        rows, cols = np.nonzero(pygame.surfarray.array_alpha(surface).T >= ALPHA_THRESHOLD)
+        self.offsets = rows * stride + cols
+        self.colors = pygame.surfarray.array3d(surface).transpose(1, 0, 2)[rows, cols]
+
+
+class ArrayCanvas:
+    """
+    Headless counterpart of BoardCanvas, which paints the frames with NumPy into a reusable buffer.
+
+    The terrain is drawn with pygame only once into a static layer, which is rebuilt when the map changes. The canvas
+    can be passed to the rendering functions in place of a pygame Surface: images blitted onto it are collected and
+    painted all at once in end_frame, from their opaque pixels extracted on the first use of every image. Semi-transparent
+    pixels of the images are therefore either painted as opaque or skipped.
+    """
+
+    def __init__(self):
+        size = WINDOW_SIZE + 2 * CANVAS_MARGIN
+        self._buffer = np.zeros((size, size, 3), dtype=np.uint8)
+        self._static_layer = np.zeros_like(self._buffer)
+        # Rectangles returned by blit, kept only for the compatibility with BoardCanvas
+        self.dirty_rects = []
+
+        self._terrain: np.ndarray = None
+        self._state_ids: np.ndarray = None
+
+        self._sprites = weakref.WeakKeyDictionary()
+        self._offsets = []
+        self._colors = []
+
+    @property
+    def frame(self) -> np.ndarray:
+        """
+        Last painted frame of shape (WINDOW_SIZE, WINDOW_SIZE, 3), it is overwritten by the next frame
+        """
+        return self._buffer[CANVAS_MARGIN:CANVAS_MARGIN + WINDOW_SIZE, CANVAS_MARGIN:CANVAS_MARGIN + WINDOW_SIZE]
+
+    def begin_frame(
+            self,
+            game_map: np.ndarray,
+            state_ids_map: np.ndarray,
+            planets_centers: np.ndarray,
+            player_1_id: int,
+            player_2_id: int
+    ) -> "ArrayCanvas":
+        """
+        Starts a new frame with the terrain, planets occupation and players
+
+        :return: canvas, onto which the rest of the frame has to be drawn
+        """
+        # Ownership bits are not a part of the terrain
+        terrain = game_map & 63
+        if self._state_ids is not state_ids_map or not np.array_equal(terrain, self._terrain):
+            static_layer = pygame.Surface((WINDOW_SIZE, WINDOW_SIZE))
+            _render_background(static_layer)
+            _render_planets(static_layer, game_map=game_map, state_ids_map=state_ids_map)
+            self._static_layer[CANVAS_MARGIN:CANVAS_MARGIN + WINDOW_SIZE, CANVAS_MARGIN:CANVAS_MARGIN + WINDOW_SIZE] = (
+                pygame.surfarray.array3d(static_layer).transpose(1, 0, 2))
+            self._terrain = terrain
+            self._state_ids = state_ids_map
+
+        self.dirty_rects.clear()
+        self._offsets.clear()
+        self._colors.clear()
+
+        _render_planet_occupation(self, game_map=game_map, planets_centers=planets_centers, player_1_id=player_1_id,
+                                  player_2_id=player_2_id)
+        _render_players(self, player_1_id=player_1_id, player_2_id=player_2_id)
+        return self
+
+    def blit(self, source: pygame.Surface, dest: tuple, area=None, special_flags: int = 0):
+        sprite = self._sprites.get(source)
+        if sprite is None:
+            sprite = _Sprite(source, stride=self._buffer.shape[1])
+            self._sprites[source] = sprite
+
+        self._offsets.append(sprite.offsets + ((dest[1] + CANVAS_MARGIN) * self._buffer.shape[1] + dest[0] + CANVAS_MARGIN))
+        self._colors.append(sprite.colors)
+
+    def get_rect(self) -> pygame.Rect:
+        return pygame.Rect(0, 0, WINDOW_SIZE, WINDOW_SIZE)
+
+    def end_frame(self) -> np.ndarray:
+        """
+        Paints all images blitted since begin_frame, in the order of blitting
+
+        :return: view of the painted frame, see frame
+        """
+        np.copyto(self._buffer, self._static_layer)
+        if self._offsets:
+            # Later images overwrite the earlier ones, as every pixel keeps the last value assigned to it
+            self._buffer.reshape(-1, 3)[np.concatenate(self._offsets)] = np.concatenate(self._colors)
+        return self.frame
+
+
+def _average_color(surface: pygame.Surface) -> np.ndarray:
+    colors = pygame.surfarray.array3d(surface).reshape(-1, 3).astype(float)
+    if not surface.get_flags() & pygame.SRCALPHA:
+        return colors.mean(axis=0)
+    alpha = pygame.surfarray.array_alpha(surface).reshape(-1).astype(float)
+    return (colors * alpha[:, None]).sum(axis=0) / alpha.sum()
+
+
+def _get_terrain_palette() -> np.ndarray:
+    """
+    Returns colors of the tiles for every value of the terrain bits of the map (map & 63)
+    """
+    space_color = _average_color(BACKGROUND)
+    land_color = np.mean([_average_color(image) for image in LAND.values()], axis=0)
+
+    palette = np.zeros((64, 3))
+    for terrain in range(64):
+        if terrain & 3 == 1:
+            if terrain & 57 in RF_CODING_TO_ID:
+                palette[terrain] = _average_color(RESOURCE_FIELDS_MARKERS[RF_CODING_TO_ID[terrain & 57]])
+            else:
+                palette[terrain] = land_color
+        elif terrain & 3 == 2:
+            palette[terrain] = np.mean([_average_color(image) for image in ASTEROIDS.values()], axis=0)
+        elif terrain & 3 == 3:
+            palette[terrain] = _average_color(ROUGH_TERRAIN[0])
+        elif terrain & 4 == 4:
+            palette[terrain] = np.mean([_average_color(image) for image in IONIZED_FIELDS.values()], axis=0)
+        else:
+            palette[terrain] = space_color
+    return palette.astype(np.uint8)
+
+
+class TileCanvas:
+    """
+    Headless renderer of observation-style frames, with one pixel per tile of the board.
+
+    Tiles are colored with the average color of their images, planets are tinted with the color of their owner and
+    ships are drawn as single pixels in the color of their player.
+    """
+
+    def __init__(self):
+        self._palette = _get_terrain_palette()
+        self._frame = np.zeros((BOARD_SIZE, BOARD_SIZE, 3), dtype=np.uint8)
+
+    def render(
+            self,
+            game_map: np.ndarray,
+            player_1_fleet: Fleet,
+            player_2_fleet: Fleet,
+            player_1_id: int,
+            player_2_id: int
+    ) -> np.ndarray:
+        """
+        :return: frame of shape (BOARD_SIZE, BOARD_SIZE, 3), it is overwritten by the next frame
+        """
+        frame = self._frame
+        np.take(self._palette, game_map & 63, axis=0, out=frame)
+
+        for ownership_bit, fleet, team_id in [(64, player_1_fleet, player_1_id), (128, player_2_fleet, player_2_id)]:
+            team_color = np.array(TEAM_COLORS[team_id][:3], dtype=np.uint16)
+            owned = game_map & ownership_bit == ownership_bit
+            frame[owned] = (frame[owned] + team_color) // 2
+
+            slots = fleet.alive_slots()
+            frame[fleet.y[slots], fleet.x[slots]] = team_color
+        return frame
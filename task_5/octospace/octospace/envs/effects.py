@@ -0,0 +1,141 @@
+DEATH_EFFECT = 0
+HEALING_EFFECT = 1
+FIRING_EFFECT = 2
+CAPTURE_EFFECT = 3
+SPACE_JUMP_EFFECT = 4
+
+# Number of frames of the animations, the healing animation is looped as long as the effect lasts
+EFFECT_FRAMES = {
+    DEATH_EFFECT: 15,
+    HEALING_EFFECT: 15,
+    FIRING_EFFECT: 5,
+    CAPTURE_EFFECT: 12,
+    SPACE_JUMP_EFFECT: 9
+}
+# Effects shown only once, at a fixed position (with the facing of the ship for the firing effect)
+ONE_SHOT_EFFECTS = (DEATH_EFFECT, FIRING_EFFECT, CAPTURE_EFFECT, SPACE_JUMP_EFFECT)
+
+
+class Effects:
+    """
+    Effects drawn on the rendered frames. Frames are counted only by rendering, an effect added during a step starts
+    at the next rendered frame.
+
+    One-shot effects of every kind are kept in buckets by the frame, at which they start, so all effects finishing their
+    animation at a frame are dropped at once with their bucket. Healing effects last as long as the ship stands on the
+    tiles of its player, they are keyed by (player, ship id). Adding, removing and expiring an effect are all O(1).
+    """
+
+    def __init__(self):
+        # Index of the next rendered frame
+        self.frame = 0
+        # Kind of the effect -> {start frame: [positions]}
+        self.one_shot = {kind: {} for kind in ONE_SHOT_EFFECTS}
+        # (player, ship id) -> start frame
+        self.healing = {}
+
+    def clear(self):
+        for buckets in self.one_shot.values():
+            buckets.clear()
+        self.healing.clear()
+
+    def add_death(self, pos_x: int, pos_y: int):
+        self._add(DEATH_EFFECT, (pos_x, pos_y))
+
+    def add_firing(self, ship_x: int, ship_y: int, facing: int):
+        self._add(FIRING_EFFECT, (ship_x, ship_y, facing))
+
+    def add_capture(self, pos_x: int, pos_y: int):
+        self._add(CAPTURE_EFFECT, (pos_x, pos_y))
+
+    def add_space_jump(self, pos_x: int, pos_y: int):
+        self._add(SPACE_JUMP_EFFECT, (pos_x, pos_y))
+
+    def _add(self, kind: int, position: tuple):
+        self.one_shot[kind].setdefault(self.frame, []).append(position)
+
+    def start_healing(self, player: int, ship_id: int):
+        self.healing[(player, ship_id)] = self.frame
+
+    def stop_healing(self, player: int, ship_id: int):
+        self.healing.pop((player, ship_id), None)
+
+    def iter_one_shot(self, kind: int):
+        """
+        Yields the current frame of the animation and the position of every effect of the kind
+        """
+        for start, positions in self.one_shot[kind].items():
+            for position in positions:
+                yield self.frame - start, position
+
+    def iter_healing(self):
+        """
+        Yields the current frame of the animation, the player and the id of the ship of every healing effect
+        """
+        for (player, ship_id), start in self.healing.items():
+            yield (self.frame - start) % EFFECT_FRAMES[HEALING_EFFECT], player, ship_id
+
+    def next_frame(self):
+        """
+        Called after a frame is rendered, drops the effects, which have shown the last frame of their animation
+        """
+        for kind, buckets in self.one_shot.items():
+            buckets.pop(self.frame - EFFECT_FRAMES[kind] + 1, None)
+        self.frame += 1
+
+    def get_state(self) -> list:
+        """
+        Returns the effects as lists: (kind, *position, frame of the animation), or (kind, player, ship id, frame) for
+        the healing effects
+        """
+        effects = [[kind, *position, frame] for kind in ONE_SHOT_EFFECTS for frame, position in self.iter_one_shot(kind)]
+        effects.extend([HEALING_EFFECT, player, ship_id, frame] for frame, player, ship_id in self.iter_healing())
+        return effects
+
+    def set_state(self, effects: list):
+        """
+        Restores the effects returned by get_state
+        """
+        self.clear()
+        for kind, *position, frame in effects:
+            # Finished effects could still be listed by the older snapshots
+            if kind == HEALING_EFFECT:
+                self.healing[tuple(position)] = self.frame - frame % EFFECT_FRAMES[HEALING_EFFECT]
+            elif frame < EFFECT_FRAMES[kind]:
+                self.one_shot[kind].setdefault(self.frame - frame, []).append(tuple(position))
+
+
+class _NoEffects:
+    """
+    Used when the frames aren't rendered, the game doesn't keep any effects then and all the calls do nothing
+    """
+
+    def clear(self):
+        pass
+
+    def add_death(self, pos_x: int, pos_y: int):
+        pass
+
+    def add_firing(self, ship_x: int, ship_y: int, facing: int):
+        pass
+
+    def add_capture(self, pos_x: int, pos_y: int):
+        pass
+
+    def add_space_jump(self, pos_x: int, pos_y: int):
+        pass
+
+    def start_healing(self, player: int, ship_id: int):
+        pass
+
+    def stop_healing(self, player: int, ship_id: int):
+        pass
+
+    def next_frame(self):
+        pass
+
+    def get_state(self) -> list:
+        return []
+
+    def set_state(self, effects: list):
+        pass
@@ -0,0 +1,229 @@
+import numpy as np
+
+from octospace.envs.game_config import MAX_SHIPS
+
+
+class Fleet:
+    """
+    Structure-of-arrays storage for the ships of a single player.
+
+    Every ship occupies one slot in a set of preallocated columns. New ships are always appended after the last used
+    slot and destroyed ships only get their alive flag cleared, so iterating over the alive slots keeps the order in
+    which the ships were built. Dead slots are reclaimed (without changing that order) once the columns fill up.
+
+    Columns:
+        ids: ship id
+        x, y: position of the ship on the board
+        hp: current health points
+        firing_cooldown: turns left until the ship can fire again
+        move_cooldown: turns left until the ship can move again (after entering the asteroid field)
+        facing: 0 - right, 1 - down, 2 - left, 3 - up
+        alive: whether the slot holds an existing ship
+        acted: whether the ship has already executed a command during the current turn
+        vision_outdated: whether the ship has moved (or was built) since its vision was added to the player's visibility
+    """
+
+    COLUMNS = ("ids", "x", "y", "hp", "firing_cooldown", "move_cooldown", "facing", "alive", "acted", "vision_outdated")
+    # Columns, which describe the state of the game between the turns
+    STATE_COLUMNS = ("ids", "x", "y", "hp", "firing_cooldown", "move_cooldown", "facing", "vision_outdated")
+
+    def __init__(self, capacity: int = MAX_SHIPS):
+        self.capacity = capacity
+        self.ids = np.zeros(capacity, dtype=int)
+        self.x = np.zeros(capacity, dtype=int)
+        self.y = np.zeros(capacity, dtype=int)
+        self.hp = np.zeros(capacity, dtype=int)
+        self.firing_cooldown = np.zeros(capacity, dtype=int)
+        self.move_cooldown = np.zeros(capacity, dtype=int)
+        self.facing = np.zeros(capacity, dtype=int)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.acted = np.zeros(capacity, dtype=bool)
+        self.vision_outdated = np.zeros(capacity, dtype=bool)
+
+        # Number of used slots (alive or not), the next ship is placed at this index
+        self.size = 0
+        self._slot_by_id = {}
+
+        # Id given to the next built ship
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self._slot_by_id)
+
+    def __contains__(self, ship_id):
+        return ship_id in self._slot_by_id
+
+    def clear(self):
+        self.alive[:self.size] = False
+        self.acted[:self.size] = False
+        self.size = 0
+        self._slot_by_id.clear()
+        self.next_id = 0
+
+    def new_ship_id(self) -> int:
+        self.next_id += 1
+        return self.next_id - 1
+
+    def slot(self, ship_id) -> int:
+        """
+        Returns the slot of the ship with the given id, or -1 if there is no such ship
+        """
+        return self._slot_by_id.get(ship_id, -1)
+
+    def add(self, ship_id: int, x: int, y: int, hp: int = 100, facing: int = 0) -> int:
+        if self.size == self.capacity:
+            self._make_room()
+
+        slot = self.size
+        self.ids[slot] = ship_id
+        self.x[slot] = x
+        self.y[slot] = y
+        self.hp[slot] = hp
+        self.firing_cooldown[slot] = 0
+        self.move_cooldown[slot] = 0
+        self.facing[slot] = facing
+        self.alive[slot] = True
+        self.acted[slot] = False
+        self.vision_outdated[slot] = True
+
+        self._slot_by_id[ship_id] = slot
+        self.size += 1
+        return slot
+
+    def remove(self, ship_id: int):
+        slot = self._slot_by_id.pop(ship_id)
+        self.alive[slot] = False
+
+    def alive_slots(self) -> np.ndarray:
+        """
+        Returns slots of all existing ships, in the order the ships were built
+        """
+        return np.flatnonzero(self.alive[:self.size])
+
+    def ship_ids(self) -> list:
+        return self.ids[self.alive_slots()].tolist()
+
+    def as_list(self, slots: np.ndarray = None) -> list:
+        """
+        Returns the ships in the observation format: [ship id, x, y, hp, firing_cooldown, move_cooldown]
+
+        :param slots: optional subset of alive slots to be returned, by default all alive ships are returned
+        """
+        if slots is None:
+            slots = self.alive_slots()
+        return np.stack([self.ids[slots], self.x[slots], self.y[slots], self.hp[slots],
+                         self.firing_cooldown[slots], self.move_cooldown[slots]], axis=1).tolist()
+
+    def write_table(self, out: np.ndarray, slots: np.ndarray = None) -> int:
+        """
+        Writes the ships in the observation format into the first rows of out, the remaining rows are filled with -1
+
+        :param out: preallocated array of shape (rows, 6), it has to have a row for every written ship
+        :param slots: optional subset of alive slots to be written, by default all alive ships are written
+        :return: number of written ships
+        """
+        if slots is None:
+            slots = self.alive_slots()
+        n_ships = len(slots)
+        for e, column in enumerate(self.COLUMNS[:6]):
+            out[:n_ships, e] = getattr(self, column)[slots]
+        out[n_ships:] = -1
+        return n_ships
+
+    def get_state(self) -> np.ndarray:
+        """
+        Returns a compact copy of all alive ships, one row per ship with the STATE_COLUMNS, and the next ship id
+        in the last row
+        """
+        slots = self.alive_slots()
+        state = np.empty((len(slots) + 1, len(self.STATE_COLUMNS)), dtype=int)
+        for e, column in enumerate(self.STATE_COLUMNS):
+            state[:-1, e] = getattr(self, column)[slots]
+        state[-1] = self.next_id
+        return state
+
+    def set_state(self, state: np.ndarray):
+        """
+        Restores the ships from the array returned by get_state
+        """
+        n_ships = len(state) - 1
+        if n_ships > self.capacity:
+            self.capacity = n_ships
+            for column in self.COLUMNS:
+                setattr(self, column, np.zeros(n_ships, dtype=getattr(self, column).dtype))
+
+        for e, column in enumerate(self.STATE_COLUMNS):
+            getattr(self, column)[:n_ships] = state[:-1, e]
+        self.alive[:n_ships] = True
+        self.alive[n_ships:self.size] = False
+        self.acted[:n_ships] = False
+
+        self.size = n_ships
+        self._slot_by_id = dict(zip(self.ids[:n_ships].tolist(), range(n_ships)))
+        self.next_id = int(state[-1, 0])
+
+    def bind(self, columns: dict):
+        """
+        Moves the ships into the given arrays and works on them from now on, e.g. on the rows of columns stacked for
+        many fleets (see FleetStack)
+
+        :param columns: column name -> array, which is the new column. It can't be shorter than the current capacity
+        """
+        for column in self.COLUMNS:
+            values = columns[column]
+            values[:self.capacity] = getattr(self, column)
+            values[self.capacity:] = 0
+            setattr(self, column, values)
+        self.capacity = len(columns["ids"])
+
+    def _make_room(self):
+        # Move alive ships to the front, keeping their order
+        slots = self.alive_slots()
+        n_alive = len(slots)
+        for column in self.COLUMNS:
+            values = getattr(self, column)
+            values[:n_alive] = values[slots]
+        self.alive[n_alive:] = False
+        self.size = n_alive
+        self._slot_by_id = {ship_id: slot for slot, ship_id in enumerate(self.ids[:n_alive].tolist())}
+
+        # Grow the columns, if there were no dead slots to reclaim
+        if self.size == self.capacity:
+            for column in self.COLUMNS:
+                values = getattr(self, column)
+                setattr(self, column, np.concatenate([values, np.zeros_like(values)]))
+            self.capacity *= 2
+
+
+class FleetStack:
+    """
+    Stores the columns of many fleets (e.g. of both players of many games) stacked into arrays of shape
+    (n_fleets, capacity), every fleet works on its row of them in place. The ships of all fleets can then be handled by
+    single array operations, with the ships addressed by the flat indices fleet index * capacity + slot.
+
+    All stacked fleets have the same capacity. A fleet, which has grown its columns (or restored a larger state),
+    works on its own arrays again, until bind moves it back into the stack, growing the stack for all fleets.
+
+    Args:
+        fleets: fleets, the i-th of them works on the i-th row of the stacked columns
+    """
+
+    def __init__(self, fleets: list):
+        self.fleets = fleets
+        self.capacity = 0
+        for column in Fleet.COLUMNS:
+            setattr(self, column, None)
+
+    def bind(self):
+        """
+        Moves the fleets into the stacked columns, unless all of them already work on their rows
+        """
+        # A fleet replaces all of its columns at once, so it's enough to check one of them
+        if self.ids is not None and all(fleet.ids.base is self.ids for fleet in self.fleets):
+            return
+
+        self.capacity = max(fleet.capacity for fleet in self.fleets)
+        for column in Fleet.COLUMNS:
+            setattr(self, column, np.zeros((len(self.fleets), self.capacity), dtype=getattr(self.fleets[0], column).dtype))
+        for e, fleet in enumerate(self.fleets):
+            fleet.bind({column: getattr(self, column)[e] for column in Fleet.COLUMNS})
@@ -3,630 +3,559 @@ import numpy as np
 from octospace.envs.game_config import (MAX_SHIP_FIRE_RANGE, SHIP_DAMAGE, BASE_SHIP_SPEED,
                          IONIZED_FIELD_SPEED_FACTOR, BOARD_SIZE, MOVEMENT_DIRECTIONS, SHIP_COST, PLAYER_1_ORIGIN, \
     PLAYER_2_ORIGIN, OCCUPATION_SPEED, SHIP_HEALING_SPEED, SHIP_OCCUPATION_RANGE, FIRING_COOLDOWN, MOVE_COOLDOWN,
-                         ASTEROID_DAMAGE, VISION_RANGE, VISION_ADD_MASK)
+                         ASTEROID_DAMAGE, RF_ID_TO_CODING)
 from octospace.envs.schemes import PLANET_MASK
-from octospace.envs.sound import play_space_jump_sound, play_capture_sound, play_ship_explosion_sound, play_shoot_sound
+from octospace.envs.fleet import Fleet, FleetStack
+from octospace.envs.effects import Effects
+from octospace.envs.visibility import Visibility
+from octospace.envs.sound import SHOOT_SOUND, SPACE_JUMP_SOUND, CAPTURE_SOUND, SHIP_EXPLOSION_SOUND
 
 from collections import defaultdict
 
-player_1_ships_next_id = 1
-player_2_ships_next_id = 1
+# Codings of the resource fields, in the order of their ids
+RF_CODINGS = np.array([RF_ID_TO_CODING[rf_id] for rf_id in range(len(RF_ID_TO_CODING))])
 
 
-def _ship_firing(
-    actions: dict,
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
-    effects: list,
-    turn_on_music: bool,
-    volume: float,
-    ship_1_actions: list,
-    ship_2_actions: list
-):
-    firing_info = {
-        1: defaultdict(int),
-        2: defaultdict(int)
-    }
-
-    for command in actions["player_1"]["ships_actions"]:
-        if command[1] == 1:
-            ship_id, act, direction = command
-
-            # If there is not such ship or the ship has an active firing cooldown
-            if ship_id not in player_1_ships.keys() or player_1_ships[ship_id][4] > 0 or ship_id not in ship_1_actions:
-                firing_info[1][ship_id] -= 2
-                continue
-
-            ship_1_actions.pop(ship_1_actions.index(ship_id))
-
-            # Play shoot sound
-            if turn_on_music:
-                play_shoot_sound(volume=volume)
-
-            target_id = _get_target(
-                ship_x=player_1_ships[ship_id][0],
-                ship_y=player_1_ships[ship_id][1],
-                direction=direction,
-                player=0,
-                player_1_ships=player_1_ships,
-                player_2_ships=player_2_ships
-            )
-
-            effects.append([2, player_1_ships[ship_id][0], player_1_ships[ship_id][1], player_1_ships_facing[ship_id], 0])
-            player_1_ships[ship_id][3] = FIRING_COOLDOWN    # Set firing cooldown for this ship
-
-            if target_id == -1:
-                firing_info[1][ship_id] -= 2
-                continue
-
-            player_2_ships[target_id][2] -= SHIP_DAMAGE  # Damage the enemy ship
-            player_1_ships_facing[ship_id] = direction
-
-            firing_info[1][ship_id] += 3
-
-    for command in actions["player_2"]["ships_actions"]:
-        if command[1] == 1:
-            ship_id, act, direction = command
-
-            # If there is not such ship or the ship has an active firing cooldown
-            if ship_id not in player_2_ships.keys() or player_2_ships[ship_id][4] > 0 or ship_id not in ship_2_actions:
-                firing_info[2][ship_id] -= 2
-                continue
+def _collect_commands(
+    actions: list,
+    fleets: FleetStack
+) -> tuple:
+    """
+    Flattens the ships commands of many games into arrays, ordered by the game, the player and the order in which
+    the commands were given
 
-            ship_2_actions.pop(ship_2_actions.index(ship_id))
+    :param actions: actions of every game (None for a game without commands), the i-th game is played by the fleets
+        2 * i and 2 * i + 1 of the stack
+    :return: arrays with the fleet, the slot (-1 if there is no such ship), the ship id, the kind (act), the direction,
+        the velocity (0 for firing) and whether the command was executed (filled in by _select_commands) of every command
+    """
+    commands = []
+    for e, fleet in enumerate(fleets.fleets):
+        if actions[e // 2] is None:
+            continue
+        for command in actions[e // 2][f"player_{e % 2 + 1}"]["ships_actions"]:
+            commands.append((e, fleet.slot(command[0]), command[0], command[1], command[2],
+                             command[3] if command[1] == 0 else 0, 0))
+    return tuple(np.array(commands, dtype=int).reshape(-1, 7).T)
+
+
+def _select_commands(
+    commands: tuple,
+    act: int,
+    fleets: FleetStack
+) -> tuple:
+    """
+    Returns the commands of the given kind, their flat ship indices in the stack, and which of them are executed. There
+    has to be such ship without an active move cooldown, which hasn't executed a command yet (also by an earlier command,
+    only the 1st valid command of every ship is executed). The executed commands are marked in the given commands.
+    """
+    rows = np.flatnonzero(commands[3] == act)
+    executed = commands[6]
+    commands = tuple(column[rows] for column in commands)
+    command_fleets, slots = commands[0], commands[1]
+    ships = command_fleets * fleets.capacity + slots
 
-            # Play shoot sound
-            if turn_on_music:
-                play_shoot_sound(volume=volume)
+    valid = slots != -1
+    valid[valid] = (fleets.move_cooldown.flat[ships[valid]] == 0) & ~fleets.acted.flat[ships[valid]]
+    first = np.flatnonzero(valid)[np.unique(ships[valid], return_index=True)[1]]
+    valid[:] = False
+    valid[first] = True
+    executed[rows[first]] = 1
+    return commands, ships, valid
 
-            target_id = _get_target(
-                ship_x=player_2_ships[ship_id][0],
-                ship_y=player_2_ships[ship_id][1],
-                direction=direction,
-                player=1,
-                player_1_ships=player_1_ships,
-                player_2_ships=player_2_ships
-            )
 
-            effects.append([2, player_2_ships[ship_id][0], player_2_ships[ship_id][1], player_2_ships_facing[ship_id], 0])
-            player_2_ships[ship_id][3] = FIRING_COOLDOWN
+def _ship_firing(
+    commands: tuple,
+    fleets: FleetStack,
+    effects: list,
+    sound_events: list
+) -> list:
+    """
+    Resolves the firing commands of many games at once
 
-            if target_id == -1:
-                firing_info[2][ship_id] -= 2
-                continue
-            player_1_ships[target_id][2] -= SHIP_DAMAGE
-            player_2_ships_facing[ship_id] = direction
-            firing_info[2][ship_id] += 3
+    :param commands: commands of all games, see _collect_commands
+    :param fleets: fleets of both players of every game, see _collect_commands
+    :param effects: effects of every game
+    :param sound_events: sound events of every game
+    :return: firing rewards info of every game
+    """
+    firing_info = [{1: defaultdict(int), 2: defaultdict(int)} for _ in effects]
+
+    (command_fleets, _, ship_ids, _, directions, _, _), ships, valid = _select_commands(commands, act=1, fleets=fleets)
+    games, players = command_fleets // 2, command_fleets % 2
+
+    # Both players get penalized for invalid firing commands
+    for game, player, ship_id in zip(games[~valid].tolist(), players[~valid].tolist(), ship_ids[~valid].tolist()):
+        firing_info[game][player + 1][ship_id] -= 2
+
+    shooters = ships[valid]
+    if len(shooters) == 0:
+        return firing_info
+    fleets.acted.flat[shooters] = True
+    shooters_game, shooters_player = games[valid], players[valid]
+    shooters_direction = directions[valid]
+    shooters_x, shooters_y = fleets.x.flat[shooters], fleets.y.flat[shooters]
+
+    # Potential targets are all ships of both players of the same game, the pairs of a shooter and a ship are tested
+    # game by game, ordered by the shooter and by the index of the ship
+    targets = np.flatnonzero(fleets.alive)
+    targets_game = targets // (2 * fleets.capacity)
+    targets_start = np.searchsorted(targets_game, np.arange(len(effects) + 1))
+    n_pairs = (targets_start[shooters_game + 1] - targets_start[shooters_game])
+    pairs_shooter = np.repeat(np.arange(len(shooters)), n_pairs)
+    pairs_target = (np.arange(n_pairs.sum()) - np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs)
+                    + np.repeat(targets_start[shooters_game], n_pairs))
+
+    hits = _get_targets(
+        ships_x=shooters_x,
+        ships_y=shooters_y,
+        ships_player=shooters_player,
+        directions=shooters_direction,
+        other_ships_x=fleets.x.flat[targets],
+        other_ships_y=fleets.y.flat[targets],
+        other_ships_player=targets // fleets.capacity % 2,
+        pairs=(pairs_shooter, pairs_target)
+    )
+    hit = hits != -1
+
+    # Play shoot sound
+    for game in np.unique(shooters_game).tolist():
+        sound_events[game].add(SHOOT_SOUND)
+
+    for game, ship_x, ship_y, facing in zip(shooters_game.tolist(), shooters_x.tolist(), shooters_y.tolist(),
+                                            fleets.facing.flat[shooters].tolist()):
+        effects[game].add_firing(ship_x, ship_y, facing)
+
+    fleets.firing_cooldown.flat[shooters] = FIRING_COOLDOWN     # Set firing cooldown for the ships
+    fleets.facing.flat[shooters[hit]] = shooters_direction[hit]
+
+    # Damage the enemy ships, a ship can be hit by multiple shooters at once
+    np.subtract.at(fleets.hp.reshape(-1), targets[hits[hit]], SHIP_DAMAGE)
+
+    for game, player, ship_id, ship_hit in zip(shooters_game.tolist(), shooters_player.tolist(),
+                                               ship_ids[valid].tolist(), hit.tolist()):
+        firing_info[game][player + 1][ship_id] += 3 if ship_hit else -2
 
     return firing_info
 
 def _handle_ship_death(
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
-    effects: list,
-    turn_on_music: bool,
-    volume: float
+    player_1_fleet: Fleet,
+    player_2_fleet: Fleet,
+    effects: Effects,
+    sound_events: set
 ):
     ship_death_info = {
         1: defaultdict(int),
         2: defaultdict(int)
     }
 
-    for ship_id in list(player_1_ships.keys()):
+    for player, fleet in enumerate([player_1_fleet, player_2_fleet]):
         # If the damaged ship's health points are below 0, then remove it from the board
-        if player_1_ships[ship_id][2] <= 0:
-            ship_death_info[1][ship_id] -= 5
-            _delete_ship(player_1_ships=player_1_ships, player_2_ships=player_2_ships, player_1_ships_facing=player_1_ships_facing,
-                         player_2_ships_facing=player_2_ships_facing, player=0, ship_id=ship_id, turn_on_music=turn_on_music,
-                         volume=volume, effects=effects)
+        slots = fleet.alive_slots()
+        for ship_id in fleet.ids[slots[fleet.hp[slots] <= 0]].tolist():
+            ship_death_info[player + 1][ship_id] -= 5
+            _delete_ship(fleet=fleet, player=player, ship_id=ship_id, effects=effects, sound_events=sound_events)
 
-    for ship_id in list(player_2_ships.keys()):
-        # If the damaged ship's health points are below 0, then remove it from the board
-        if player_2_ships[ship_id][2] <= 0:
-            ship_death_info[2][ship_id] -= 5
-            _delete_ship(player_1_ships=player_1_ships, player_2_ships=player_2_ships,
-                         player_1_ships_facing=player_1_ships_facing,
-                         player_2_ships_facing=player_2_ships_facing, player=1, ship_id=ship_id,
-                         turn_on_music=turn_on_music,
-                         volume=volume, effects=effects)
-            
     return ship_death_info
 
 def _ship_movement(
     game_map: np.ndarray,
-    actions: dict,
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
+    commands: tuple,
+    fleets: FleetStack,
     effects: list,
-    turn_on_music: bool,
-    volume: float,
-    ship_1_actions: list,
-    ship_2_actions: list
-):
-    movement_info = {
-        1: defaultdict(int),
-        2: defaultdict(int)
-    }
-
-    for command in actions["player_1"]["ships_actions"]:
-        if command[1] == 0:
-            ship_id, act, direction, velocity = command
-            if ship_id not in player_1_ships.keys() or player_1_ships[ship_id][4] > 0 or ship_id not in ship_1_actions:
-                movement_info[1][ship_id] -= 2
-                continue
-
-            ship_1_actions.pop(ship_1_actions.index(ship_id))
-            ship_x, ship_y = player_1_ships[ship_id][0], player_1_ships[ship_id][1]
-
-            # Calculate max distance the ship can travel
-            max_movement = BASE_SHIP_SPEED
-            if game_map[ship_y, ship_x] == 4:
-                max_movement = int(max_movement * IONIZED_FIELD_SPEED_FACTOR)
-                if velocity == max_movement:
-                    effects.append([4, ship_x, ship_y, 0])
-                    if turn_on_music:
-                        play_space_jump_sound(volume=volume)
-
-            # If it's too far, then clip it to the maximum speed for the ship
-            velocity = np.clip(velocity, 0, max_movement)
-            movement_vec = MOVEMENT_DIRECTIONS[direction] * velocity
-
-            # Move the ship in that direction
-            player_1_ships[ship_id][0] = np.clip(player_1_ships[ship_id][0] + movement_vec[0], 0, BOARD_SIZE - 1)
-            player_1_ships[ship_id][1] = np.clip(player_1_ships[ship_id][1] + movement_vec[1], 0, BOARD_SIZE - 1)
-
-            new_ship_x, new_ship_y = player_1_ships[ship_id][0], player_1_ships[ship_id][1]
-
-            if abs(new_ship_x - 90) + abs(new_ship_y - 90) < abs(ship_x - 90) + abs(ship_y - 90):
-                movement_info[1][ship_id] += 2
-
-            # Update ship's direction
-            player_1_ships_facing[ship_id] = direction
-
-            # If the ship stumbled upon asteroid field, add a move cooldown
-            if game_map[player_1_ships[ship_id][1], player_1_ships[ship_id][0]] == 2:
-                player_1_ships[ship_id][4] = MOVE_COOLDOWN
-                player_1_ships[ship_id][2] -= ASTEROID_DAMAGE
-                movement_info[1][ship_id] -= 1
-
-            # If the ship entered one of player's tiles, start the healing effect
-            if game_map[player_1_ships[ship_id][1], player_1_ships[ship_id][0]] & 64 == 64 and game_map[ship_y, ship_x] & 64 != 64:
-                effects.append([1, 0, ship_id, 0])
-
-            # If the ship left player's tile, stop the healing effect
-            if game_map[player_1_ships[ship_id][1], player_1_ships[ship_id][0]] & 64 != 64 and game_map[ship_y, ship_x] & 64 == 64:
-                _delete_healing_effect(0, ship_id, effects)
-
-    for command in actions["player_2"]["ships_actions"]:
-        if command[1] == 0:
-            ship_id, act, direction, velocity = command
-            if ship_id not in player_2_ships.keys() or player_2_ships[ship_id][4] > 0 or ship_id not in ship_2_actions:
-                continue
-
-            ship_2_actions.pop(ship_2_actions.index(ship_id))
-            ship_x, ship_y = player_2_ships[ship_id][0], player_2_ships[ship_id][1]
-
-            # Calculate max distance the ship can travel
-            max_movement = BASE_SHIP_SPEED
-            if game_map[ship_y, ship_x] == 4:
-                max_movement = int(max_movement * IONIZED_FIELD_SPEED_FACTOR)
-                if velocity == max_movement:
-                    effects.append([4, ship_x, ship_y, 0])
-                    if turn_on_music:
-                        play_space_jump_sound(volume=volume)
-
-            # If it's too far, then don't do anything
-            velocity = np.clip(velocity, 0, max_movement)
-            movement_vec = MOVEMENT_DIRECTIONS[direction] * velocity
-
-            # Move the ship in that direction
-            player_2_ships[ship_id][0] = np.clip(player_2_ships[ship_id][0] + movement_vec[0], 0, BOARD_SIZE - 1)
-            player_2_ships[ship_id][1] = np.clip(player_2_ships[ship_id][1] + movement_vec[1], 0, BOARD_SIZE - 1)
-
-            new_ship_x, new_ship_y = player_2_ships[ship_id][0], player_2_ships[ship_id][1]
-
-            if abs(new_ship_x - 9) + abs(new_ship_y - 9) < abs(ship_x - 9) + abs(ship_y - 9):
-                movement_info[2][ship_id] += 2
-
-            # Update ship's direction
-            player_2_ships_facing[ship_id] = direction
-
-            # If the ship stumbled upon asteroid field, add a move cooldown
-            if game_map[player_2_ships[ship_id][1], player_2_ships[ship_id][0]] == 2:
-                player_2_ships[ship_id][4] = MOVE_COOLDOWN
-                player_2_ships[ship_id][2] -= ASTEROID_DAMAGE
-                movement_info[2][ship_id] -= 1
-
-            # If the ship entered one of player's tiles, start the healing effect
-            if game_map[player_2_ships[ship_id][1], player_2_ships[ship_id][0]] & 128 == 128 and game_map[ship_y, ship_x] & 128 != 128:
-                effects.append([1, 1, ship_id, 0])
-
-            # If the ship left player's tile, stop the healing effect
-            if game_map[player_2_ships[ship_id][1], player_2_ships[ship_id][0]] & 128 != 128 and game_map[ship_y, ship_x] & 128 == 128:
-                _delete_healing_effect(1, ship_id, effects)
+    sound_events: list
+) -> list:
+    """
+    Resolves the movement commands of many games at once
+
+    :param game_map: maps of all games, with shape (n_games, BOARD_SIZE, BOARD_SIZE)
+    :param commands: commands of all games, see _collect_commands
+    :param fleets: fleets of both players of every game, see _collect_commands
+    :param effects: effects of every game
+    :param sound_events: sound events of every game
+    :return: movement rewards info of every game
+    """
+    movement_info = [{1: defaultdict(int), 2: defaultdict(int)} for _ in effects]
+
+    (command_fleets, _, ship_ids, _, directions, velocities, _), ships, valid = _select_commands(commands, act=0,
+                                                                                                 fleets=fleets)
+    games, players = command_fleets // 2, command_fleets % 2
+
+    # Only the 1st player gets penalized for invalid movement commands
+    penalized = ~valid & (players == 0)
+    for game, ship_id in zip(games[penalized].tolist(), ship_ids[penalized].tolist()):
+        movement_info[game][1][ship_id] -= 2
+
+    movers = ships[valid]
+    if len(movers) == 0:
+        return movement_info
+    games, players = games[valid], players[valid]
+    directions, velocities = directions[valid], velocities[valid]
+    moved_ids = ship_ids[valid].tolist()
+
+    fleets.acted.flat[movers] = True
+    ship_x, ship_y = fleets.x.flat[movers], fleets.y.flat[movers]
+    tiles = game_map[games, ship_y, ship_x]
+
+    # Calculate max distance the ships can travel
+    ionized = tiles == 4
+    max_movement = np.where(ionized, int(BASE_SHIP_SPEED * IONIZED_FIELD_SPEED_FACTOR), BASE_SHIP_SPEED)
+    jumps = ionized & (velocities == max_movement)
+
+    # If it's too far, then clip it to the maximum speed for the ship
+    velocities = np.clip(velocities, 0, max_movement)
+
+    # Move the ships in their directions
+    new_ship_x = np.clip(ship_x + MOVEMENT_DIRECTIONS[directions, 0] * velocities, 0, BOARD_SIZE - 1)
+    new_ship_y = np.clip(ship_y + MOVEMENT_DIRECTIONS[directions, 1] * velocities, 0, BOARD_SIZE - 1)
+    fleets.x.flat[movers] = new_ship_x
+    fleets.y.flat[movers] = new_ship_y
+    fleets.vision_outdated.flat[movers] = True
+    new_tiles = game_map[games, new_ship_y, new_ship_x]
+
+    # Ships are rewarded for getting closer to the enemy base
+    enemy_origin = np.array([PLAYER_2_ORIGIN, PLAYER_1_ORIGIN])[players]
+    closer = (np.abs(new_ship_x - enemy_origin[:, 0]) + np.abs(new_ship_y - enemy_origin[:, 1]) <
+              np.abs(ship_x - enemy_origin[:, 0]) + np.abs(ship_y - enemy_origin[:, 1]))
+
+    # Update ships' directions
+    fleets.facing.flat[movers] = directions
+
+    # If the ship stumbled upon asteroid field, add a move cooldown
+    asteroid = new_tiles == 2
+    fleets.move_cooldown.flat[movers[asteroid]] = MOVE_COOLDOWN
+    fleets.hp.flat[movers[asteroid]] -= ASTEROID_DAMAGE
+
+    # Whether the ships stand on player's tiles before and after the move
+    ownership_bit = np.where(players == 0, 64, 128)
+    owned_before = tiles & ownership_bit == ownership_bit
+    owned_after = new_tiles & ownership_bit == ownership_bit
+
+    games, players = games.tolist(), players.tolist()
+    for e in np.flatnonzero(closer | asteroid).tolist():
+        movement_info[games[e]][players[e] + 1][moved_ids[e]] += 2 * int(closer[e]) - int(asteroid[e])
+
+    # Effects of jumping through the ionized fields, and of entering (start the healing) or leaving (stop it) one of
+    # player's tiles, ship by ship
+    for e in np.flatnonzero(jumps | (owned_after != owned_before)).tolist():
+        game, player = games[e], players[e]
+        if jumps[e]:
+            effects[game].add_space_jump(int(ship_x[e]), int(ship_y[e]))
+            sound_events[game].add(SPACE_JUMP_SOUND)
+        if owned_after[e] and not owned_before[e]:
+            effects[game].start_healing(player, moved_ids[e])
+        elif owned_before[e] and not owned_after[e]:
+            effects[game].stop_healing(player, moved_ids[e])
 
     return movement_info
 
 def _ship_construction(
     actions: dict,
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
+    player_1_fleet: Fleet,
+    player_2_fleet: Fleet,
     player_1_resources: np.ndarray,
     player_2_resources: np.ndarray,
 
 ):
-    if actions["player_1"]["construction"] > 0:
-        for i in range(actions["player_1"]["construction"]):
-            if np.all([player_1_resources[i] >= SHIP_COST[i] for i in range(4)]):
-                new_ship_id = _get_player_next_id(0)
-                player_1_ships[new_ship_id] = [PLAYER_1_ORIGIN[0], PLAYER_1_ORIGIN[1], 100, 0, 0]
-                player_1_ships_facing[new_ship_id] = 0
-                player_1_resources -= SHIP_COST
-
-    if actions["player_2"]["construction"] > 0:
-        for i in range(actions["player_2"]["construction"]):
-            if np.all([player_2_resources[i] >= SHIP_COST[i] for i in range(4)]):
-                new_ship_id = _get_player_next_id(1)
-                player_2_ships[new_ship_id] = [PLAYER_2_ORIGIN[0], PLAYER_2_ORIGIN[1], 100, 0, 0]
-                player_2_ships_facing[new_ship_id] = 0
-                player_2_resources -= SHIP_COST
+    for player, (fleet, resources, origin) in enumerate([(player_1_fleet, player_1_resources, PLAYER_1_ORIGIN),
+                                                          (player_2_fleet, player_2_resources, PLAYER_2_ORIGIN)]):
+        for _ in range(actions[f"player_{player + 1}"]["construction"]):
+            if np.all(resources >= SHIP_COST):
+                fleet.add(ship_id=fleet.new_ship_id(), x=origin[0], y=origin[1])
+                resources -= SHIP_COST
 
 
 def _occupation_progress(
-    planets_centers: np.ndarray,
     planets_occupation_progress: np.ndarray,
     planets_ongoing_occupation: np.ndarray
 ):
-    for e, center in enumerate(planets_centers):
-        # If there is an ongoing occupation of the planet
-        if planets_ongoing_occupation[e] != 0:
-            planets_occupation_progress[e] = np.clip(planets_occupation_progress[e] + planets_ongoing_occupation[e] * OCCUPATION_SPEED, 0, 100)
+    """
+    Works also on the planets of many games stacked into arrays of shape (n_games, n_planets)
+    """
+    # Planets with an ongoing occupation progress towards its side
+    ongoing = planets_ongoing_occupation != 0
+    planets_occupation_progress[ongoing] = np.clip(planets_occupation_progress[ongoing] + planets_ongoing_occupation[ongoing] * OCCUPATION_SPEED, 0, 100)
 
-            # If the planet got occupied, reset the occupation speed counter
-            if planets_occupation_progress[e] in [0, 100]:
-                planets_ongoing_occupation[e] = 0
+    # If the planet got occupied, reset the occupation speed counter
+    occupied = (planets_occupation_progress == 0) | (planets_occupation_progress == 100)
+    planets_ongoing_occupation[ongoing & occupied] = 0
 
 
 def _change_ownership_of_planets(
     game_map: np.ndarray,
     planets_centers: np.ndarray,
+    planets_tiles: np.ndarray,
+    planets_rf_counts: np.ndarray,
     planets_occupation_progress: np.ndarray,
     player_1_occupied_rf: np.ndarray,
     player_2_occupied_rf: np.ndarray,
-    player_1_visibility_mask: np.ndarray,
-    player_2_visibility_mask: np.ndarray,
-    effects: list,
-    turn_on_music: bool,
-    volume: float
+    player_1_visibility: Visibility,
+    player_2_visibility: Visibility,
+    effects: Effects,
+    sound_events: set
 ):
-    for e, center in enumerate(planets_centers):
-        if planets_occupation_progress[e] == 0 and game_map[center[0], center[1]] & 64 != 64:
-            map_mask = np.zeros((BOARD_SIZE, BOARD_SIZE))
-            map_mask[center[0] - 4: center[0] + 5, center[1] - 4: center[1] + 5] = PLANET_MASK
+    """
+    Changes the owner of the planets, which have just been fully occupied
 
+    :param planets_tiles: flat indices of the tiles of every planet, see _get_planets_tiles
+    :param planets_rf_counts: numbers of the resource fields of every type on every planet
+    """
+    # Only the fully occupied planets can change their owner
+    occupied = np.flatnonzero((planets_occupation_progress == 0) | (planets_occupation_progress == 100))
+    for e in occupied.tolist():
+        center = planets_centers[e]
+        tiles = planets_tiles[e]
+        if planets_occupation_progress[e] == 0 and game_map[center[0], center[1]] & 64 != 64:
             # If the planet was already occupied by the other player, delete his ownership
             if game_map[center[0], center[1]] & 128 == 128:
-                game_map[map_mask.astype(bool)] -= 128
-
-            val, rf_cnt = np.unique(game_map[center[0] - 4: center[0] + 5, center[1] - 4: center[1] + 5],
-                                    return_counts=True)
-            rf_counts = dict(zip(val, rf_cnt))
-            try:
-                rf_counts = np.array([rf_counts[9], rf_counts[17], rf_counts[25], rf_counts[57]])
-            except KeyError:
-                print(val, rf_cnt)
-                exit()
+                game_map.flat[tiles] -= 128
 
             if game_map[center[1], center[0]] & 128 == 128:
-                player_2_occupied_rf -= rf_counts
+                player_2_occupied_rf -= planets_rf_counts[e]
 
-            player_1_occupied_rf += rf_counts
+            player_1_occupied_rf += planets_rf_counts[e]
 
             # Add planet ownership to player_1
-            game_map[map_mask.astype(bool)] |= 64
+            game_map.flat[tiles] |= 64
+
+            # Update the players' views of the map around the planet
+            for visibility in [player_1_visibility, player_2_visibility]:
+                visibility.refresh(game_map, center[0] - 4, center[0] + 5, center[1] - 4, center[1] + 5)
 
             # Add capture effect
-            effects.append([3, center[1], center[0], 0])
-            if turn_on_music:
-                play_capture_sound(volume=volume)
+            effects.add_capture(center[1], center[0])
+            sound_events.add(CAPTURE_SOUND)
 
             # Add area around the planet to the player's visibility mask
-            _add_planet_visibility(center[1], center[0], player_1_visibility_mask)
+            _add_planet_visibility(center[1], center[0], player_1_visibility, game_map)
 
         elif planets_occupation_progress[e] == 100 and game_map[center[0], center[1]] & 128 != 128:
-            map_mask = np.zeros((BOARD_SIZE, BOARD_SIZE))
-            map_mask[center[0] - 4: center[0] + 5, center[1] - 4: center[1] + 5] = PLANET_MASK
-
             # If the planet was already occupied by the other player, delete his ownership
             if game_map[center[0], center[1]] & 64 == 64:
-                game_map[map_mask.astype(bool)] -= 64
-
-            val, rf_cnt = np.unique(game_map[center[0] - 4: center[0] + 5, center[1] - 4: center[1] + 5],
-                                    return_counts=True)
-            rf_counts = dict(zip(val, rf_cnt))
-            rf_counts = np.array([rf_counts[9], rf_counts[17], rf_counts[25], rf_counts[57]])
+                game_map.flat[tiles] -= 64
 
             if game_map[center[1], center[0]] & 64 == 64:
-                player_1_occupied_rf -= rf_counts
+                player_1_occupied_rf -= planets_rf_counts[e]
 
-            player_2_occupied_rf += rf_counts
+            player_2_occupied_rf += planets_rf_counts[e]
 
             # Add planet ownership to player_2
-            game_map[map_mask.astype(bool)] |= 128
+            game_map.flat[tiles] |= 128
+
+            # Update the players' views of the map around the planet
+            for visibility in [player_1_visibility, player_2_visibility]:
+                visibility.refresh(game_map, center[0] - 4, center[0] + 5, center[1] - 4, center[1] + 5)
 
             # Add capture effect
-            effects.append([3, center[1], center[0], 0])
-            if turn_on_music:
-                play_capture_sound(volume=volume)
+            effects.add_capture(center[1], center[0])
+            sound_events.add(CAPTURE_SOUND)
 
-            _add_planet_visibility(center[1], center[0], player_2_visibility_mask)
+            _add_planet_visibility(center[1], center[0], player_2_visibility, game_map)
 
 
 def _ship_land_interaction(
     game_map: np.ndarray,
-    planets_centers: np.ndarray,
+    planet_ids_grid: np.ndarray,
     planets_occupation_progress: np.ndarray,
     planets_ongoing_occupation: np.ndarray,
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
-    effects: list
+    player_1_fleet: Fleet,
+    player_2_fleet: Fleet,
+    effects: Effects
 ):
     ship_land_interaction_info = {
         1: defaultdict(int),
         2: defaultdict(int)
     }
 
-    ship_ids_to_delete_1 = []
-    for ship_id, (ship_x, ship_y, hp, firing_cooldown, move_cooldown) in player_1_ships.items():
-        if game_map[ship_y, ship_x] & 64 == 64 and hp != 100:
-            player_1_ships[ship_id][2] = np.clip(player_1_ships[ship_id][2] + SHIP_HEALING_SPEED, 1, 100)
-            ship_land_interaction_info[1][ship_id] += 1
-
-        planet_id = _get_planet_id_by_ship_position(ship_x, ship_y, planets_centers=planets_centers)
-        if planet_id != -1:
+    for player, fleet in enumerate([player_1_fleet, player_2_fleet]):
+        ownership_bit = 64 if player == 0 else 128
+        # Progress value of a planet fully occupied by this player and by the enemy
+        own_progress, enemy_progress = (0, 100) if player == 0 else (100, 0)
+        # Occupation progress goes towards 0 for the 1st player and towards 100 for the 2nd one
+        occupation_direction = -1 if player == 0 else 1
+
+        # Heal the ships standing on player's tiles
+        slots = fleet.alive_slots()
+        healed = slots[(game_map[fleet.y[slots], fleet.x[slots]] & ownership_bit == ownership_bit) & (fleet.hp[slots] != 100)]
+        fleet.hp[healed] = np.clip(fleet.hp[healed] + SHIP_HEALING_SPEED, 1, 100)
+        for ship_id in fleet.ids[healed].tolist():
+            ship_land_interaction_info[player + 1][ship_id] += 1
+
+        # Planets of all ships are looked up at once, only the ships within the range of a planet are handled one by
+        # one, as the outcome of landing depends on the ships, which landed on the same planet before
+        planet_ids = planet_ids_grid[fleet.y[slots], fleet.x[slots]]
+        landing = planet_ids != -1
+        ship_ids_to_delete = []
+        for ship_id, planet_id in zip(fleet.ids[slots[landing]].tolist(), planet_ids[landing].tolist()):
             # If there is an ongoing fight for this planet
             if planets_ongoing_occupation[planet_id] != 0 or planets_occupation_progress[planet_id] not in [-1, 0, 100]:
-                planets_ongoing_occupation[planet_id] -= 1
-                ship_ids_to_delete_1.append(ship_id)
+                planets_ongoing_occupation[planet_id] += occupation_direction
+                ship_ids_to_delete.append(ship_id)
 
             # If planet is unoccupied
             elif planets_occupation_progress[planet_id] == -1:
-                planets_occupation_progress[planet_id] = 0
-                ship_ids_to_delete_1.append(ship_id)
-                ship_land_interaction_info[1][ship_id] += 10
+                planets_occupation_progress[planet_id] = own_progress
+                ship_ids_to_delete.append(ship_id)
+                ship_land_interaction_info[player + 1][ship_id] += 10
 
             # If the planet belongs to the other player
-            elif planets_occupation_progress[planet_id] == 100:
-                planets_occupation_progress[planet_id] = 100 - OCCUPATION_SPEED
-                planets_ongoing_occupation[planet_id] -= 1
-                ship_ids_to_delete_1.append(ship_id)
-
-    # Delete the ship afterward
-    for ship_id in ship_ids_to_delete_1:
-        _delete_ship(player_1_ships=player_1_ships, player_2_ships=player_2_ships,
-                     player_1_ships_facing=player_1_ships_facing,
-                     player_2_ships_facing=player_2_ships_facing, player=0, ship_id=ship_id,
-                     turn_on_music=False,
-                     volume=0.0, effects=effects, death_effect=False)
-
-    ship_ids_to_delete_2 = []
-    for ship_id, (ship_x, ship_y, hp, firing_cooldown, move_cooldown) in player_2_ships.items():
-        if game_map[ship_y, ship_x] & 128 == 128 and hp != 100:
-            player_2_ships[ship_id][2] = np.clip(player_2_ships[ship_id][2] + SHIP_HEALING_SPEED, 1, 100)
-            ship_land_interaction_info[2][ship_id] += 1
-
-        planet_id = _get_planet_id_by_ship_position(ship_x, ship_y, planets_centers=planets_centers)
-        if planet_id != -1:
-            # If there is an ongoing fight for this planet
-            if planets_ongoing_occupation[planet_id] != 0 or planets_occupation_progress[planet_id] not in [-1, 0, 100]:
-                planets_ongoing_occupation[planet_id] += 1
-                ship_ids_to_delete_2.append(ship_id)
+            elif planets_occupation_progress[planet_id] == enemy_progress:
+                planets_occupation_progress[planet_id] = enemy_progress + occupation_direction * OCCUPATION_SPEED
+                planets_ongoing_occupation[planet_id] += occupation_direction
+                ship_ids_to_delete.append(ship_id)
 
-            # If planet is unoccupied
-            elif planets_occupation_progress[planet_id] == -1:
-                planets_occupation_progress[planet_id] = 100
-                ship_ids_to_delete_2.append(ship_id)
-                ship_land_interaction_info[2][ship_id] += 10
+        # Delete the ship afterward
+        for ship_id in ship_ids_to_delete:
+            _delete_ship(fleet=fleet, player=player, ship_id=ship_id, effects=effects, death_effect=False)
 
-            # If the planet belongs to the other player
-            elif planets_occupation_progress[planet_id] == 0:
-                planets_occupation_progress[planet_id] = OCCUPATION_SPEED
-                planets_ongoing_occupation[planet_id] += 1
-                ship_ids_to_delete_2.append(ship_id)
-
-    # Delete the ship afterward
-    for ship_id in ship_ids_to_delete_2:
-        _delete_ship(player_1_ships=player_1_ships, player_2_ships=player_2_ships,
-                     player_1_ships_facing=player_1_ships_facing,
-                     player_2_ships_facing=player_2_ships_facing, player=1, ship_id=ship_id,
-                     turn_on_music=False,
-                     volume=0.0, effects=effects, death_effect=False)
-        
     return ship_land_interaction_info
 
 def _decrease_cooldowns(
-    player_1_ships: dict,
-    player_2_ships: dict,
+    cooldowns: list
 ):
-    for key in player_1_ships.keys():
-        player_1_ships[key][3] = max(player_1_ships[key][3] - 1, 0)
-        player_1_ships[key][4] = max(player_1_ships[key][4] - 1, 0)
+    """
+    Decreases the cooldowns in place
 
-    for key in player_2_ships.keys():
-        player_2_ships[key][3] = max(player_2_ships[key][3] - 1, 0)
-        player_2_ships[key][4] = max(player_2_ships[key][4] - 1, 0)
+    :param cooldowns: columns of the cooldowns of the fleets, or the cooldowns of many fleets stacked into one array
+    """
+    for cooldown in cooldowns:
+        np.maximum(cooldown - 1, 0, out=cooldown)
 
 
 def _handle_visibility(
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_visibility_mask: np.ndarray,
-    player_2_visibility_mask: np.ndarray
+    game_map: np.ndarray,
+    player_1_fleet: Fleet,
+    player_2_fleet: Fleet,
+    player_1_visibility: Visibility,
+    player_2_visibility: Visibility
 ):
-    for ship_id in player_1_ships.keys():
-        ship_x, ship_y = player_1_ships[ship_id][0], player_1_ships[ship_id][1]
-        start_x = max(ship_x - VISION_RANGE, 0)
-        end_x = min(ship_x + VISION_RANGE + 1, BOARD_SIZE)
-        start_y = max(ship_y - VISION_RANGE, 0)
-        end_y = min(ship_y + VISION_RANGE + 1, BOARD_SIZE)
-
-        vision_add_start_x = start_x - ship_x + VISION_RANGE
-        vision_add_end_x = end_x - ship_x + VISION_RANGE
-        vision_add_start_y = start_y - ship_y + VISION_RANGE
-        vision_add_end_y = end_y - ship_y + VISION_RANGE
-
-        player_1_visibility_mask[start_y:end_y, start_x:end_x] = player_1_visibility_mask[start_y:end_y, start_x:end_x] | VISION_ADD_MASK[vision_add_start_y:vision_add_end_y, vision_add_start_x:vision_add_end_x]
-
-    for ship_id in player_2_ships.keys():
-        ship_x, ship_y = player_2_ships[ship_id][0], player_2_ships[ship_id][1]
-        start_x = max(ship_x - VISION_RANGE, 0)
-        end_x = min(ship_x + VISION_RANGE + 1, BOARD_SIZE)
-        start_y = max(ship_y - VISION_RANGE, 0)
-        end_y = min(ship_y + VISION_RANGE + 1, BOARD_SIZE)
-
-        vision_add_start_x = start_x - ship_x + VISION_RANGE
-        vision_add_end_x = end_x - ship_x + VISION_RANGE
-        vision_add_start_y = start_y - ship_y + VISION_RANGE
-        vision_add_end_y = end_y - ship_y + VISION_RANGE
-
-        player_2_visibility_mask[start_y:end_y, start_x:end_x] = player_2_visibility_mask[start_y:end_y, start_x:end_x] | VISION_ADD_MASK[vision_add_start_y:vision_add_end_y,
-                                                                                                                          vision_add_start_x:vision_add_end_x]
+    # Visibility only grows, so only the ships which have moved or were built can reveal something new
+    for fleet, visibility in [(player_1_fleet, player_1_visibility), (player_2_fleet, player_2_visibility)]:
+        slots = fleet.alive_slots()
+        slots = slots[fleet.vision_outdated[slots]]
+        visibility.reveal(rows=fleet.y[slots], cols=fleet.x[slots], game_map=game_map)
+        fleet.vision_outdated[slots] = False
 
 
 def _check_victory_conditions(
     game_map: np.ndarray,
     planets_centers: np.ndarray
 ):
-    player_1_center = planets_centers[0]
-    player_2_center = planets_centers[1]
+    """
+    A player wins, when the base of the other player is captured. Checks also many games at once, for maps of shape
+    (n_games, BOARD_SIZE, BOARD_SIZE) and centers of shape (n_games, n_planets, 2) it returns arrays of flags.
+    """
+    bases_tiles = planets_centers[..., :2, 0] * game_map.shape[-1] + planets_centers[..., :2, 1]
+    bases = np.take_along_axis(game_map.reshape(*game_map.shape[:-2], -1), bases_tiles, axis=-1)
 
-    player_1_victory = game_map[player_2_center[0], player_2_center[1]] & 128 != 128
-    player_2_victory = game_map[player_1_center[0], player_1_center[1]] & 64 != 64
+    player_1_victory = bases[..., 1] & 128 != 128
+    player_2_victory = bases[..., 0] & 64 != 64
     return player_1_victory, player_2_victory
 
 
 def _add_planet_visibility(
     planet_x: int,
     planet_y: int,
-    visibility_mask: np.ndarray
+    visibility: Visibility,
+    game_map: np.ndarray
+):
+    visibility.reveal(rows=[planet_x], cols=[planet_y], game_map=game_map)
+
+
+def _get_targets(
+    ships_x: np.ndarray,
+    ships_y: np.ndarray,
+    ships_player: np.ndarray,
+    directions: np.ndarray,
+    other_ships_x: np.ndarray,
+    other_ships_y: np.ndarray,
+    other_ships_player: np.ndarray,
+    pairs: tuple
 ):
-    start_x = max(planet_x - VISION_RANGE, 0)
-    end_x = min(planet_x + VISION_RANGE + 1, BOARD_SIZE)
-    start_y = max(planet_y - VISION_RANGE, 0)
-    end_y = min(planet_y + VISION_RANGE + 1, BOARD_SIZE)
+    """
+    Returns for every firing ship an index of the nearest enemy ship, which lies in firing range and between -15 and 15
+    degrees of the firing direction, or -1 if there is no such ship. Ties are resolved in favor of the pair listed
+    first.
 
-    vision_add_start_x = start_x - planet_x + VISION_RANGE
-    vision_add_end_x = end_x - planet_x + VISION_RANGE
-    vision_add_start_y = start_y - planet_y + VISION_RANGE
-    vision_add_end_y = end_y - planet_y + VISION_RANGE
+    :param pairs: indices of the firing ships and of the other ships, which are tested as their targets
+    """
+    ships, other_ships = pairs
+    vec_x = other_ships_x[other_ships] - ships_x[ships]
+    vec_y = other_ships_y[other_ships] - ships_y[ships]
+    dist = np.sqrt(vec_x ** 2 + vec_y ** 2)
+
+    # Firing directions are unit vectors, so the dot product gives the cosine of the angle between them
+    direction_x = MOVEMENT_DIRECTIONS[directions[ships], 0]
+    direction_y = MOVEMENT_DIRECTIONS[directions[ships], 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vec_angles = np.arccos(np.clip(vec_x / dist * direction_x + vec_y / dist * direction_y, -1.0, 1.0))
+
+    # Enemy ship on the same tile is always a valid target
+    in_cone = (dist == 0) | ((-np.pi/12 <= vec_angles) & (vec_angles <= np.pi/12))
+    is_target = np.flatnonzero(in_cone & (dist < MAX_SHIP_FIRE_RANGE + 1) &
+                               (other_ships_player[other_ships] != ships_player[ships]))
+
+    # The 1st of the pairs sorted by the firing ship and the distance gives the target
+    is_target = is_target[np.lexsort((is_target, dist[is_target], ships[is_target]))]
+    first = np.unique(ships[is_target], return_index=True)[1]
+    targets = np.full(len(ships_x), -1, dtype=int)
+    targets[ships[is_target[first]]] = other_ships[is_target[first]]
+    return targets
+
+
+def _get_planets_tiles(
+    game_map: np.ndarray,
+    planets_centers: np.ndarray
+) -> tuple:
+    """
+    Returns the flat indices of the tiles of every planet (covered by PLANET_MASK around its center), with shape
+    (n_planets, n_tiles), and the numbers of its resource fields of every type, with shape (n_planets, 4)
+    """
+    mask_rows, mask_cols = np.nonzero(PLANET_MASK)
+    rows = np.asarray(planets_centers, dtype=int)[:, 0:1] - PLANET_MASK.shape[0] // 2 + mask_rows
+    cols = np.asarray(planets_centers, dtype=int)[:, 1:2] - PLANET_MASK.shape[1] // 2 + mask_cols
+    tiles = rows * BOARD_SIZE + cols
 
-    visibility_mask[start_x:end_x, start_y:end_y] = visibility_mask[start_x:end_x, start_y:end_y] | VISION_ADD_MASK[vision_add_start_x:vision_add_end_x,
-                                                                  vision_add_start_y:vision_add_end_y]
+    # Resource fields don't change during the game, only the ownership bits of their tiles do
+    fields = game_map.flat[tiles] & ~(64 | 128)
+    rf_counts = (fields[:, :, None] == RF_CODINGS).sum(axis=1)
+    return tiles, rf_counts
 
 
-def _get_target(
-    ship_x: int,
-    ship_y: int,
-    direction: int,
-    player: int,
-    player_1_ships: dict,
-    player_2_ships: dict
-):
+def _get_planet_ids_grid(planets_centers: np.ndarray) -> np.ndarray:
     """
-    Returns id of the first ship, that player's ship is facing, if it is in firing range
+    Returns the (row, col) grid of the board with the id of the planet, within whose SHIP_OCCUPATION_RANGE the tile
+    lies, or -1. If a tile is in range of many planets, the one with the lowest id is taken.
     """
-    if player == 0:
-        enemy_ships = player_2_ships
-    else:
-        enemy_ships = player_1_ships
-
-    if len(enemy_ships.keys()) == 0:
-        return -1
-
-    ship_vec = np.array([ship_x, ship_y], dtype=int)
-    target_vec = np.array([ship_x, ship_y], dtype=int) + MOVEMENT_DIRECTIONS[direction] * MAX_SHIP_FIRE_RANGE
-    target_vec -= ship_vec
-    vec_to_other_ships = np.array([(x, y) for ship_id, (x, y, hp, firing_cooldown, move_cooldown) in enemy_ships.items()], dtype=int)
-    vec_to_other_ships = vec_to_other_ships - ship_vec
-    vec_angles = [np.arccos(np.clip(np.dot(vec/np.linalg.norm(vec), target_vec/np.linalg.norm(target_vec)), -1.0, 1.0)) if np.linalg.norm(vec) != 0 else 0 for vec in vec_to_other_ships]
-
-    target_id = -1
-    min_dist = MAX_SHIP_FIRE_RANGE + 1
-    for i in range(len(enemy_ships.keys())):
-
-        # Get all ships between -15 and 15 degrees
-        if -np.pi/12 <= vec_angles[i] <= np.pi/12 and min_dist > np.linalg.norm(vec_to_other_ships[i]):
-            target_id = list(enemy_ships.keys())[i]
-            min_dist = np.linalg.norm(vec_to_other_ships[i])
-    return target_id
-
-
-def _get_player_next_id(player: int):
-    global player_1_ships_next_id, player_2_ships_next_id
-    if player == 0:
-        player_1_ships_next_id += 1
-        return player_1_ships_next_id - 1
-    else:
-        player_2_ships_next_id += 1
-        return player_2_ships_next_id - 1
-
-
-def _get_planet_id_by_ship_position(ship_x, ship_y, planets_centers):
-    for e, center in enumerate(planets_centers):
-        if np.linalg.norm([ship_x - center[1], ship_y - center[0]]) <= SHIP_OCCUPATION_RANGE:
-            return e
-    return -1
-
-
-def _delete_healing_effect(
-        player: int,
-        ship_id: int,
-        effects: list
-):
-    i = 0
-    while i < len(effects):
-        if effects[i][0] == 1 and effects[i][1] == player and effects[i][2] == ship_id:
-            effects.pop(i)
-        i += 1
+    grid = np.full((BOARD_SIZE, BOARD_SIZE), -1, dtype=int)
+    offsets = np.arange(-int(SHIP_OCCUPATION_RANGE), int(SHIP_OCCUPATION_RANGE) + 1)
+    d_rows, d_cols = np.meshgrid(offsets, offsets, indexing="ij")
+    in_range = np.sqrt(d_rows ** 2 + d_cols ** 2) <= SHIP_OCCUPATION_RANGE
+    d_rows, d_cols = d_rows[in_range], d_cols[in_range]
+
+    # Planets with lower ids are written last, so they take the shared tiles
+    for e in range(len(planets_centers) - 1, -1, -1):
+        rows, cols = planets_centers[e][0] + d_rows, planets_centers[e][1] + d_cols
+        on_board = (0 <= rows) & (rows < BOARD_SIZE) & (0 <= cols) & (cols < BOARD_SIZE)
+        grid[rows[on_board], cols[on_board]] = e
+    return grid
 
 
 def _delete_ship(
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
+    fleet: Fleet,
     player: int,
     ship_id: int,
-    turn_on_music: bool,
-    volume: float,
-    effects: list,
+    effects: Effects,
+    sound_events: set = None,
     death_effect: bool = True
 ):
-    if player == 0:
-        ship_list = player_1_ships
-        ship_list_facing = player_1_ships_facing
-    else:
-        ship_list = player_2_ships
-        ship_list_facing = player_2_ships_facing
-
     if death_effect:
-        effects.append([0, ship_list[ship_id][0], ship_list[ship_id][1], 0])
-
-    _delete_healing_effect(player, ship_id, effects)
+        slot = fleet.slot(ship_id)
+        effects.add_death(fleet.x[slot], fleet.y[slot])
 
-    del ship_list[ship_id]
-    del ship_list_facing[ship_id]
+    effects.stop_healing(player, ship_id)
 
-    if turn_on_music:
-        play_ship_explosion_sound(volume=volume)
+    fleet.remove(ship_id)
 
+    if sound_events is not None:
+        sound_events.add(SHIP_EXPLOSION_SOUND)
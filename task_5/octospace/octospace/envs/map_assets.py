@@ -168,20 +168,22 @@ SHIP_ORIENTATIONS_MAP = {
     3: 'back'
 }
 
+# Ships in the colors of the players are generated from these images for every match
+SHIP_IMAGES = {
+    i: pygame.transform.scale(
+        pygame.transform.flip(pygame.image.load(f'assets/battleship_{SHIP_ORIENTATIONS_MAP[i]}.png'), flip_x=i == 2, flip_y=False),
+        size=(SIDE_SHIP_SIZE, SIDE_SHIP_SIZE) if i in [0, 2] else (SHIP_SIZE, SHIP_SIZE))
+    for i in range(4)
+}
+
 
 def generate_players_assets(
     player_1_id: int,
     player_2_id: int
 ):
     for i in range(4):
-        ship_img_1 = pygame.image.load(f'assets/battleship_{SHIP_ORIENTATIONS_MAP[i]}.png')
-        if i == 2:
-            ship_img_1 = pygame.transform.flip(ship_img_1, flip_x=True, flip_y=False)
-        if i in [0, 2]:
-            ship_img_1 = pygame.transform.scale(ship_img_1, size=(SIDE_SHIP_SIZE, SIDE_SHIP_SIZE))
-        else:
-            ship_img_1 = pygame.transform.scale(ship_img_1, size=(SHIP_SIZE, SHIP_SIZE))
-        ship_img_2 = ship_img_1.copy()
+        ship_img_1 = SHIP_IMAGES[i].copy()
+        ship_img_2 = SHIP_IMAGES[i].copy()
 
         ship_img_1.fill(TEAM_COLORS[player_1_id], special_flags=BLEND_MULT)
         ship_img_2.fill(TEAM_COLORS[player_2_id], special_flags=BLEND_MULT)
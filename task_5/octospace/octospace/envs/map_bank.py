@@ -0,0 +1,66 @@
+import numpy as np
+
+from octospace.envs.game_config import BOARD_SIZE, N_PLANETS, FRAC_OF_IONIZED_AREA
+from octospace.envs.map_generation import _generate_map, _generate_state_map
+
+
+N_IONIZED_FIELDS = int(BOARD_SIZE ** 2 * FRAC_OF_IONIZED_AREA)
+
+# Every map of the bank is stored as a single record
+MAP_BANK_DTYPE = np.dtype([
+    ("map", np.uint8, (BOARD_SIZE, BOARD_SIZE)),
+    ("state_ids", np.uint8, (BOARD_SIZE, BOARD_SIZE)),
+    ("planets_centers", np.int16, (N_PLANETS, 2)),
+    ("ionized_fields", np.int16, (N_IONIZED_FIELDS, 3))        # row, column and animation frame of every field
+])
+
+
+def generate_map_bank(path: str, n_maps: int, seed: int = None):
+    """
+    Generates n_maps maps and saves them into a single .npy file, which can be memory-mapped
+
+    :param path: path to the created file
+    :param n_maps: number of maps to be generated
+    :param seed: seed of the map generation
+    """
+    rng = np.random.default_rng(seed)
+
+    bank = np.lib.format.open_memmap(path, mode="w+", dtype=MAP_BANK_DTYPE, shape=(n_maps,))
+    for i in range(n_maps):
+        game_map, planets_centers, ionized_field_id = _generate_map(rng=rng)
+
+        bank[i]["map"] = game_map
+        bank[i]["state_ids"] = _generate_state_map(game_map=game_map, rng=rng)
+        bank[i]["planets_centers"] = planets_centers
+        bank[i]["ionized_fields"] = [[row, col, frame] for (row, col), frame in ionized_field_id.items()]
+    bank.flush()
+
+
+class MapBank:
+    """
+    Maps generated in advance with generate_map_bank. The file is memory-mapped, so only the loaded maps are ever read
+    from the disk.
+
+    Args:
+        path: path to the file created by generate_map_bank
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._bank = np.load(path, mmap_mode="r")
+        assert self._bank.dtype == MAP_BANK_DTYPE, "The map bank was generated with different game settings"
+
+    def __len__(self):
+        return len(self._bank)
+
+    def load(self, map_index: int):
+        """
+        Returns the map in the same format as it is generated by the environment:
+        (map, state ids, centers of the unoccupied planets, ionized field id)
+        """
+        record = self._bank[map_index]
+        game_map = record["map"].astype(int)
+        state_ids = record["state_ids"].astype(float)
+        planets_centers = record["planets_centers"].astype(int)
+        ionized_field_id = {(row, col): frame for row, col, frame in record["ionized_fields"].tolist()}
+        return game_map, state_ids, planets_centers, ionized_field_id
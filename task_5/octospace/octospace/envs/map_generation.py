@@ -9,10 +9,15 @@ from scipy.spatial.distance import cdist
 from octospace.envs.utils import NoSpaceOnMapException
 
 
-def _generate_map():
+ASTEROID_AREAS = np.array([ASTEROID_AREA[asteroid_id] for asteroid_id in range(len(ASTEROID_AREA))])
+ASTEROID_TILES = {asteroid_id: np.nonzero(scheme) for asteroid_id, scheme in ASTEROID_ID_TO_SCHEME.items()}
+
+
+def _generate_map(rng: np.random.Generator):
     """
     Function generates a new map.
 
+    :param rng: random generator used for the generation
     :return: np.ndarray of shape (BOARD_SIZE, BOARD_SIZE)
     """
     game_map = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=int)
@@ -28,7 +33,7 @@ def _generate_map():
 
     # Generate unoccupied planets
     for _ in range(N_PLANETS):
-        new_planet_center = np.random.randint(PLANETS_OFFSET, BOARD_SIZE - PLANETS_OFFSET, size=2, dtype=int)
+        new_planet_center = rng.integers(PLANETS_OFFSET, BOARD_SIZE - PLANETS_OFFSET, size=2, dtype=int)
 
         if len(centers) == 0:
             centers.append(new_planet_center)
@@ -40,7 +45,7 @@ def _generate_map():
             if failed_attempts >= 1000:
                 raise NoSpaceOnMapException("There's no space to place that many planets on the map")
 
-            new_planet_center = np.random.randint(PLANETS_OFFSET, BOARD_SIZE - PLANETS_OFFSET, size=2, dtype=int)
+            new_planet_center = rng.integers(PLANETS_OFFSET, BOARD_SIZE - PLANETS_OFFSET, size=2, dtype=int)
             intra_dist = np.min(cdist([new_planet_center], centers))
             failed_attempts += 1
         centers.append(new_planet_center)
@@ -54,52 +59,61 @@ def _generate_map():
     for planet_center in centers:
         left_upper = (planet_center[0] - 4, planet_center[1] - 4)
         game_map[left_upper[0]:left_upper[0] + PLANETS_DIAMETER, left_upper[1]:left_upper[1] + PLANETS_DIAMETER] = (
-            _generate_planet())
+            _generate_planet(rng=rng))
 
-    # Generate asteroids
+    # Generate asteroids. Shapes of the asteroid fields are drawn all at once, and used until the remaining area gets
+    # smaller than the largest shape
     area_left = int(BOARD_SIZE ** 2 * FRAC_OF_ASTEROID_AREA)
-    max_asteroid_area = np.max(list(ASTEROID_AREA.values()))
-    while area_left >= max_asteroid_area:
-        asteroid_id = np.random.randint(0, len(ASTEROID_AREA.keys()), size=1, dtype=int)[0]
-        asteroid_scheme = ASTEROID_ID_TO_SCHEME[asteroid_id]
-        left_upper = (np.random.randint(0, BOARD_SIZE - asteroid_scheme.shape[0], size=1, dtype=int)[0],
-                      np.random.randint(0, BOARD_SIZE - asteroid_scheme.shape[1], size=1, dtype=int)[0])
+    asteroid_ids = rng.integers(0, len(ASTEROID_AREAS), size=area_left // np.min(ASTEROID_AREAS) + 1)
+    areas_left = area_left - np.concatenate([[0], np.cumsum(ASTEROID_AREAS[asteroid_ids])[:-1]])
+    asteroid_ids = asteroid_ids[areas_left >= np.max(ASTEROID_AREAS)]
 
-        failed_attempts = 0
-        while np.sum(asteroid_scheme * game_map[left_upper[0]:left_upper[0] + asteroid_scheme.shape[0],
-                                       left_upper[1]:left_upper[1] + asteroid_scheme.shape[1]]) != 0:
-            if failed_attempts >= 1000:
-                raise NoSpaceOnMapException("There's no space to place next asteroid field")
-            left_upper = (np.random.randint(0, BOARD_SIZE - asteroid_scheme.shape[0], size=1, dtype=int)[0],
-                          np.random.randint(0, BOARD_SIZE - asteroid_scheme.shape[1], size=1, dtype=int)[0])
-            failed_attempts += 1
+    for asteroid_id in asteroid_ids:
+        asteroid_scheme = ASTEROID_ID_TO_SCHEME[asteroid_id]
+        left_upper = _sample_free_position(game_map=game_map, scheme_tiles=ASTEROID_TILES[asteroid_id],
+                                           scheme_shape=asteroid_scheme.shape, rng=rng)
+        if left_upper is None:
+            raise NoSpaceOnMapException("There's no space to place next asteroid field")
 
         game_map[left_upper[0]:left_upper[0] + asteroid_scheme.shape[0],
         left_upper[1]:left_upper[1] + asteroid_scheme.shape[1]] += asteroid_scheme
 
-        area_left -= ASTEROID_AREA[asteroid_id]
-
-    # Generate ionized fields (speed boost for ships)
+    # Generate ionized fields (speed boost for ships) on randomly chosen empty tiles
     n_ionized_fields = int(BOARD_SIZE ** 2 * FRAC_OF_IONIZED_AREA)
-    ionized_field_id = {}
-    failed_attempts = 0
-    while n_ionized_fields > 0:
-        if failed_attempts >= 10000:
-            raise NoSpaceOnMapException("There's no space to place next ionized field")
+    empty_tiles = np.flatnonzero(game_map == 0)
+    if len(empty_tiles) < n_ionized_fields:
+        raise NoSpaceOnMapException("There's no space to place next ionized field")
 
-        field_position = np.random.randint(0, BOARD_SIZE, size=2, dtype=int)
-        failed_attempts += 1
-
-        if not game_map[field_position[0], field_position[1]]:
-            failed_attempts = 0
-            game_map[field_position[0], field_position[1]] = 4
-            ionized_field_id[(field_position[0], field_position[1])] = np.random.randint(0, len(IONIZED_FIELDS.keys()) - 1)
-            n_ionized_fields -= 1
+    fields_rows, fields_cols = np.divmod(rng.choice(empty_tiles, size=n_ionized_fields, replace=False), BOARD_SIZE)
+    fields_ids = rng.integers(0, len(IONIZED_FIELDS.keys()) - 1, size=n_ionized_fields)
+    game_map[fields_rows, fields_cols] = 4
+    ionized_field_id = dict(zip(zip(fields_rows.tolist(), fields_cols.tolist()), fields_ids.tolist()))
 
     return game_map, centers, ionized_field_id
 
 
-def _generate_planet():
+def _sample_free_position(game_map: np.ndarray, scheme_tiles: tuple, scheme_shape: tuple, rng: np.random.Generator,
+                          max_attempts: int = 1000, batch_size: int = 16):
+    """
+    Function samples uniformly an upper left corner, at which a scheme can be placed on the map without overlapping
+    any non-empty tile. Candidates are drawn and checked in batches and the first free one is returned.
+
+    :param scheme_tiles: rows and columns of the non-empty tiles of the scheme
+    :param scheme_shape: shape of the scheme
+    :return: np.ndarray [row, col] or None, if none of max_attempts candidates was free
+    """
+    high = (BOARD_SIZE - scheme_shape[0], BOARD_SIZE - scheme_shape[1])
+    for _ in range(0, max_attempts, batch_size):
+        candidates = rng.integers(0, high, size=(batch_size, 2))
+        overlaps = game_map[candidates[:, 0:1] + scheme_tiles[0], candidates[:, 1:2] + scheme_tiles[1]].any(axis=1)
+
+        first_free = overlaps.argmin()
+        if not overlaps[first_free]:
+            return candidates[first_free]
+    return None
+
+
+def _generate_planet(rng: np.random.Generator):
     """
     Function generates a 9x9 scheme of a new planet, with random ratio of resource fields.
     There are in total 16 resource fields on a planet, and there needs to be at least 1 of each field.
@@ -109,7 +123,7 @@ def _generate_planet():
     resource_fields = []
     fields_left = 16
     for i in range(3):
-        resource_fields.append(np.random.randint(1, fields_left - (3 - i)))
+        resource_fields.append(int(rng.integers(1, fields_left - (3 - i))))
         fields_left -= resource_fields[-1]
     resource_fields.append(fields_left)
 
@@ -133,16 +147,16 @@ def _add_base_planet_occupation(game_map: np.ndarray, centers:list):
     game_map[centers[1][0] - 4: centers[1][0] + 5, centers[1][1] - 4: centers[1][1] + 5] |= 128
 
 
-def _generate_state_map(game_map: np.ndarray):
+def _generate_state_map(game_map: np.ndarray, rng: np.random.Generator):
     state_id_map = np.zeros(shape=game_map.shape)
     land_mask = game_map & 3 == 1
     land_non_zero = np.count_nonzero(land_mask)
-    land_ids = np.random.randint(0, len(LAND.keys()), land_non_zero)
+    land_ids = rng.integers(0, len(LAND.keys()), land_non_zero)
     state_id_map[land_mask] = land_ids
 
     asteroid_mask = game_map & 3 == 2
     asteroid_non_zero = np.count_nonzero(asteroid_mask)
-    asteroid_ids = np.random.randint(0, len(ASTEROIDS.keys()), asteroid_non_zero)
+    asteroid_ids = rng.integers(0, len(ASTEROIDS.keys()), asteroid_non_zero)
     state_id_map[asteroid_mask] = asteroid_ids
 
     return state_id_map
@@ -0,0 +1,231 @@
+import json
+
+import numpy as np
+
+from octospace.envs.octospace import OctoSpaceEnv
+
+
+FORMAT_VERSION = 1
+
+# Layers of the map, which don't change during the game, they are saved only once
+STATIC_KEYS = ("state_ids", "planets_centers", "ionized_field_id")
+# Parts of the game state, which aren't arrays
+JSON_KEYS = ("player_1_score", "player_2_score", "player_ids", "victorious_player", "terminated", "turn", "round",
+             "rng_state")
+# Effects are lists of 4 or 5 integers, they are saved as rows of a table with their length in the 1st column
+EFFECT_COLUMNS = 6
+
+# Columns of the table with the commands of the ships, ship ids are delta-encoded within every turn of a player
+COMMAND_COLUMNS = ("ship_id", "action_type", "direction", "speed", "length")
+
+
+class MatchRecorder:
+    """
+    Records a single game played in OctoSpaceEnv into a compact .npz file, which can be replayed with MatchReplay.
+
+    Only the actions of both players are saved every turn, in a columnar table of the ships' commands. The whole state of
+    the game (see OctoSpaceEnv.get_state) is saved as a keyframe only at the start and every keyframe_interval turns,
+    so the replay can start from any turn after re-simulating at most keyframe_interval turns.
+
+    Values of the commands are saved as integers, as the action space of the environment allows only them.
+
+    Args:
+        path: path to the created file, e.g. match.npz
+        keyframe_interval: number of turns between the keyframes
+    """
+
+    def __init__(self, path: str, keyframe_interval: int = 100):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+
+        self._env: OctoSpaceEnv = None
+        self._first_turn = None
+        self._keyframes = []
+        self._construction = []
+        self._n_commands = []
+        self._commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self, env: OctoSpaceEnv):
+        """
+        Starts recording the game from the current state of the environment, usually right after the reset
+        """
+        self._env = env.unwrapped
+        self._first_turn = self._env.turn
+        self._keyframes.append(self._env.get_state())
+
+    def record(self, actions: dict):
+        """
+        Records the actions of both players, which have just been passed to step
+        """
+        construction, n_commands, commands = [], [], []
+        for player in ["player_1", "player_2"]:
+            player_commands = actions[player]["ships_actions"]
+            construction.append(int(actions[player]["construction"]))
+            n_commands.append(len(player_commands))
+            commands.append(np.array([(command[0], command[1], command[2], command[3] if len(command) > 3 else 0,
+                                       len(command)) for command in player_commands],
+                                     dtype=np.int32).reshape(-1, len(COMMAND_COLUMNS)))
+
+        # The turn is added at once, so the columns stay aligned even if the recording is interrupted
+        self._construction.extend(construction)
+        self._n_commands.extend(n_commands)
+        self._commands.extend(commands)
+
+        if (self._env.turn - self._first_turn) % self.keyframe_interval == 0 and not self._env.terminated:
+            self._keyframes.append(self._env.get_state())
+
+    def close(self):
+        """
+        Writes the recorded game into the file
+        """
+        if self._env is None:
+            return
+
+        n_commands = np.array(self._n_commands, dtype=int).reshape(-1, 2)
+        commands = np.concatenate(self._commands).astype(int) if self._commands else np.zeros((0, len(COMMAND_COLUMNS)), dtype=int)
+
+        # Ships of a player usually get their commands in the order of their ids, so the differences are small
+        ship_ids = commands[:, 0].copy()
+        commands[1:, 0] -= ship_ids[:-1]
+        starts = np.cumsum(n_commands.ravel())[:-1]
+        starts = starts[starts < len(commands)]
+        commands[starts, 0] = ship_ids[starts]
+        if len(commands):
+            commands[0, 0] = ship_ids[0]
+
+        arrays = {
+            "n_commands": n_commands,
+            "construction": np.array(self._construction, dtype=int).reshape(-1, 2),
+            **{f"command_{column}": commands[:, e] for e, column in enumerate(COMMAND_COLUMNS)}
+        }
+
+        first_state = self._keyframes[0]
+        arrays["state_ids"] = first_state["state_ids"]
+        arrays["planets_centers"] = first_state["planets_centers"]
+        arrays["ionized_field_id"] = np.array([(*coords, field_id) for coords, field_id in
+                                               first_state["ionized_field_id"].items()], dtype=int).reshape(-1, 3)
+
+        keyframes = []
+        dtypes = {}
+        for k, state in enumerate(self._keyframes):
+            for key, value in state.items():
+                if key in STATIC_KEYS or key in JSON_KEYS or key == "effects":
+                    continue
+                dtypes[key] = np.asarray(value).dtype.str
+                arrays[f"keyframe_{k}_{key}"] = value
+
+            effects = np.zeros((len(state["effects"]), EFFECT_COLUMNS), dtype=int)
+            for effect, row in zip(state["effects"], effects):
+                row[0] = len(effect)
+                row[1:len(effect) + 1] = effect
+            arrays[f"keyframe_{k}_effects"] = effects
+            keyframes.append({key: state[key] for key in JSON_KEYS})
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "player_ids": [self._env.player_1_id_original, self._env.player_2_id_original],
+            "max_steps": self._env.max_steps,
+            "first_turn": self._first_turn,
+            "keyframe_interval": self.keyframe_interval,
+            "keyframes": keyframes,
+            "dtypes": dtypes
+        }
+        # Numpy scalars (e.g. in the victorious player) are saved as the plain values
+        arrays["meta"] = np.frombuffer(json.dumps(meta, default=lambda value: value.item()).encode(), dtype=np.uint8)
+
+        np.savez_compressed(self.path, **{key: _compact(value) for key, value in arrays.items()})
+        self._env = None
+
+
+class MatchReplay:
+    """
+    Replays a game recorded with MatchRecorder. Any turn of the game is reconstructed by restoring the nearest earlier
+    keyframe and re-simulating the recorded actions, without the agents.
+
+    Args:
+        path: path to the recorded game
+        render_mode: render mode of the environment, in which the game is replayed
+        renderer: renderer of the environment, see OctoSpaceEnv
+    """
+
+    def __init__(self, path: str, render_mode: str = None, renderer: str = "pygame"):
+        with np.load(path) as data:
+            self._data = {key: data[key] for key in data.files}
+        self.meta = json.loads(self._data["meta"].tobytes().decode())
+        assert self.meta["version"] == FORMAT_VERSION, f"Unsupported version of the recording: {self.meta['version']}"
+
+        self.first_turn = self.meta["first_turn"]
+        self.last_turn = self.first_turn + len(self._data["construction"])
+        self._keyframe_turns = np.array([keyframe["turn"] for keyframe in self.meta["keyframes"]])
+
+        # Commands of every turn of every player are in the rows between the consecutive offsets
+        self._offsets = np.concatenate([[0], np.cumsum(self._data["n_commands"].ravel().astype(int))])
+        self._commands = np.stack([self._data[f"command_{column}"].astype(int) for column in COMMAND_COLUMNS], axis=1)
+
+        self.env = OctoSpaceEnv(player_1_id=self.meta["player_ids"][0], player_2_id=self.meta["player_ids"][1],
+                                max_steps=self.meta["max_steps"], render_mode=render_mode, renderer=renderer)
+        self.env.reset()
+        self._restored = False
+
+    def actions(self, turn: int) -> dict:
+        """
+        Returns the actions of both players, which were passed to step in the given turn
+        """
+        assert self.first_turn <= turn < self.last_turn, f"Actions of the turns {self.first_turn}-{self.last_turn - 1} were recorded"
+        actions = {}
+        for player in range(2):
+            segment = 2 * (turn - self.first_turn) + player
+            commands = self._commands[self._offsets[segment]:self._offsets[segment + 1]].copy()
+            commands[:, 0] = np.cumsum(commands[:, 0])
+            actions[f"player_{player + 1}"] = {
+                "ships_actions": [command[:length] for *command, length in commands.tolist()],
+                "construction": int(self._data["construction"].ravel()[segment])
+            }
+        return actions
+
+    def seek(self, turn: int) -> OctoSpaceEnv:
+        """
+        Restores the game at the start of the given turn (before the actions of this turn)
+
+        :return: the environment with the restored game
+        """
+        assert self.first_turn <= turn <= self.last_turn, f"Turns {self.first_turn}-{self.last_turn} were recorded"
+        k = np.searchsorted(self._keyframe_turns, turn, side="right") - 1
+        keyframe_turn = int(self._keyframe_turns[k])
+        # Keep stepping from the current state, if it is between the keyframe and the given turn
+        if not self._restored or not keyframe_turn <= self.env.turn <= turn:
+            self.env.set_state(self._get_keyframe(k))
+            self._restored = True
+
+        while self.env.turn < turn:
+            self.env._step_game(self.actions(self.env.turn))
+        return self.env
+
+    def _get_keyframe(self, k: int) -> dict:
+        state = {key: self._data[f"keyframe_{k}_{key}"].astype(dtype) for key, dtype in self.meta["dtypes"].items()}
+        state.update(self.meta["keyframes"][k])
+        state["effects"] = [row[1:row[0] + 1] for row in self._data[f"keyframe_{k}_effects"].tolist()]
+        state["player_ids"] = tuple(state["player_ids"])
+        state["state_ids"] = self._data["state_ids"]
+        state["planets_centers"] = self._data["planets_centers"].astype(int)
+        state["ionized_field_id"] = {(row, col): field_id for row, col, field_id in self._data["ionized_field_id"].tolist()}
+        return state
+
+
+def _compact(array: np.ndarray) -> np.ndarray:
+    """
+    Casts an array of integers to the smallest integer type, which holds all of its values
+    """
+    array = np.asarray(array)
+    if array.dtype.kind not in "iu" or array.size == 0:
+        return array
+    for dtype in [np.uint8, np.int8, np.uint16, np.int16, np.int32]:
+        if np.iinfo(dtype).min <= array.min() and array.max() <= np.iinfo(dtype).max:
+            return array.astype(dtype)
+    return array
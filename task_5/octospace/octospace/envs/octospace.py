@@ -14,21 +14,36 @@ from octospace.envs.game_config import (MAX_RESOURCES, MAP_MAX_VALUE,
                                         RESOURCE_PRODUCTION_DIVISOR)
 from octospace.envs.map_assets import BORDER, BORDER_SCORE, generate_players_assets
 from octospace.envs.map_generation import _generate_map, _generate_state_map, _add_base_planet_occupation, _reset_planets_occupation
-from octospace.envs.rendering import (_render_planets, _render_planet_occupation, _render_ongoing_planet_capture, _render_players,
-                       _render_ships, _render_turn, _render_background, _render_team_names, _render_resources,
+from octospace.envs.array_rendering import ArrayCanvas, TileCanvas
+from octospace.envs.rendering import (BoardCanvas, _render_ionized_fields, _render_ongoing_planet_capture,
+                       _render_ships, _render_turn, _render_team_names, _render_resources,
                        _render_effects, _render_vision_debug, _render_score)
-from octospace.envs.game_logic import (_ship_firing, _ship_movement, _ship_construction, _occupation_progress,
+from octospace.envs.game_logic import (_collect_commands, _ship_firing, _ship_movement, _ship_construction, _occupation_progress,
                         _change_ownership_of_planets, _ship_land_interaction, _decrease_cooldowns, _handle_ship_death,
-                        _handle_visibility, _add_planet_visibility, _check_victory_conditions)
-from octospace.envs.sound import setup_music_loop, get_new_track
+                        _handle_visibility, _add_planet_visibility, _check_victory_conditions, _get_planet_ids_grid,
+                        _get_planets_tiles)
+from octospace.envs.sound import SoundBank, setup_music_loop, get_new_track
+from octospace.envs.fleet import Fleet, FleetStack
+from octospace.envs.visibility import Visibility
+from octospace.envs.profiler import StepProfiler, _NoProfiler
+from octospace.envs.effects import Effects, _NoEffects
+from octospace.envs.map_bank import MapBank
 
 
 class OctoSpaceEnv(gym.Env):
     """
     Args:
         render_mode: type of visualization, available options: human and rgb_array
+        renderer: renderer of the rgb_array frames, available options: pygame, numpy (same frames painted headless
+            with NumPy, without the smooth edges of the images) and tiles (one pixel per tile of the board)
         turn_on_music: turn on music and sound effects
         volume: change the volume of music and sound effects
+        seed: seed of the random generator of the environment (maps generation), used on the first reset, unless
+            reset is called with its own seed
+        obs_mode: format of the observation, available options: lists and arrays
+        map_bank: optional path to the maps generated in advance with generate_map_bank. New maps are then taken
+            randomly from the bank instead of being generated, and a specific one can be chosen with
+            reset(options={"map_index": i})
 
     Observation Space:
         game_map: whole grid of board_size, which already has applied visibility mask on it
@@ -48,6 +63,14 @@ class OctoSpaceEnv(gym.Env):
             Planets are represented as: (planet_x, planet_y, occupation_progress)
         resources: current resources available for building
 
+    With obs_mode="arrays" ships and planets are returned as fixed-shape arrays instead of lists:
+        allied_ships, enemy_ships: np.ndarray of shape (MAX_SHIPS, 6), the ships are in the first n_allied_ships and
+            n_enemy_ships rows and the remaining rows are filled with -1
+        planets_occupation: np.ndarray of shape (N_PLANETS + 2, 3), the visible planets are in the first n_planets rows
+        n_allied_ships, n_enemy_ships, n_planets: number of valid rows in the arrays above
+    All the arrays are preallocated buffers, which are overwritten on every step (the map is a read-only view of the
+    game state), so they have to be copied if they are meant to be kept.
+
     Action Space:
         ships_actions: player can provide an action to be executed by every of his ships. The command looks as follows:
             (ship id, 0, direction, speed)
@@ -65,14 +88,20 @@ class OctoSpaceEnv(gym.Env):
                  player_1_id: int,
                  player_2_id: int,
                  render_mode: Optional[str] = None,
+                 renderer: str = "pygame",
                  max_steps: int = 2000,
                  turn_on_music: bool = False,
                  volume: float = 0.25,
-                 seed: Optional[int] = None
+                 seed: Optional[int] = None,
+                 obs_mode: str = "lists",
+                 map_bank: Optional[str] = None
                  ):
         assert BOARD_SIZE > 30
         assert N_PLANETS >= 2
         assert render_mode is None or render_mode in self.metadata['render_modes']
+        assert obs_mode in ["lists", "arrays"]
+        assert renderer in ["pygame", "numpy", "tiles"]
+        assert renderer == "pygame" or render_mode != "human", "Only the pygame renderer can render to a window"
 
         self._turn_on_music = turn_on_music
         self.player_1_id = player_1_id
@@ -86,6 +115,9 @@ class OctoSpaceEnv(gym.Env):
         self.volume = volume
         self.seed = seed
         self.render_mode = render_mode
+        self.renderer = renderer
+        self.obs_mode = obs_mode
+        self.map_bank = MapBank(map_bank) if map_bank is not None else None
         self.debug = False
 
         self.observation_space = spaces.Dict({
@@ -127,6 +159,19 @@ class OctoSpaceEnv(gym.Env):
                 "resources": spaces.Box(0, MAX_RESOURCES)
             }) for player in ["player_1", "player_2"]
         })
+        if self.obs_mode == "arrays":
+            self.observation_space = spaces.Dict({
+                player: spaces.Dict({
+                    "map": spaces.Box(-1, MAP_MAX_VALUE, shape=(BOARD_SIZE, BOARD_SIZE), dtype=int),
+                    "allied_ships": spaces.Box(-1, MAX_SHIPS, shape=(MAX_SHIPS, 6), dtype=int),
+                    "n_allied_ships": spaces.Discrete(n=MAX_SHIPS + 1, start=0),
+                    "enemy_ships": spaces.Box(-1, MAX_SHIPS, shape=(MAX_SHIPS, 6), dtype=int),
+                    "n_enemy_ships": spaces.Discrete(n=MAX_SHIPS + 1, start=0),
+                    "planets_occupation": spaces.Box(-1, BOARD_SIZE, shape=(N_PLANETS + 2, 3), dtype=int),
+                    "n_planets": spaces.Discrete(n=N_PLANETS + 3, start=0),
+                    "resources": spaces.Box(0, MAX_RESOURCES, shape=(4,), dtype=int)
+                }) for player in ["player_1", "player_2"]
+            })
         self.action_space = spaces.Dict({
             player: spaces.Dict({
                 "ships_actions": spaces.Sequence(
@@ -158,6 +203,11 @@ class OctoSpaceEnv(gym.Env):
         self._map: np.ndarray = None
         self._state_ids = None
         self._planets_centers: np.ndarray = None
+        # Id of the planet, within whose occupation range every tile lies (-1 if none), tiles of every planet and
+        # the numbers of its resource fields, built once per map (see _setup_planets)
+        self._planet_ids_grid: np.ndarray = None
+        self._planets_tiles: np.ndarray = None
+        self._planets_rf_counts: np.ndarray = None
 
         # Contain the values between 0 and 100, indicating the occupation progress
         # 0 means the whole planet belongs to 1st player
@@ -172,23 +222,32 @@ class OctoSpaceEnv(gym.Env):
         # The higher the absolute value, the faster is the occupation progress
         self._planets_ongoing_occupation: np.ndarray = None
 
-        self._player_1_visibility_mask: np.ndarray = None
-        self._player_2_visibility_mask: np.ndarray = None
+        self._player_1_visibility = Visibility()
+        self._player_2_visibility = Visibility()
+
+        # Buffers reused by every observation in the arrays mode
+        self._obs_buffers: dict = None
+        if self.obs_mode == "arrays":
+            self._obs_buffers = {
+                player: {
+                    "allied_ships": np.full((MAX_SHIPS, 6), -1, dtype=int),
+                    "enemy_ships": np.full((MAX_SHIPS, 6), -1, dtype=int),
+                    "planets_occupation": np.full((N_PLANETS + 2, 3), -1, dtype=int),
+                    "resources": np.zeros(4, dtype=int)
+                } for player in ["player_1", "player_2"]
+            }
         self.ionized_field_id: dict = None
 
         self._player_1_score = 0
         self._player_2_score = 0
 
         # On start both players have 1 battleship at their base
-        self._player_1_ships: dict = None
-        self._player_2_ships: dict = None
-
-        self._player_1_ships_next_id: int = None
-        self._player_2_ships_next_id: int = None
-
-        # 0 - right, 1 - down, 2 - left, 3 - up
-        self._player_1_ships_facing: dict = None
-        self._player_2_ships_facing: dict = None
+        self._player_1_fleet = Fleet()
+        self._player_2_fleet = Fleet()
+        # Columns of both fleets stacked together, so the commands of both players are resolved at once
+        self._fleets = FleetStack([self._player_1_fleet, self._player_2_fleet])
+        # Ships commands of the last turn, see _collect_commands
+        self._commands = _collect_commands(actions=[None], fleets=self._fleets)
 
         self._player_1_resources: np.ndarray = None
         self._player_2_resources: np.ndarray = None
@@ -204,24 +263,40 @@ class OctoSpaceEnv(gym.Env):
 
         self.window: pygame.Surface = None
         self.clock: pygame.time.Clock = None
+        self._board_canvas: BoardCanvas = None
+        self._tile_canvas: TileCanvas = None
 
-        """
-        Death effect: (0, pos_x, pos_y, frame)
-        Healing effect: (1, player, ship_id, frame)
-        Firing effect: (2, ship_x, ship_y, facing, frame)
-        Capture effect: (3, pos_x, pos_y, frame)
-        Space jump effect: (4, pos_x, pos_y, frame)
-        """
-        self.effects = None
+        # Effects are kept only for the renderers, which draw them. Without them the game doesn't keep any effects
+        self.effects = Effects() if render_mode is not None and renderer != "tiles" else _NoEffects()
 
         self.turn: int = None
         self._round = 0
 
+        # Profiling is turned off by default, see enable_profiling
+        self.profiler: StepProfiler = None
+        self._profiler = _NoProfiler()
+
+        # Names of the sound effects of the last step, played when the frame is rendered
+        self._sound_events = set()
+        self._sound_bank: SoundBank = None
         if self._turn_on_music:
             setup_music_loop(volume=volume)
+            self._sound_bank = SoundBank(volume=volume)
 
         pygame.display.set_caption(f"Octospace {VERSION}")
 
+    def enable_profiling(self, track_allocations: bool = False) -> StepProfiler:
+        """
+        Starts recording the time spent in every phase of the step, returns the profiler holding the records
+        """
+        self.profiler = StepProfiler(track_allocations=track_allocations)
+        self._profiler = self.profiler
+        return self.profiler
+
+    def disable_profiling(self):
+        self._profiler.close()
+        self._profiler = _NoProfiler()
+
     def _get_info(self):
         return {}
 
@@ -247,51 +322,109 @@ class OctoSpaceEnv(gym.Env):
             }
 
     def _get_obs(self):
-        player_1_map = self._map.copy()
-        player_2_map = self._map.copy()
-        player_1_map[~(self._player_1_visibility_mask.astype(bool))] = -1
-        player_2_map[~(self._player_2_visibility_mask.astype(bool))] = -1
+        if self.obs_mode == "arrays":
+            return self._get_arrays_obs()
+
+        obs = self._get_units_obs()
+        obs["player_1"]["map"] = self._player_1_visibility.masked_map.copy()
+        obs["player_1"]["resources"] = self._player_1_resources
+        obs["player_2"]["map"] = self._player_2_visibility.masked_map.copy()
+        obs["player_2"]["resources"] = self._player_2_resources
+        return obs
+
+    def _get_units_obs(self):
+        """
+        Returns the ships and planets part of the observation for both players
+        """
+        player_1_slots = self._player_1_fleet.alive_slots()
+        player_2_slots = self._player_2_fleet.alive_slots()
+        # Enemy ships are visible only if they stand on a tile within the player's vision
+        player_1_visible_enemies = player_2_slots[self._player_1_visibility.is_visible(self._player_2_fleet.y[player_2_slots],
+                                                                                      self._player_2_fleet.x[player_2_slots])]
+        player_2_visible_enemies = player_1_slots[self._player_2_visibility.is_visible(self._player_1_fleet.y[player_1_slots],
+                                                                                      self._player_1_fleet.x[player_1_slots])]
+        player_1_visible_planets = self._player_1_visibility.is_visible(self._planets_centers[:, 0], self._planets_centers[:, 1])
+        player_2_visible_planets = self._player_2_visibility.is_visible(self._planets_centers[:, 0], self._planets_centers[:, 1])
 
         return {
             "player_1": {
-                "map": player_1_map,
-                "allied_ships": [[ship_id] + ship for ship_id, ship in self._player_1_ships.items()],
-                "enemy_ships": [[ship_id] + ship for ship_id, ship in self._player_2_ships.items() if self._player_1_visibility_mask[ship[1], ship[0]]],
-                "planets_occupation": [(planet_x, planet_y, occupation) for (planet_x, planet_y), occupation in
-                                       zip(self._planets_centers, self._planets_occupation_progress) if
-                                       self._player_1_visibility_mask[planet_x, planet_y]],
-                "resources": self._player_1_resources
+                "allied_ships": self._player_1_fleet.as_list(player_1_slots),
+                "enemy_ships": self._player_2_fleet.as_list(player_1_visible_enemies),
+                "planets_occupation": [(planet_x, planet_y, occupation) for (planet_x, planet_y), occupation, visible in
+                                       zip(self._planets_centers, self._planets_occupation_progress,
+                                           player_1_visible_planets) if visible]
             },
             "player_2": {
-                "map": player_2_map,
-                "allied_ships": [[ship_id] + ship for ship_id, ship in self._player_2_ships.items()],
-                "enemy_ships": [[ship_id] + ship for ship_id, ship in self._player_1_ships.items() if self._player_2_visibility_mask[ship[1], ship[0]]],
-                "planets_occupation": [(planet_x, planet_y, occupation) for (planet_x, planet_y), occupation in
-                                       zip(self._planets_centers, self._planets_occupation_progress) if
-                                       self._player_2_visibility_mask[planet_x, planet_y]],
-                "resources": self._player_2_resources
+                "allied_ships": self._player_2_fleet.as_list(player_2_slots),
+                "enemy_ships": self._player_1_fleet.as_list(player_2_visible_enemies),
+                "planets_occupation": [(planet_x, planet_y, occupation) for (planet_x, planet_y), occupation, visible in
+                                       zip(self._planets_centers, self._planets_occupation_progress,
+                                           player_2_visible_planets) if visible]
             }
         }
 
+    def _get_arrays_obs(self):
+        """
+        Returns the observation of both players written into the preallocated buffers
+        """
+        obs = {}
+        for player, fleet, enemy_fleet, visibility, resources in [
+            ("player_1", self._player_1_fleet, self._player_2_fleet, self._player_1_visibility, self._player_1_resources),
+            ("player_2", self._player_2_fleet, self._player_1_fleet, self._player_2_visibility, self._player_2_resources)
+        ]:
+            buffers = self._obs_buffers[player]
+
+            allied_slots = fleet.alive_slots()
+            enemy_slots = enemy_fleet.alive_slots()
+            enemy_slots = enemy_slots[visibility.is_visible(enemy_fleet.y[enemy_slots], enemy_fleet.x[enemy_slots])]
+
+            # Grow the ship tables, if a player ever exceeds MAX_SHIPS ships
+            for table, slots in [("allied_ships", allied_slots), ("enemy_ships", enemy_slots)]:
+                if len(slots) > len(buffers[table]):
+                    buffers[table] = np.full((max(fleet.capacity, enemy_fleet.capacity), 6), -1, dtype=int)
+
+            visible_planets = np.flatnonzero(visibility.is_visible(self._planets_centers[:, 0], self._planets_centers[:, 1]))
+            n_planets = len(visible_planets)
+            buffers["planets_occupation"][:n_planets, :2] = self._planets_centers[visible_planets]
+            buffers["planets_occupation"][:n_planets, 2] = np.asarray(self._planets_occupation_progress)[visible_planets]
+            buffers["planets_occupation"][n_planets:] = -1
+
+            buffers["resources"][:] = resources
+
+            game_map = visibility.masked_map
+            game_map.flags.writeable = False
+
+            obs[player] = {
+                "map": game_map,
+                "allied_ships": buffers["allied_ships"],
+                "n_allied_ships": fleet.write_table(buffers["allied_ships"], allied_slots),
+                "enemy_ships": buffers["enemy_ships"],
+                "n_enemy_ships": enemy_fleet.write_table(buffers["enemy_ships"], enemy_slots),
+                "planets_occupation": buffers["planets_occupation"],
+                "n_planets": n_planets,
+                "resources": buffers["resources"]
+            }
+        return obs
+
     def reset(
         self,
         *,
         seed: int = None,
         options: dict[str, Any] = None,
     ) -> Tuple[dict, dict]:
-        # On start both players have 1 battleship at their base
-        self._player_1_ships = {0: [PLAYER_1_ORIGIN[0] + 7, PLAYER_1_ORIGIN[1], 100, 0, 0]}
-        self._player_2_ships = {0: [PLAYER_2_ORIGIN[0] - 8, PLAYER_2_ORIGIN[1], 100, 0, 0]}
-
-        self._player_1_ships_next_id = 1
-        self._player_2_ships_next_id = 1
+        # The seed given on creation is used, unless the random generator has already been seeded
+        if seed is None and self._np_random is None:
+            seed = self.seed
+        super().reset(seed=seed)
 
-        # 0 - right, 1 - down, 2 - left, 3 - up
-        self._player_1_ships_facing = {0: 1}
-        self._player_2_ships_facing = {0: 3}
+        # On start both players have 1 battleship at their base
+        self._player_1_fleet.clear()
+        self._player_2_fleet.clear()
+        self._player_1_fleet.add(ship_id=self._player_1_fleet.new_ship_id(), x=PLAYER_1_ORIGIN[0] + 7, y=PLAYER_1_ORIGIN[1], facing=1)
+        self._player_2_fleet.add(ship_id=self._player_2_fleet.new_ship_id(), x=PLAYER_2_ORIGIN[0] - 8, y=PLAYER_2_ORIGIN[1], facing=3)
 
-        self._player_1_visibility_mask = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=bool)
-        self._player_2_visibility_mask = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=bool)
+        self._player_1_visibility.clear()
+        self._player_2_visibility.clear()
 
         self._player_1_resources = np.array([100, 100, 100, 100], dtype=int)
         self._player_2_resources = np.array([100, 100, 100, 100], dtype=int)
@@ -302,13 +435,20 @@ class OctoSpaceEnv(gym.Env):
         self.victorious_player = [False, False]
         self.terminated = False
 
-        self.effects = []
+        self.effects.clear()
+        self._sound_events.clear()
+        self._commands = _collect_commands(actions=[None], fleets=self._fleets)
 
         self.turn = 1
 
-        # If it is the 2nd round, then don't generate a new map
-        if self._round % 2 == 0:
-            self._generate_map()
+        # If it is the 2nd round, then don't generate a new map (unless a map from the bank is requested)
+        if options is not None and "map_index" in options:
+            self._load_map(options["map_index"])
+        elif self._round % 2 == 0:
+            if self.map_bank is not None:
+                self._load_map(int(self.np_random.integers(0, len(self.map_bank))))
+            else:
+                self._generate_map()
 
         # Handle planets occupation
         _reset_planets_occupation(game_map=self._map)
@@ -323,86 +463,237 @@ class OctoSpaceEnv(gym.Env):
 
         self._round += 1
 
-        _add_planet_visibility(self._planets_centers[0][1], self._planets_centers[0][0], self._player_1_visibility_mask)
-        _add_planet_visibility(self._planets_centers[1][1], self._planets_centers[1][0], self._player_2_visibility_mask)
+        _add_planet_visibility(self._planets_centers[0][1], self._planets_centers[0][0], self._player_1_visibility, self._map)
+        _add_planet_visibility(self._planets_centers[1][1], self._planets_centers[1][0], self._player_2_visibility, self._map)
 
         return self._get_obs(), self._get_info()
 
     def _generate_map(self):
-        self._map, new_planet_centers, ionized_field_id = _generate_map()
-        self._state_ids = _generate_state_map(game_map=self._map)
+        self._map, new_planet_centers, ionized_field_id = _generate_map(rng=self.np_random)
+        self._state_ids = _generate_state_map(game_map=self._map, rng=self.np_random)
         self._planets_centers = [PLAYER_1_ORIGIN, PLAYER_2_ORIGIN]
         self._planets_centers.extend(new_planet_centers)
         self._planets_centers = np.array(self._planets_centers, dtype=int)
+        self._setup_planets()
         self.ionized_field_id = ionized_field_id
 
+    def _load_map(self, map_index: int):
+        assert self.map_bank is not None, "Maps can be loaded only when the environment is created with a map bank"
+        self._map, self._state_ids, new_planet_centers, self.ionized_field_id = self.map_bank.load(map_index)
+        self._planets_centers = np.concatenate([[PLAYER_1_ORIGIN, PLAYER_2_ORIGIN], new_planet_centers]).astype(int)
+        self._setup_planets()
+
+    def _setup_planets(self):
+        """
+        Precomputes the lookups of the planets of the current map, which don't change during the game
+        """
+        self._planet_ids_grid = _get_planet_ids_grid(self._planets_centers)
+        self._planets_tiles, self._planets_rf_counts = _get_planets_tiles(self._map, self._planets_centers)
+
+    def get_state(self) -> dict:
+        """
+        Returns a snapshot of the whole game, which can be restored with set_state (e.g. to explore moves in a tree
+        search). The snapshot doesn't share any mutable data with the environment, except for the layers of the map,
+        which don't change during the game (state ids, planets centers and ionized fields).
+        """
+        return {
+            "map": self._map.astype(np.uint8),
+            "state_ids": self._state_ids,
+            "planets_centers": self._planets_centers,
+            "ionized_field_id": self.ionized_field_id,
+            "planets_occupation_progress": np.array(self._planets_occupation_progress, dtype=int),
+            "planets_ongoing_occupation": np.array(self._planets_ongoing_occupation, dtype=int),
+            "player_1_fleet": self._player_1_fleet.get_state(),
+            "player_2_fleet": self._player_2_fleet.get_state(),
+            "player_1_visibility": self._player_1_visibility.get_state(),
+            "player_2_visibility": self._player_2_visibility.get_state(),
+            "player_1_resources": self._player_1_resources.copy(),
+            "player_2_resources": self._player_2_resources.copy(),
+            "player_1_occupied_rf": self._player_1_occupied_rf.copy(),
+            "player_2_occupied_rf": self._player_2_occupied_rf.copy(),
+            "player_1_score": self._player_1_score,
+            "player_2_score": self._player_2_score,
+            "player_ids": (self.player_1_id, self.player_2_id),
+            "victorious_player": list(self.victorious_player),
+            "terminated": self.terminated,
+            "effects": self.effects.get_state(),
+            "turn": self.turn,
+            "round": self._round,
+            "rng_state": self.np_random.bit_generator.state
+        }
+
+    def set_state(self, state: dict):
+        """
+        Restores the game from a snapshot returned by get_state
+        """
+        # Arrays are written in place when possible, as they can be views of the stacked arrays of the vector env
+        if self._map is None or self._map.shape != state["map"].shape:
+            self._map = state["map"].astype(int)
+        else:
+            self._map[:] = state["map"]
+        self._state_ids = state["state_ids"]
+        # Snapshots of the same game share the planets centers, so the lookups are rebuilt only for a different map
+        rebuild_planets = self._planet_ids_grid is None or state["planets_centers"] is not self._planets_centers
+        self._planets_centers = state["planets_centers"]
+        if rebuild_planets:
+            self._setup_planets()
+        self.ionized_field_id = state["ionized_field_id"]
+
+        if self._planets_occupation_progress is None or len(self._planets_occupation_progress) != len(self._planets_centers):
+            self._reset_planets_occupation_state()
+        self._planets_occupation_progress[:] = state["planets_occupation_progress"]
+        self._planets_ongoing_occupation[:] = state["planets_ongoing_occupation"]
+
+        self._player_1_fleet.set_state(state["player_1_fleet"])
+        self._player_2_fleet.set_state(state["player_2_fleet"])
+        self._player_1_visibility.set_state(state["player_1_visibility"], game_map=self._map)
+        self._player_2_visibility.set_state(state["player_2_visibility"], game_map=self._map)
+
+        self._player_1_resources = state["player_1_resources"].copy()
+        self._player_2_resources = state["player_2_resources"].copy()
+        self._player_1_occupied_rf = state["player_1_occupied_rf"].copy()
+        self._player_2_occupied_rf = state["player_2_occupied_rf"].copy()
+        self._player_1_score = state["player_1_score"]
+        self._player_2_score = state["player_2_score"]
+        self.player_1_id, self.player_2_id = state["player_ids"]
+
+        self.victorious_player = list(state["victorious_player"])
+        self.terminated = state["terminated"]
+        self.effects.set_state(state["effects"])
+        self.turn = state["turn"]
+        self._round = state["round"]
+        self.np_random.bit_generator.state = state["rng_state"]
+
     def _reset_planets_occupation_state(self):
-        self._planets_occupation_progress = [-1 for _ in range(len(self._planets_centers))]
+        self._planets_occupation_progress = np.full(len(self._planets_centers), -1, dtype=int)
         self._planets_occupation_progress[0] = 0
         self._planets_occupation_progress[1] = 100
-        self._planets_ongoing_occupation = [0 for _ in range(len(self._planets_centers))]
+        self._planets_ongoing_occupation = np.zeros(len(self._planets_centers), dtype=int)
 
     def step(
         self, actions: dict
     ) -> Tuple[dict, dict, bool, bool, dict]:
-        self.turn += 1
-        # If the song has ended, play another one
-        if self._turn_on_music and not pygame.mixer.music.get_busy():
-            get_new_track()
+        self._profiler.start_step()
+        info = self._step_game(actions)
+
+        with self._profiler.phase("_get_obs"):
+            obs = self._get_obs()
+
+        self._profiler.end_step(turn=self.turn, player_1_ships=len(self._player_1_fleet),
+                                player_2_ships=len(self._player_2_fleet))
+        return obs, self._get_reward(), self.terminated, False, info
 
+    def _step_game(self, actions: dict) -> dict:
+        """
+        Advances the game by one turn, without building the observation. Returns the per-ship rewards info.
+
+        The turn is split into phases, so that OctoSpaceVectorEnv can run the phases working on the whole state of
+        the game (cooldowns, commands of the ships, occupation progress and victory conditions) at once for all of its
+        games.
+        """
         # Decrease cooldowns
-        _decrease_cooldowns(player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships)
+        with self._profiler.phase("_decrease_cooldowns"):
+            self._fleets.bind()
+            _decrease_cooldowns(cooldowns=[self._fleets.firing_cooldown, self._fleets.move_cooldown])
 
-        ship_1_actions = [ship_id for ship_id in self._player_1_ships.keys()]
-        ship_2_actions = [ship_id for ship_id in self._player_2_ships.keys()]
+        self._start_turn()
+        commands = self._commands = _collect_commands(actions=[actions], fleets=self._fleets)
 
         # Ships firing
-        firing_info = _ship_firing(actions=actions, player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships,
-                     player_1_ships_facing=self._player_1_ships_facing, player_2_ships_facing=self._player_2_ships_facing,
-                     effects=self.effects, turn_on_music=self._turn_on_music, volume=self.volume, ship_1_actions=ship_1_actions,
-                     ship_2_actions=ship_2_actions)
+        with self._profiler.phase("_ship_firing"):
+            firing_info, = _ship_firing(commands=commands, fleets=self._fleets, effects=[self.effects],
+                                        sound_events=[self._sound_events])
 
         # Ship movement
-        movement_info = _ship_movement(game_map=self._map, actions=actions, player_1_ships=self._player_1_ships,
-                       player_2_ships=self._player_2_ships, player_1_ships_facing=self._player_1_ships_facing,
-                       player_2_ships_facing=self._player_2_ships_facing, effects=self.effects, turn_on_music=self._turn_on_music,
-                       volume=self.volume, ship_1_actions=ship_1_actions, ship_2_actions=ship_2_actions)
+        with self._profiler.phase("_ship_movement"):
+            movement_info, = _ship_movement(game_map=self._map[None], commands=commands, fleets=self._fleets,
+                                            effects=[self.effects], sound_events=[self._sound_events])
 
+        self._resolve_economy(actions)
+
+        # Occupation progress
+        with self._profiler.phase("_occupation_progress"):
+            _occupation_progress(planets_occupation_progress=self._planets_occupation_progress,
+                                 planets_ongoing_occupation=self._planets_ongoing_occupation)
+
+        ship_land_interaction_info, ship_death_info = self._resolve_ships()
+
+        with self._profiler.phase("_victory_conditions"):
+            self._victory_conditions(_check_victory_conditions(game_map=self._map, planets_centers=self._planets_centers))
+
+        with self._profiler.phase("rewards"):
+            info = self._get_ships_rewards(firing_info, movement_info, ship_land_interaction_info, ship_death_info)
+
+        return info
+
+    def _get_executed_commands(self) -> dict:
+        """
+        Returns the ships commands executed in the last turn, for each player: ship id -> command
+        """
+        command_fleets, _, ship_ids, acts, directions, velocities, executed = (column.tolist() for column in self._commands)
+        commands = {1: {}, 2: {}}
+        for e in np.flatnonzero(executed).tolist():
+            command = [ship_ids[e], acts[e], directions[e]] + ([velocities[e]] if acts[e] == 0 else [])
+            commands[command_fleets[e] + 1][ship_ids[e]] = command
+        return commands
+
+    def _start_turn(self):
+        self.turn += 1
+        # If the song has ended, play another one
+        if self._turn_on_music and not pygame.mixer.music.get_busy():
+            get_new_track()
+
+        # Every ship can execute only one command per turn
+        self._player_1_fleet.acted[:] = False
+        self._player_2_fleet.acted[:] = False
+
+    def _resolve_economy(self, actions: dict):
+        """
+        Builds the new ships, changes the ownership of the captured planets and produces the resources, after
+        the commands of the ships are executed
+        """
         # Construction
-        _ship_construction(actions=actions, player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships,
-                           player_1_ships_facing=self._player_1_ships_facing, player_2_ships_facing=self._player_2_ships_facing,
-                           player_1_resources=self._player_1_resources, player_2_resources=self._player_2_resources)
+        with self._profiler.phase("_ship_construction"):
+            _ship_construction(actions=actions, player_1_fleet=self._player_1_fleet, player_2_fleet=self._player_2_fleet,
+                               player_1_resources=self._player_1_resources, player_2_resources=self._player_2_resources)
 
         # Change the ownership of newly captured planets
-        _change_ownership_of_planets(game_map=self._map, planets_centers=self._planets_centers,
-                                     planets_occupation_progress=self._planets_occupation_progress, player_1_occupied_rf=self._player_1_occupied_rf,
-                                     player_2_occupied_rf=self._player_2_occupied_rf, player_1_visibility_mask=self._player_1_visibility_mask,
-                                     player_2_visibility_mask=self._player_2_visibility_mask, effects=self.effects,
-                                     turn_on_music=self._turn_on_music, volume=self.volume)
+        with self._profiler.phase("_change_ownership_of_planets"):
+            _change_ownership_of_planets(game_map=self._map, planets_centers=self._planets_centers,
+                                         planets_tiles=self._planets_tiles, planets_rf_counts=self._planets_rf_counts,
+                                         planets_occupation_progress=self._planets_occupation_progress, player_1_occupied_rf=self._player_1_occupied_rf,
+                                         player_2_occupied_rf=self._player_2_occupied_rf, player_1_visibility=self._player_1_visibility,
+                                         player_2_visibility=self._player_2_visibility, effects=self.effects,
+                                         sound_events=self._sound_events)
 
         # Resource production
         self._player_1_resources = np.clip(self._player_1_resources + self._player_1_occupied_rf // RESOURCE_PRODUCTION_DIVISOR, 0, MAX_RESOURCES)
         self._player_2_resources = np.clip(self._player_2_resources + self._player_2_occupied_rf // RESOURCE_PRODUCTION_DIVISOR, 0, MAX_RESOURCES)
 
-        # Occupation progress
-        _occupation_progress(planets_centers=self._planets_centers, planets_occupation_progress=self._planets_occupation_progress,
-                             planets_ongoing_occupation=self._planets_ongoing_occupation)
-
+    def _resolve_ships(self) -> tuple:
+        """
+        Lands the ships on the planets, removes the destroyed ships and updates the visibility, after the occupation
+        progress of the turn. Returns the landing and the ships death rewards info.
+        """
         # Planet capture and ship healing
-        ship_land_interaction_info = _ship_land_interaction(game_map=self._map, planets_centers=self._planets_centers, planets_occupation_progress=self._planets_occupation_progress,
-                               planets_ongoing_occupation=self._planets_ongoing_occupation,
-                               player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships,
-                               player_1_ships_facing=self._player_1_ships_facing, player_2_ships_facing=self._player_2_ships_facing,
-                               effects=self.effects)
+        with self._profiler.phase("_ship_land_interaction"):
+            ship_land_interaction_info = _ship_land_interaction(game_map=self._map, planet_ids_grid=self._planet_ids_grid, planets_occupation_progress=self._planets_occupation_progress,
+                                   planets_ongoing_occupation=self._planets_ongoing_occupation,
+                                   player_1_fleet=self._player_1_fleet, player_2_fleet=self._player_2_fleet,
+                                   effects=self.effects)
 
-        ship_death_info = _handle_ship_death(player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships, player_1_ships_facing=self._player_1_ships_facing,
-                           player_2_ships_facing=self._player_2_ships_facing, effects=self.effects, turn_on_music=self._turn_on_music, volume=self.volume)
+        with self._profiler.phase("_handle_ship_death"):
+            ship_death_info = _handle_ship_death(player_1_fleet=self._player_1_fleet, player_2_fleet=self._player_2_fleet,
+                               effects=self.effects, sound_events=self._sound_events)
 
-        _handle_visibility(player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships, player_1_visibility_mask=self._player_1_visibility_mask,
-                           player_2_visibility_mask=self._player_2_visibility_mask)
-        
-        self._victory_conditions()
+        with self._profiler.phase("_handle_visibility"):
+            _handle_visibility(game_map=self._map, player_1_fleet=self._player_1_fleet, player_2_fleet=self._player_2_fleet,
+                               player_1_visibility=self._player_1_visibility, player_2_visibility=self._player_2_visibility)
+
+        return ship_land_interaction_info, ship_death_info
 
+    def _get_ships_rewards(self, firing_info: dict, movement_info: dict, ship_land_interaction_info: dict,
+                           ship_death_info: dict) -> dict:
         reward = self._get_reward()
         player_1_reward = -0.1
         player_2_reward = -0.1
@@ -418,8 +709,8 @@ class OctoSpaceEnv(gym.Env):
             player_2_reward += 200
         
         partial_infos = [firing_info, movement_info, ship_land_interaction_info, ship_death_info, {
-            1: {id: player_1_reward for id in self._player_1_ships.keys()},
-            2: {id: player_2_reward for id in self._player_2_ships.keys()}
+            1: {id: player_1_reward for id in self._player_1_fleet.ship_ids()},
+            2: {id: player_2_reward for id in self._player_2_fleet.ship_ids()}
         }]
 
         def merge(d1, d2):
@@ -433,7 +724,7 @@ class OctoSpaceEnv(gym.Env):
             2: reduce(lambda d1, d2: merge(d1, d2), [partial[2] for partial in partial_infos])
         }
 
-        return self._get_obs(), self._get_reward(), self.terminated, False, info
+        return info
 
     def render(self) -> RenderFrame:
         if self.render_mode == "rgb_array":
@@ -450,38 +741,51 @@ class OctoSpaceEnv(gym.Env):
         if self.clock is None and self.render_mode == "human":
             self.clock = pygame.time.Clock()
 
-        canvas = pygame.Surface((WINDOW_SIZE, WINDOW_SIZE))
-        _render_background(canvas)
+        # Play the sound effects of the steps since the last frame
+        if self._sound_bank is not None:
+            self._sound_bank.play(self._sound_events)
+        self._sound_events.clear()
+
+        if self.renderer == "tiles":
+            if self._tile_canvas is None:
+                self._tile_canvas = TileCanvas()
+            return self._tile_canvas.render(game_map=self._map, player_1_fleet=self._player_1_fleet,
+                                            player_2_fleet=self._player_2_fleet, player_1_id=self.player_1_id,
+                                            player_2_id=self.player_2_id).copy()
+
+        if self._board_canvas is None:
+            self._board_canvas = ArrayCanvas() if self.renderer == "numpy" else BoardCanvas()
 
-        # Render planets
-        _render_planets(canvas, game_map=self._map, state_ids_map=self._state_ids, ionized_field_id=self.ionized_field_id)
+        # Render background, planets, planets occupation and players (only the parts, which have changed)
+        canvas = self._board_canvas.begin_frame(game_map=self._map, state_ids_map=self._state_ids,
+                                                planets_centers=self._planets_centers, player_1_id=self.player_1_id,
+                                                player_2_id=self.player_2_id)
+        dirty_rects = self._board_canvas.dirty_rects
 
-        # Render planets occupation
-        _render_planet_occupation(canvas, game_map=self._map, planets_centers=self._planets_centers, player_1_id=self.player_1_id, player_2_id=self.player_2_id)
+        # Render ionized fields
+        _render_ionized_fields(canvas, ionized_field_id=self.ionized_field_id, dirty_rects=dirty_rects)
 
         # Render ongoing planet capture
         _render_ongoing_planet_capture(canvas, planets_occupation=self._planets_occupation_progress,
-                                       planets_centers=self._planets_centers, player_1_id=self.player_1_id, player_2_id=self.player_2_id)
-
-        # Render players
-        _render_players(canvas, player_1_id=self.player_1_id, player_2_id=self.player_2_id)
+                                       planets_centers=self._planets_centers, player_1_id=self.player_1_id,
+                                       player_2_id=self.player_2_id, dirty_rects=dirty_rects)
 
         # Render ships
-        _render_ships(canvas, player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships,
-                      player_1_ships_facing=self._player_1_ships_facing, player_2_ships_facing=self._player_2_ships_facing)
+        _render_ships(canvas, player_1_fleet=self._player_1_fleet, player_2_fleet=self._player_2_fleet, dirty_rects=dirty_rects)
 
         # Display which turn currently is it
-        _render_turn(canvas, turn=self.turn)
+        _render_turn(canvas, turn=self.turn, dirty_rects=dirty_rects)
 
         # Render effects
-        _render_effects(canvas, game_map=self._map, effects=self.effects, player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships,
-                        player_1_ships_facing=self._player_1_ships_facing, player_2_ships_facing=self._player_2_ships_facing)
+        _render_effects(canvas, game_map=self._map, effects=self.effects, player_1_fleet=self._player_1_fleet,
+                        player_2_fleet=self._player_2_fleet, dirty_rects=dirty_rects)
 
         # Vision debug
         if self.debug:
-            _render_vision_debug(canvas, player_1_visibility_mask=self._player_1_visibility_mask,
-                                 player_2_visibility_mask=self._player_2_visibility_mask, player_1_id=self.player_1_id,
+            _render_vision_debug(canvas, player_1_visibility_mask=self._player_1_visibility.mask,
+                                 player_2_visibility_mask=self._player_2_visibility.mask, player_1_id=self.player_1_id,
                                  player_2_id=self.player_2_id)
+            dirty_rects.append(canvas.get_rect())
 
         if self.render_mode == "human":
             self.window.blit(canvas, (GUI_SIZE + BORDER_WIDTH, 0))
@@ -500,13 +804,20 @@ class OctoSpaceEnv(gym.Env):
             pygame.display.update()
 
             self.clock.tick(self.metadata["render_fps"])
+        elif self.renderer == "numpy":
+            return self._board_canvas.end_frame().copy()
         else:
             return np.transpose(
                 np.array(pygame.surfarray.pixels3d(canvas)), axes=(1, 0, 2)
             )
 
-    def _victory_conditions(self):
-        self.victorious_player = _check_victory_conditions(game_map=self._map, planets_centers=self._planets_centers)
+    def _victory_conditions(self, victorious_player: tuple):
+        """
+        Ends the game and updates the scores
+
+        :param victorious_player: flags returned by _check_victory_conditions
+        """
+        self.victorious_player = victorious_player
         if self.turn == self.max_steps:
             self.terminated = True
             self._player_1_score += 0.5
@@ -523,6 +834,7 @@ class OctoSpaceEnv(gym.Env):
         self.player_1_id, self.player_2_id = self.player_2_id, self.player_1_id
 
     def close(self):
+        self._profiler.close()
         if self.window is not None:
             if self._turn_on_music:
                 pygame.mixer.music.stop()
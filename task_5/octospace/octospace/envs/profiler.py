@@ -0,0 +1,178 @@
+import csv
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+
+class StepProfiler:
+    """
+    Records the wall time and the number of calls of every phase of the game step, together with the fleet sizes (and
+    optionally the memory allocated) in every step.
+
+    Args:
+        track_allocations: measure the peak memory allocated during every step with tracemalloc, which slows down
+            the game considerably
+
+    Every step is stored as a record: turn, player_1_ships, player_2_ships, step_time, allocated_bytes (only when
+    tracking allocations) and the time spent in each phase (in seconds).
+    """
+
+    def __init__(self, track_allocations: bool = False):
+        self.track_allocations = track_allocations
+        self.steps = []
+        self.calls = {}
+
+        self._phases = {}
+        self._step_start = 0.0
+        self._memory_start = 0
+        self._started_tracing = False
+
+    def reset(self):
+        self.steps = []
+        self.calls = {}
+        self._phases = {}
+
+    def start_step(self):
+        self._phases = {}
+        if self.track_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+            self._memory_start = tracemalloc.get_traced_memory()[0]
+        self._step_start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases[name] = self._phases.get(name, 0.0) + time.perf_counter() - start
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def end_step(self, turn: int, player_1_ships: int, player_2_ships: int):
+        record = {
+            "turn": turn,
+            "player_1_ships": player_1_ships,
+            "player_2_ships": player_2_ships,
+            "step_time": time.perf_counter() - self._step_start
+        }
+        if self.track_allocations:
+            record["allocated_bytes"] = tracemalloc.get_traced_memory()[1] - self._memory_start
+        record.update(self._phases)
+        self.steps.append(record)
+
+    def close(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def phase_names(self) -> list:
+        """
+        Returns names of all recorded phases, in the order they were first executed
+        """
+        names = {}
+        for record in self.steps:
+            for key in record:
+                if key not in ["turn", "player_1_ships", "player_2_ships", "step_time", "allocated_bytes"]:
+                    names[key] = None
+        return list(names)
+
+    def aggregate(self, min_ships: int = 0, max_ships: Optional[int] = None) -> dict:
+        """
+        Returns the total and mean time of every phase over the steps with the total number of ships in the given range
+
+        :param min_ships: minimal number of ships of both players (inclusive)
+        :param max_ships: maximal number of ships of both players (exclusive), no limit by default
+        """
+        steps = [record for record in self.steps
+                 if min_ships <= record["player_1_ships"] + record["player_2_ships"] and
+                 (max_ships is None or record["player_1_ships"] + record["player_2_ships"] < max_ships)]
+        step_time = sum(record["step_time"] for record in steps)
+
+        phases = {}
+        for name in self.phase_names():
+            times = [record[name] for record in steps if name in record]
+            total = sum(times)
+            phases[name] = {
+                "calls": len(times),
+                "total_time": total,
+                "mean_time": total / len(times) if times else 0.0,
+                "share": total / step_time if step_time > 0 else 0.0
+            }
+
+        summary = {
+            "steps": len(steps),
+            "step_time": step_time,
+            "mean_step_time": step_time / len(steps) if steps else 0.0,
+            "phases": phases
+        }
+        if self.track_allocations:
+            summary["mean_allocated_bytes"] = sum(record["allocated_bytes"] for record in steps) / len(steps) if steps else 0
+        return summary
+
+    def summary(self, fleet_size_bins: Optional[list] = None) -> str:
+        """
+        Returns a table with the time spent in every phase
+
+        :param fleet_size_bins: optional edges of the ranges of the total number of ships, e.g. [0, 50, 200, 1000],
+            a separate table is returned for each range
+        """
+        ranges = [(0, None)] if fleet_size_bins is None else list(zip(fleet_size_bins[:-1], fleet_size_bins[1:]))
+
+        lines = []
+        for min_ships, max_ships in ranges:
+            aggregate = self.aggregate(min_ships=min_ships, max_ships=max_ships)
+            if fleet_size_bins is not None:
+                lines.append(f"Ships: [{min_ships}, {max_ships})")
+            header = f"Steps: {aggregate['steps']}, mean step time: {aggregate['mean_step_time'] * 1e3:.3f} ms"
+            if self.track_allocations:
+                header += f", mean allocated: {aggregate['mean_allocated_bytes'] / 1024:.1f} KiB"
+            lines.append(header)
+            lines.append(f"{'phase':<32}{'calls':>8}{'total [ms]':>14}{'mean [us]':>12}{'share':>9}")
+            for name, phase in aggregate["phases"].items():
+                lines.append(f"{name:<32}{phase['calls']:>8}{phase['total_time'] * 1e3:>14.2f}"
+                             f"{phase['mean_time'] * 1e6:>12.1f}{phase['share']:>9.1%}")
+            lines.append("")
+        return "\n".join(lines)
+
+    def to_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"summary": self.aggregate(), "calls": self.calls, "steps": self.steps}, f, indent=2)
+
+    def to_csv(self, path: str):
+        """
+        Saves the per-step records, one row per step
+        """
+        columns = ["turn", "player_1_ships", "player_2_ships", "step_time"]
+        if self.track_allocations:
+            columns.append("allocated_bytes")
+        columns.extend(self.phase_names())
+
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, restval=0.0)
+            writer.writeheader()
+            writer.writerows(self.steps)
+
+
+class _NoProfiler:
+    """
+    Used when profiling is turned off, all the calls do nothing
+    """
+
+    _context = nullcontext()
+
+    def start_step(self):
+        pass
+
+    def phase(self, name: str):
+        return self._context
+
+    def end_step(self, turn: int, player_1_ships: int, player_2_ships: int):
+        pass
+
+    def close(self):
+        pass
@@ -6,13 +6,15 @@ from octospace.envs.game_config import (BOARD_SIZE, TILE_SIZE, RF_CODING_TO_ID,
                                         FLAG_ICON_ADJUSTMENT, OCCUPATION_BAR_SIZE, OCCUPATION_BAR_COLOR_MARGIN, ABS_PLAYER_1_ICON_POS, \
                                         ABS_PLAYER_2_ICON_POS, SHIP_SIZE, SIDE_SHIP_SIZE, WINDOW_SIZE, TEAM_NAMES_MARGIN, GUI_SIZE,
                                         BORDER_WIDTH, MAX_RESOURCES, EFFECT_DEATH_ADJUSTMENT, EFFECT_FIRING_ADJUSTMENT, EFFECT_HEALING_ADJUSTMENT,
-                                        EFFECT_CAPTURE_ADJUSTMENT, EFFECT_SPACE_JUMP_ADJUSTMENT)
+                                        EFFECT_CAPTURE_ADJUSTMENT, EFFECT_SPACE_JUMP_ADJUSTMENT, FLAG_SIZE)
 from octospace.envs.map_assets import (LAND, RESOURCE_FIELDS_MARKERS, ASTEROIDS, IONIZED_FIELDS, OCCUPATION_FLAG, \
     TEAM_COLORS, OCCUPATION_FLAG_CROSSED, BAR_EMPTY, TEAM_ICONS, SHIP_ORIENTATIONS_1, SHIP_ORIENTATIONS_2, BACKGROUND, \
     PLAYER_ICON, RESOURCE_FIELDS_ICONS, RESOURCE_FIELDS_BARS, DEATH_EFFECT_ANIMATION, HEALING_EFFECT_ANIMATION,
                         FIRING_EFFECT_ANIMATION, CAPTURE_EFFECT_ANIMATION, SPACE_JUMP_EFFECT_ANIMATION, ROUGH_TERRAIN,
                         ROUGH_TERRAIN_FLAG, ROUGH_TERRAIN_CORNER)
 
+from octospace.envs.fleet import Fleet
+from octospace.envs.effects import Effects, DEATH_EFFECT, FIRING_EFFECT, CAPTURE_EFFECT, SPACE_JUMP_EFFECT
 from matches_config import TEAMS_ABBREVIATIONS
 
 
@@ -23,6 +25,85 @@ teams_names_font = pygame.font.SysFont("Bricolage Grotesque", size=75)
 resource_font = pygame.font.SysFont("Arial", size=12)
 scoreboard_font = pygame.font.SysFont("Arial", size=40)
 
+# Images, which are the same in every frame, are created only once
+_FLAG_IMAGES = {}
+_SHIP_TEXTS = {}
+
+
+class BoardCanvas:
+    """
+    Surface of the board, which is updated incrementally between the frames.
+
+    The terrain (background, planets and asteroids) is drawn once into a static layer, which is rebuilt only when
+    the map changes. Occupation flags and players' icons are drawn on top of it into the board layer, where a flag is
+    redrawn only when the owner of its planet changes. Everything else (ionized fields, ships, effects...) is drawn
+    onto the canvas in every frame, and the rectangles covered by it are restored from the board layer at the beginning
+    of the next frame.
+    """
+
+    def __init__(self):
+        self.canvas = pygame.Surface((WINDOW_SIZE, WINDOW_SIZE))
+        # Rectangles of the canvas drawn over in the current frame
+        self.dirty_rects = []
+
+        self._static_layer = pygame.Surface((WINDOW_SIZE, WINDOW_SIZE))
+        self._board_layer = pygame.Surface((WINDOW_SIZE, WINDOW_SIZE))
+
+        # State of the game, for which the layers were drawn
+        self._terrain: np.ndarray = None
+        self._state_ids: np.ndarray = None
+        self._player_ids: tuple = None
+        self._owners: np.ndarray = None
+
+    def begin_frame(
+            self,
+            game_map: np.ndarray,
+            state_ids_map: np.ndarray,
+            planets_centers: np.ndarray,
+            player_1_id: int,
+            player_2_id: int
+    ) -> pygame.Surface:
+        """
+        Brings the canvas back to the board layer of the current game state
+
+        :return: canvas, onto which the rest of the frame has to be drawn
+        """
+        # Ownership bits are not a part of the terrain
+        terrain = game_map & 63
+        redraw_board = self._state_ids is not state_ids_map or not np.array_equal(terrain, self._terrain)
+        if redraw_board:
+            _render_background(self._static_layer)
+            _render_planets(self._static_layer, game_map=game_map, state_ids_map=state_ids_map)
+            self._terrain = terrain
+            self._state_ids = state_ids_map
+
+        owners = game_map[planets_centers[:, 0], planets_centers[:, 1]] >> 6
+        if redraw_board or self._player_ids != (player_1_id, player_2_id) or len(owners) != len(self._owners):
+            self._board_layer.blit(self._static_layer, (0, 0))
+            _render_planet_occupation(self._board_layer, game_map=game_map, planets_centers=planets_centers,
+                                      player_1_id=player_1_id, player_2_id=player_2_id)
+            _render_players(self._board_layer, player_1_id=player_1_id, player_2_id=player_2_id)
+            self.dirty_rects = [self.canvas.get_rect()]
+        else:
+            for e in np.flatnonzero(owners != self._owners):
+                flag_rect = pygame.Rect(planets_centers[e][1] * TILE_SIZE + FLAG_ICON_ADJUSTMENT,
+                                        planets_centers[e][0] * TILE_SIZE + FLAG_ICON_ADJUSTMENT, FLAG_SIZE, FLAG_SIZE)
+                # Players' icons can cover the flag, so they are redrawn inside of its rectangle as well
+                self._board_layer.set_clip(flag_rect)
+                self._board_layer.blit(self._static_layer, (0, 0))
+                _render_planet_occupation(self._board_layer, game_map=game_map, planets_centers=planets_centers[e:e + 1],
+                                          player_1_id=player_1_id, player_2_id=player_2_id)
+                _render_players(self._board_layer, player_1_id=player_1_id, player_2_id=player_2_id)
+                self._board_layer.set_clip(None)
+                self.dirty_rects.append(flag_rect)
+        self._player_ids = (player_1_id, player_2_id)
+        self._owners = owners
+
+        for rect in self.dirty_rects:
+            self.canvas.blit(self._board_layer, rect, area=rect)
+        self.dirty_rects = []
+        return self.canvas
+
 
 def _render_background(canvas: pygame.Surface):
     canvas.blit(pygame.transform.scale(BACKGROUND, (WINDOW_SIZE, WINDOW_SIZE)), BACKGROUND.get_rect())
@@ -31,8 +112,7 @@ def _render_background(canvas: pygame.Surface):
 def _render_planets(
         canvas: pygame.Surface,
         game_map: np.ndarray,
-        state_ids_map: np.ndarray,
-        ionized_field_id: dict):
+        state_ids_map: np.ndarray):
     for y in range(BOARD_SIZE):
         for x in range(BOARD_SIZE):
             block = game_map[y, x]
@@ -67,12 +147,26 @@ def _render_planets(
                 else:
                     canvas.blit(ROUGH_TERRAIN_FLAG, (x * TILE_SIZE, y * TILE_SIZE))
 
-            # Render ionized fields
-            elif block & 4 == 4:
-                effect_loc_adjustment = TILE_SIZE // 2 - EFFECT_IONIZED_FIELD_SIZE // 2
-                canvas.blit(IONIZED_FIELDS[ionized_field_id[(y, x)]],
-                            (x * TILE_SIZE + effect_loc_adjustment, y * TILE_SIZE + effect_loc_adjustment))
-                ionized_field_id[(y, x)] = (ionized_field_id[(y, x)] + 1) % len(IONIZED_FIELDS)
+
+def _render_ionized_fields(
+        canvas: pygame.Surface,
+        ionized_field_id: dict,
+        dirty_rects: list):
+    effect_loc_adjustment = TILE_SIZE // 2 - EFFECT_IONIZED_FIELD_SIZE // 2
+    # Fields are rendered row by row, as they may overlap
+    for y, x in sorted(ionized_field_id):
+        dirty_rects.append(canvas.blit(IONIZED_FIELDS[ionized_field_id[(y, x)]],
+                                       (x * TILE_SIZE + effect_loc_adjustment, y * TILE_SIZE + effect_loc_adjustment)))
+        ionized_field_id[(y, x)] = (ionized_field_id[(y, x)] + 1) % len(IONIZED_FIELDS)
+
+
+def _get_flag_image(team_id: int) -> pygame.Surface:
+    if team_id not in _FLAG_IMAGES:
+        flag_image = OCCUPATION_FLAG.copy()
+        flag_image.fill(TEAM_COLORS[team_id], special_flags=BLEND_MULT)
+        _FLAG_IMAGES[team_id] = flag_image
+    return _FLAG_IMAGES[team_id]
+
 
 def _render_planet_occupation(
     canvas: pygame.Surface,
@@ -83,11 +177,9 @@ def _render_planet_occupation(
 ):
     for center in planets_centers:
         if game_map[center[0], center[1]] & 64 == 64:
-            flag_image = OCCUPATION_FLAG.copy()
-            flag_image.fill(TEAM_COLORS[player_1_id], special_flags=BLEND_MULT)
+            flag_image = _get_flag_image(player_1_id)
         elif game_map[center[0], center[1]] & 128 == 128:
-            flag_image = OCCUPATION_FLAG.copy()
-            flag_image.fill(TEAM_COLORS[player_2_id], special_flags=BLEND_MULT)
+            flag_image = _get_flag_image(player_2_id)
         else:
             flag_image = OCCUPATION_FLAG_CROSSED
 
@@ -98,7 +190,8 @@ def _render_ongoing_planet_capture(
     planets_occupation: np.ndarray,
     planets_centers: np.ndarray,
     player_1_id: int,
-    player_2_id: int
+    player_2_id: int,
+    dirty_rects: list
 ):
     for e, occupation in enumerate(planets_occupation):
         if occupation not in [-1, 0, 100]:
@@ -121,7 +214,7 @@ def _render_ongoing_planet_capture(
                              (OCCUPATION_BAR_COLOR_MARGIN + player_1_color_surface_width, OCCUPATION_BAR_COLOR_MARGIN),
                              special_flags=BLEND_MULT)
 
-            canvas.blit(bar_filling, ((planet_x - 4) * TILE_SIZE + 15, (planet_y + 5) * TILE_SIZE + 5))
+            dirty_rects.append(canvas.blit(bar_filling, ((planet_x - 4) * TILE_SIZE + 15, (planet_y + 5) * TILE_SIZE + 5)))
 
 def _render_players(
     canvas: pygame.Surface,
@@ -134,37 +227,25 @@ def _render_players(
 
 def _render_ships(
     canvas: pygame.Surface,
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
+    player_1_fleet: Fleet,
+    player_2_fleet: Fleet,
+    dirty_rects: list
 ):
-    for key in player_1_ships.keys():
-        ship = player_1_ships[key]
-        x, y = ship[0], ship[1]
-        ship_loc_adjustment = TILE_SIZE // 2 - (
-            SHIP_SIZE // 2 if player_1_ships_facing[key] in [1, 3] else SIDE_SHIP_SIZE // 2)
-        ship_x = x * TILE_SIZE + ship_loc_adjustment
-        ship_y = y * TILE_SIZE + ship_loc_adjustment
-        canvas.blit(SHIP_ORIENTATIONS_1[player_1_ships_facing[key]], (ship_x, ship_y))
-        ship_text = ship_font.render(f"{ship[2]}%", False, _get_ship_text_color(ship))
-        canvas.blit(ship_text, (ship_x, ship_y - 12))
-
-    for key in player_2_ships.keys():
-        ship = player_2_ships[key]
-        x, y = ship[0], ship[1]
-        ship_loc_adjustment = TILE_SIZE // 2 - (
-            SHIP_SIZE // 2 if player_2_ships_facing[key] in [1, 3] else SIDE_SHIP_SIZE // 2)
-        ship_x = x * TILE_SIZE + ship_loc_adjustment
-        ship_y = y * TILE_SIZE + ship_loc_adjustment
-        canvas.blit(SHIP_ORIENTATIONS_2[player_2_ships_facing[key]], (ship_x, ship_y))
-        ship_text = ship_font.render(f"{ship[2]}%", False, _get_ship_text_color(ship))
-        canvas.blit(ship_text, (ship_x, ship_y - 12))
-
-
-def _render_turn(canvas, turn):
+    for fleet, ship_orientations in [(player_1_fleet, SHIP_ORIENTATIONS_1), (player_2_fleet, SHIP_ORIENTATIONS_2)]:
+        slots = fleet.alive_slots()
+        for x, y, hp, facing in zip(fleet.x[slots].tolist(), fleet.y[slots].tolist(), fleet.hp[slots].tolist(),
+                                    fleet.facing[slots].tolist()):
+            ship_loc_adjustment = TILE_SIZE // 2 - (
+                SHIP_SIZE // 2 if facing in [1, 3] else SIDE_SHIP_SIZE // 2)
+            ship_x = x * TILE_SIZE + ship_loc_adjustment
+            ship_y = y * TILE_SIZE + ship_loc_adjustment
+            dirty_rects.append(canvas.blit(ship_orientations[facing], (ship_x, ship_y)))
+            dirty_rects.append(canvas.blit(_get_ship_text(hp), (ship_x, ship_y - 12)))
+
+
+def _render_turn(canvas, turn, dirty_rects: list):
     turn_text = turn_counter_font.render(f'TURN: {turn}', False, (255, 255, 255))
-    canvas.blit(turn_text, (WINDOW_SIZE - 200, 50))
+    dirty_rects.append(canvas.blit(turn_text, (WINDOW_SIZE - 200, 50)))
 
 
 # Team rendering is always performed in the same order
@@ -239,93 +320,55 @@ def _render_score(
 def _render_effects(
     canvas: pygame.Surface,
     game_map: np.ndarray,
-    effects: list,
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict
+    effects: Effects,
+    player_1_fleet: Fleet,
+    player_2_fleet: Fleet,
+    dirty_rects: list
 ):
     """
     Effects
     """
-    # Delete all expired effects
-    i = 0
-    while i < len(effects):
-        if effects[i][0] == 0 and effects[i][3] == 15:
-            effects.pop(i)
-        elif effects[i][0] == 1 and effects[i][3] == 15:
-            # Reset frame counter
-            effects[i][3] %= 15
-        elif effects[i][0] == 2 and effects[i][4] == 5:
-            effects.pop(i)
-        elif effects[i][0] == 3 and effects[i][3] == 12:
-            effects.pop(i)
-        elif effects[i][0] == 4 and effects[i][3] == 9:
-            effects.pop(i)
-        else:
-            i += 1
-
-    for e, effect in enumerate(effects):
-        effect_id = effect[0]
-
-        # Death effect
-        if effect_id == 0:
-            pos_x, pos_y, frame = effect[1], effect[2], effect[3]
-            canvas.blit(DEATH_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_DEATH_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_DEATH_ADJUSTMENT))
-
-            # Proceed to the next frame
-            effects[e][3] += 1
-
-        # Healing effect
-        elif effect_id == 1:
-            player, ship_id, frame = effect[1], effect[2], effect[3]
-            if player == 0:
-                ally_ships = player_1_ships
-            else:
-                ally_ships = player_2_ships
-
-            if ship_id in ally_ships.keys():
-                pos_x, pos_y = ally_ships[ship_id][0], ally_ships[ship_id][1]
-                canvas.blit(HEALING_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_HEALING_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_HEALING_ADJUSTMENT))
-
-                # Next frame
-                effects[e][3] += 1
-
-        # Firing effect:
-        elif effect_id == 2:
-            ship_x = effect[1]
-            ship_y = effect[2]
-            facing = effect[3]
-            frame = effect[4]
-
-            if facing == 0:
-                facing_adjustment = 15+SHIP_SIZE, -12
-            elif facing == 1:
-                facing_adjustment = -2, SHIP_SIZE + 10
-            elif facing == 2:
-                facing_adjustment = -20-SIDE_SHIP_SIZE, 0
-            else:
-                facing_adjustment = -12, -SHIP_SIZE - 27
-
-            canvas.blit(FIRING_EFFECT_ANIMATION[facing][frame],
-                        (ship_x*TILE_SIZE+EFFECT_FIRING_ADJUSTMENT + facing_adjustment[0],
-                         ship_y*TILE_SIZE+EFFECT_FIRING_ADJUSTMENT + facing_adjustment[1]))
+    # Death effect
+    for frame, (pos_x, pos_y) in effects.iter_one_shot(DEATH_EFFECT):
+        dirty_rects.append(canvas.blit(DEATH_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_DEATH_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_DEATH_ADJUSTMENT)))
 
-            effects[e][4] += 1
+    # Healing effect
+    for frame, player, ship_id in effects.iter_healing():
+        if player == 0:
+            ally_fleet = player_1_fleet
+        else:
+            ally_fleet = player_2_fleet
+
+        if ship_id in ally_fleet:
+            slot = ally_fleet.slot(ship_id)
+            pos_x, pos_y = ally_fleet.x[slot], ally_fleet.y[slot]
+            dirty_rects.append(canvas.blit(HEALING_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_HEALING_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_HEALING_ADJUSTMENT)))
+
+    # Firing effect:
+    for frame, (ship_x, ship_y, facing) in effects.iter_one_shot(FIRING_EFFECT):
+        if facing == 0:
+            facing_adjustment = 15+SHIP_SIZE, -12
+        elif facing == 1:
+            facing_adjustment = -2, SHIP_SIZE + 10
+        elif facing == 2:
+            facing_adjustment = -20-SIDE_SHIP_SIZE, 0
+        else:
+            facing_adjustment = -12, -SHIP_SIZE - 27
 
-        # Capture effect
-        elif effect_id == 3:
-            pos_x, pos_y, frame = effect[1], effect[2], effect[3]
-            canvas.blit(CAPTURE_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_CAPTURE_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_CAPTURE_ADJUSTMENT))
+        dirty_rects.append(canvas.blit(FIRING_EFFECT_ANIMATION[facing][frame],
+                                       (ship_x*TILE_SIZE+EFFECT_FIRING_ADJUSTMENT + facing_adjustment[0],
+                                        ship_y*TILE_SIZE+EFFECT_FIRING_ADJUSTMENT + facing_adjustment[1])))
 
-            effects[e][3] += 1
+    # Capture effect
+    for frame, (pos_x, pos_y) in effects.iter_one_shot(CAPTURE_EFFECT):
+        dirty_rects.append(canvas.blit(CAPTURE_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_CAPTURE_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_CAPTURE_ADJUSTMENT)))
 
-        # Space jump effect
-        elif effect_id == 4:
-            pos_x, pos_y, frame = effect[1], effect[2], effect[3]
-            canvas.blit(SPACE_JUMP_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_SPACE_JUMP_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_SPACE_JUMP_ADJUSTMENT))
+    # Space jump effect
+    for frame, (pos_x, pos_y) in effects.iter_one_shot(SPACE_JUMP_EFFECT):
+        dirty_rects.append(canvas.blit(SPACE_JUMP_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_SPACE_JUMP_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_SPACE_JUMP_ADJUSTMENT)))
 
-            effects[e][3] += 1
+    # Proceed to the next frame, the finished effects are dropped
+    effects.next_frame()
 
 
 def _render_vision_debug(
@@ -357,10 +400,16 @@ def _render_vision_debug(
         canvas.blit(vision_surface, (0, 0))
 
 
-def _get_ship_text_color(ship: list):
-    if ship[2] <= 33:
+def _get_ship_text(hp: int) -> pygame.Surface:
+    if hp not in _SHIP_TEXTS:
+        _SHIP_TEXTS[hp] = ship_font.render(f"{hp}%", False, _get_ship_text_color(hp))
+    return _SHIP_TEXTS[hp]
+
+
+def _get_ship_text_color(hp: int):
+    if hp <= 33:
         return (255, 0, 0)
-    elif ship[2] >= 66:
+    elif hp >= 66:
         return (255, 255, 255)
     else:
         return (255, 255, 0)
\ No newline at end of file
@@ -33,25 +33,39 @@ def setup_music_loop(volume: float = 0.25):
     get_new_track()
 
 
-def play_shoot_sound(volume: float):
-    shoot_sound = pygame.mixer.Sound('assets/sounds/shot_1.wav')
-    shoot_sound.set_volume(volume*2.0)
-    pygame.mixer.Channel(1).play(shoot_sound)
-
-
-def play_space_jump_sound(volume: float):
-    space_jump_sound = pygame.mixer.Sound('assets/sounds/space_jump.mp3')
-    space_jump_sound.set_volume(volume * 2.0)
-    pygame.mixer.Channel(3).play(space_jump_sound)
-
-
-def play_capture_sound(volume: float):
-    capture_sound = pygame.mixer.Sound('assets/sounds/capture.mp3')
-    capture_sound.set_volume(volume * 0.5)
-    pygame.mixer.Channel(4).play(capture_sound)
-
-
-def play_ship_explosion_sound(volume: float):
-    sound_file = pygame.mixer.Sound('assets/sounds/ship_explosion.ogg')
-    sound_file.set_volume(volume * 0.75)
-    pygame.mixer.Channel(2).play(sound_file)
\ No newline at end of file
+SHOOT_SOUND = "shoot"
+SHIP_EXPLOSION_SOUND = "ship_explosion"
+SPACE_JUMP_SOUND = "space_jump"
+CAPTURE_SOUND = "capture"
+
+# Sound effects: file, mixer channel and volume relative to the volume of the music
+SOUND_EFFECTS = {
+    SHOOT_SOUND: ('assets/sounds/shot_1.wav', 1, 2.0),
+    SHIP_EXPLOSION_SOUND: ('assets/sounds/ship_explosion.ogg', 2, 0.75),
+    SPACE_JUMP_SOUND: ('assets/sounds/space_jump.mp3', 3, 2.0),
+    CAPTURE_SOUND: ('assets/sounds/capture.mp3', 4, 0.5)
+}
+
+
+class SoundBank:
+    """
+    Sound effects decoded once, when the bank is created (the mixer has to be already initialized).
+
+    The game collects the names of the sound effects of a step into a set, which is passed to play when the frame is
+    rendered. Each effect has its own channel, so at most one sound per channel is started in every frame.
+
+    Args:
+        volume: volume of the music, the effects are played relative to it
+    """
+
+    def __init__(self, volume: float):
+        self._sounds = {}
+        for name, (path, channel_id, relative_volume) in SOUND_EFFECTS.items():
+            sound = pygame.mixer.Sound(path)
+            sound.set_volume(volume * relative_volume)
+            self._sounds[name] = (sound, pygame.mixer.Channel(channel_id))
+
+    def play(self, sound_events: set):
+        for name in sound_events:
+            sound, channel = self._sounds[name]
+            channel.play(sound)
@@ -0,0 +1,205 @@
+from typing import Any, Optional, Tuple, Union
+
+import numpy as np
+from gymnasium.vector import VectorEnv, AutoresetMode
+from gymnasium.vector.utils import batch_space, iterate
+
+from octospace.envs.game_config import BOARD_SIZE, N_PLANETS
+from octospace.envs.fleet import FleetStack
+from octospace.envs.game_logic import (_collect_commands, _ship_firing, _ship_movement, _decrease_cooldowns,
+                                       _occupation_progress, _check_victory_conditions)
+from octospace.envs.octospace import OctoSpaceEnv
+from octospace.envs.visibility import Visibility, PADDED_BOARD_SIZE, PACKED_WIDTH, _board_view
+
+
+class OctoSpaceVectorEnv(VectorEnv):
+    """
+    Args:
+        num_envs: number of games played at once
+        player_1_id: same as in OctoSpaceEnv
+        player_2_id: same as in OctoSpaceEnv
+        max_steps: same as in OctoSpaceEnv
+        seed: base seed, the i-th game gets seed + i
+        map_bank: same as in OctoSpaceEnv, the bank file is shared by all games
+
+    Runs a batch of independent OctoSpace games. Maps, visibilities, planets occupation and fleets of all games are
+    stored in stacked arrays, and every game operates on its own slice of them in place. The phases of the turn working
+    on the whole state of a game (decreasing the cooldowns, the firing and the movement of the ships, the occupation
+    progress and checking the victory conditions) are run once on the stacked arrays of all games, as are the batched
+    parts of the observation. Only the construction, the landing, the death and the visibility of the ships, and
+    the rewards are resolved game by game.
+
+    A game is finished when it is terminated or any of the players is victorious. Finished games are reset on the next
+    call to step (the actions provided for them are ignored), following Gymnasium's next-step autoreset mode.
+
+    Observation Space:
+        Batched observation space of OctoSpaceEnv, for each player:
+            map: np.ndarray of shape (num_envs, BOARD_SIZE, BOARD_SIZE)
+            allied_ships, enemy_ships, planets_occupation: tuples of num_envs lists, same as in OctoSpaceEnv
+            resources: np.ndarray of shape (num_envs, 4)
+
+    Action Space:
+        Batched action space of OctoSpaceEnv, for each player:
+            ships_actions: tuple of num_envs lists of ships commands
+            construction: np.ndarray of shape (num_envs,)
+
+    Rewards are returned as a dict of np.ndarrays of shape (num_envs,), one for each player, and the per-ship rewards
+    of every game are available in infos["ships_rewards"].
+    """
+
+    metadata = {"autoreset_mode": AutoresetMode.NEXT_STEP, "render_modes": []}
+
+    def __init__(self,
+                 num_envs: int,
+                 player_1_id: int,
+                 player_2_id: int,
+                 max_steps: int = 2000,
+                 seed: Optional[int] = None,
+                 map_bank: Optional[str] = None
+                 ):
+        self.num_envs = num_envs
+        self.envs = [
+            OctoSpaceEnv(player_1_id=player_1_id, player_2_id=player_2_id, max_steps=max_steps,
+                         seed=None if seed is None else seed + i, map_bank=map_bank)
+            for i in range(num_envs)
+        ]
+
+        self.single_observation_space = self.envs[0].observation_space
+        self.single_action_space = self.envs[0].action_space
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+
+        n_planets = N_PLANETS + 2
+        self._maps = np.zeros((num_envs, BOARD_SIZE, BOARD_SIZE), dtype=int)
+        # Bit-packed visibility masks and views of the map of the 1st and the 2nd player
+        self._packed_visibility_masks = np.zeros((num_envs, 2, PADDED_BOARD_SIZE, PACKED_WIDTH), dtype=np.uint8)
+        self._masked_maps = np.full((num_envs, 2, PADDED_BOARD_SIZE, PADDED_BOARD_SIZE), -1, dtype=int)
+        self._planets_occupation_progress = np.zeros((num_envs, n_planets), dtype=int)
+        self._planets_ongoing_occupation = np.zeros((num_envs, n_planets), dtype=int)
+        self._planets_centers = np.zeros((num_envs, n_planets, 2), dtype=int)
+        self._resources = np.zeros((num_envs, 2, 4), dtype=int)
+        # Fleets of the 1st and the 2nd player of every game, the fleets of the i-th game are 2 * i and 2 * i + 1
+        self._fleets = FleetStack([fleet for env in self.envs for fleet in (env._player_1_fleet, env._player_2_fleet)])
+
+        self._autoreset_envs = np.zeros(num_envs, dtype=bool)
+
+        # Visibilities are cleared in place on every reset, so they can be bound to the stacked arrays only once
+        for i, env in enumerate(self.envs):
+            env._player_1_visibility = Visibility(self._packed_visibility_masks[i, 0], self._masked_maps[i, 0])
+            env._player_2_visibility = Visibility(self._packed_visibility_masks[i, 1], self._masked_maps[i, 1])
+
+    def reset(
+        self,
+        *,
+        seed: Union[int, list, None] = None,
+        options: dict[str, Any] = None,
+    ) -> Tuple[dict, dict]:
+        if seed is None or isinstance(seed, int):
+            seed = [None if seed is None else seed + i for i in range(self.num_envs)]
+        assert len(seed) == self.num_envs
+
+        for i in range(self.num_envs):
+            self._reset_game(i, seed=seed[i], options=options)
+        self._autoreset_envs[:] = False
+
+        return self._get_obs(), {}
+
+    def step(
+        self, actions: dict
+    ) -> Tuple[dict, dict, np.ndarray, np.ndarray, dict]:
+        rewards = {
+            "player_1": np.zeros(self.num_envs),
+            "player_2": np.zeros(self.num_envs)
+        }
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        ships_rewards = np.full(self.num_envs, fill_value=None, dtype=object)
+
+        games_actions = list(iterate(self.action_space, actions))
+        games = np.flatnonzero(~self._autoreset_envs).tolist()
+
+        # Finished games go through the batched phases too, they are reset at the end of the step anyway
+        self._fleets.bind()
+        _decrease_cooldowns(cooldowns=[self._fleets.firing_cooldown, self._fleets.move_cooldown])
+
+        for i in games:
+            self.envs[i]._start_turn()
+        commands = _collect_commands(actions=[None if self._autoreset_envs[i] else game_actions
+                                              for i, game_actions in enumerate(games_actions)], fleets=self._fleets)
+        effects = [env.effects for env in self.envs]
+        sound_events = [env._sound_events for env in self.envs]
+        firing_info = _ship_firing(commands=commands, fleets=self._fleets, effects=effects, sound_events=sound_events)
+        movement_info = _ship_movement(game_map=self._maps, commands=commands, fleets=self._fleets, effects=effects,
+                                       sound_events=sound_events)
+
+        games_info = {}
+        for i in games:
+            self.envs[i]._resolve_economy(games_actions[i])
+            games_info[i] = (firing_info[i], movement_info[i])
+
+        _occupation_progress(planets_occupation_progress=self._planets_occupation_progress,
+                             planets_ongoing_occupation=self._planets_ongoing_occupation)
+
+        for i in games:
+            games_info[i] += self.envs[i]._resolve_ships()
+
+        player_1_victory, player_2_victory = _check_victory_conditions(game_map=self._maps,
+                                                                       planets_centers=self._planets_centers)
+
+        for i, env in enumerate(self.envs):
+            if self._autoreset_envs[i]:
+                self._reset_game(i)
+                continue
+
+            env._victory_conditions((player_1_victory[i], player_2_victory[i]))
+            ships_rewards[i] = env._get_ships_rewards(*games_info[i])
+            self._resources[i, 0] = env._player_1_resources
+            self._resources[i, 1] = env._player_2_resources
+
+            reward = env._get_reward()
+            rewards["player_1"][i] = reward["player_1"]
+            rewards["player_2"][i] = reward["player_2"]
+            terminated[i] = env.terminated or any(env.victorious_player)
+
+        self._autoreset_envs = terminated
+        infos = {
+            "ships_rewards": ships_rewards,
+            "_ships_rewards": np.array([game_rewards is not None for game_rewards in ships_rewards])
+        }
+
+        return self._get_obs(), rewards, terminated, truncated, infos
+
+    def _reset_game(self, i: int, seed: Optional[int] = None, options: dict[str, Any] = None):
+        env = self.envs[i]
+        env.reset(seed=seed, options=options)
+
+        # Move the state of the game into the stacked arrays and let the game work on its slice of them
+        self._maps[i] = env._map
+        env._map = self._maps[i]
+        self._planets_occupation_progress[i] = env._planets_occupation_progress
+        env._planets_occupation_progress = self._planets_occupation_progress[i]
+        self._planets_ongoing_occupation[i] = env._planets_ongoing_occupation
+        env._planets_ongoing_occupation = self._planets_ongoing_occupation[i]
+
+        self._planets_centers[i] = env._planets_centers
+
+        self._resources[i, 0] = env._player_1_resources
+        self._resources[i, 1] = env._player_2_resources
+
+    def _get_obs(self):
+        maps = _board_view(self._masked_maps).copy()
+        units_obs = [env._get_units_obs() for env in self.envs]
+
+        return {
+            player: {
+                "map": maps[:, e],
+                "allied_ships": tuple(game_obs[player]["allied_ships"] for game_obs in units_obs),
+                "enemy_ships": tuple(game_obs[player]["enemy_ships"] for game_obs in units_obs),
+                "planets_occupation": tuple(game_obs[player]["planets_occupation"] for game_obs in units_obs),
+                "resources": self._resources[:, e].copy()
+            } for e, player in enumerate(["player_1", "player_2"])
+        }
+
+    def close_extras(self, **kwargs: Any):
+        for env in self.envs:
+            env.close()
@@ -0,0 +1,117 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import zipfile
+
+import numpy as np
+
+
+class VideoRecorder:
+    """
+    Records frames returned by OctoSpaceEnv.render() (in the rgb_array mode) into a video.
+
+    Frames are encoded in a background thread, so the game doesn't wait for the encoder. They are passed through
+    a bounded queue, which blocks add_frame only when the encoder falls behind, so the memory usage stays the same
+    however long the recording is.
+
+    The video is encoded with ffmpeg. If it is not available, the frames are saved instead into a directory named as
+    the video without the extension, as numbered .npz files with chunk_size frames each (arrays frame_00000,
+    frame_00001... of shape (height, width, 3)). Frames are compressed into the files one by one as they come.
+
+    Args:
+        path: path to the created video, e.g. match.mp4
+        fps: frames per second of the video
+        queue_size: maximal number of frames waiting to be encoded
+        chunk_size: number of frames in every .npz file, used only without ffmpeg
+    """
+
+    def __init__(self, path: str, fps: int = 10, queue_size: int = 64, chunk_size: int = 500):
+        self.path = path
+        self.fps = fps
+        self.chunk_size = chunk_size
+        self.use_ffmpeg = shutil.which("ffmpeg") is not None
+        self.n_frames = 0
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error: Exception = None
+        self._thread = threading.Thread(target=self._encode, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add_frame(self, frame: np.ndarray):
+        """
+        Queues a frame of shape (height, width, 3) to be encoded. The frame can't be modified afterwards.
+        """
+        if self._error is not None:
+            raise RuntimeError("Encoding of the video has failed") from self._error
+        self._queue.put(frame)
+        self.n_frames += 1
+
+    def close(self):
+        """
+        Waits until all queued frames are encoded and finishes the video
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            raise RuntimeError("Encoding of the video has failed") from self._error
+
+    def _encode(self):
+        encoder = None
+        chunk = None
+        n_frames = 0
+
+        while True:
+            frame = self._queue.get()
+            # After a failure the frames are still taken from the queue, so add_frame never blocks forever
+            if self._error is not None and frame is not None:
+                continue
+
+            try:
+                if frame is None:
+                    if encoder is not None:
+                        encoder.stdin.close()
+                        if encoder.wait() != 0:
+                            raise RuntimeError(f"ffmpeg exited with code {encoder.returncode}")
+                    if chunk is not None:
+                        chunk.close()
+                    return
+
+                if self.use_ffmpeg:
+                    if encoder is None:
+                        encoder = self._start_ffmpeg(height=frame.shape[0], width=frame.shape[1])
+                    encoder.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+                else:
+                    if n_frames % self.chunk_size == 0:
+                        if chunk is not None:
+                            chunk.close()
+                        chunk = self._open_chunk(chunk_index=n_frames // self.chunk_size)
+                    with chunk.open(f"frame_{n_frames % self.chunk_size:05d}.npy", "w", force_zip64=True) as f:
+                        np.lib.format.write_array(f, np.asarray(frame, dtype=np.uint8))
+                n_frames += 1
+            except Exception as e:
+                self._error = e
+                if frame is None:
+                    return
+
+    def _start_ffmpeg(self, height: int, width: int) -> subprocess.Popen:
+        return subprocess.Popen(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}",
+             "-r", str(self.fps), "-i", "-", "-pix_fmt", "yuv420p", self.path],
+            stdin=subprocess.PIPE
+        )
+
+    def _open_chunk(self, chunk_index: int) -> zipfile.ZipFile:
+        directory = os.path.splitext(self.path)[0]
+        os.makedirs(directory, exist_ok=True)
+        # Fast compression, as the frames have to be saved as quickly as they are rendered
+        return zipfile.ZipFile(os.path.join(directory, f"frames_{chunk_index:05d}.npz"), mode="w",
+                               compression=zipfile.ZIP_DEFLATED, compresslevel=1)
@@ -0,0 +1,122 @@
+import numpy as np
+
+from octospace.envs.game_config import BOARD_SIZE, VISION_RANGE, VISION_ADD_MASK
+
+
+# The board is padded with VISION_RANGE tiles on every side, so the vision of a ship never has to be clipped
+PADDED_BOARD_SIZE = BOARD_SIZE + 2 * VISION_RANGE
+
+# Vision mask packed into bytes, for each of the 8 possible bit offsets of its first column
+VISION_STAMPS = np.stack([
+    np.packbits(np.pad(VISION_ADD_MASK, ((0, 0), (shift, 32 - VISION_ADD_MASK.shape[1] - shift))), axis=1)
+    for shift in range(8)
+])
+
+# Each row of the packed mask has to fit the stamp of the right-most tile of the board
+PACKED_WIDTH = (BOARD_SIZE - 1) // 8 + VISION_STAMPS.shape[2]
+
+# Offsets of the tiles covered by the vision mask
+VISION_ROWS, VISION_COLS = np.nonzero(VISION_ADD_MASK)
+
+
+def _board_view(padded: np.ndarray) -> np.ndarray:
+    """
+    Returns a view of the board area of padded array(s)
+    """
+    return padded[..., VISION_RANGE:VISION_RANGE + BOARD_SIZE, VISION_RANGE:VISION_RANGE + BOARD_SIZE]
+
+
+class Visibility:
+    """
+    Visibility of the board for a single player.
+
+    Areas once seen stay visible until the end of the game, so the visibility only has to be extended around ships
+    that moved or were built. It is stored bit-packed, one bit per tile, together with the player's view of the map
+    (tiles, which were never seen are set to -1). The view is updated only where the visibility or the map changes,
+    so it never has to be rebuilt from the whole board.
+
+    Args:
+        packed_mask: optional storage for the bit-packed mask, of shape (PADDED_BOARD_SIZE, PACKED_WIDTH)
+        masked_map: optional storage for the player's view of the map, of shape (PADDED_BOARD_SIZE, PADDED_BOARD_SIZE)
+    """
+
+    def __init__(self, packed_mask: np.ndarray = None, masked_map: np.ndarray = None):
+        if packed_mask is None:
+            packed_mask = np.zeros((PADDED_BOARD_SIZE, PACKED_WIDTH), dtype=np.uint8)
+        if masked_map is None:
+            masked_map = np.full((PADDED_BOARD_SIZE, PADDED_BOARD_SIZE), -1, dtype=int)
+
+        self._packed_mask = packed_mask
+        self._masked_map = masked_map
+        self.clear()
+
+    def clear(self):
+        self._packed_mask[:] = 0
+        self._masked_map[:] = -1
+
+    @property
+    def masked_map(self) -> np.ndarray:
+        """
+        Player's view of the map, tiles outside of the visibility are set to -1
+        """
+        return _board_view(self._masked_map)
+
+    @property
+    def mask(self) -> np.ndarray:
+        """
+        Unpacked visibility mask of shape (BOARD_SIZE, BOARD_SIZE)
+        """
+        return _board_view(np.unpackbits(self._packed_mask, axis=1, count=PADDED_BOARD_SIZE).astype(bool))
+
+    def is_visible(self, rows, cols) -> np.ndarray:
+        """
+        Returns whether the tiles at the given positions are visible
+        """
+        rows = np.asarray(rows) + VISION_RANGE
+        cols = np.asarray(cols) + VISION_RANGE
+        return (self._packed_mask[rows, cols >> 3] >> (7 - (cols & 7))) & 1 == 1
+
+    def reveal(self, rows, cols, game_map: np.ndarray):
+        """
+        Adds the vision range around the given positions to the visibility
+
+        :param rows: rows of the centers of the revealed areas
+        :param cols: columns of the centers of the revealed areas
+        :param game_map: current map, used to update the player's view of it
+        """
+        rows = np.asarray(rows, dtype=int).reshape(-1)
+        cols = np.asarray(cols, dtype=int).reshape(-1)
+        if len(rows) == 0:
+            return
+
+        # Positions on the padded board are shifted by VISION_RANGE, so the vision starts exactly at (row, col)
+        stamp_rows = rows[:, None, None] + np.arange(VISION_STAMPS.shape[1])[None, :, None]
+        stamp_cols = (cols >> 3)[:, None, None] + np.arange(VISION_STAMPS.shape[2])[None, None, :]
+        np.bitwise_or.at(self._packed_mask, (stamp_rows, stamp_cols), VISION_STAMPS[cols & 7])
+
+        # All tiles under the vision mask are now visible. Tiles of the padding get arbitrary values, but are never read
+        padded_rows = (rows[:, None] + VISION_ROWS[None, :]).reshape(-1)
+        padded_cols = (cols[:, None] + VISION_COLS[None, :]).reshape(-1)
+        self._masked_map[padded_rows, padded_cols] = game_map[np.clip(padded_rows - VISION_RANGE, 0, BOARD_SIZE - 1),
+                                                              np.clip(padded_cols - VISION_RANGE, 0, BOARD_SIZE - 1)]
+
+    def refresh(self, game_map: np.ndarray, start_row: int, end_row: int, start_col: int, end_col: int):
+        """
+        Updates the player's view of the map in the given area, after the map has changed there
+        """
+        rows, cols = np.mgrid[start_row:end_row, start_col:end_col]
+        self.masked_map[start_row:end_row, start_col:end_col] = np.where(self.is_visible(rows, cols),
+                                                                         game_map[start_row:end_row, start_col:end_col], -1)
+
+    def get_state(self) -> np.ndarray:
+        """
+        Returns a copy of the bit-packed visibility mask
+        """
+        return self._packed_mask.copy()
+
+    def set_state(self, packed_mask: np.ndarray, game_map: np.ndarray):
+        """
+        Restores the visibility from the mask returned by get_state, the player's view is rebuilt from the given map
+        """
+        self._packed_mask[:] = packed_mask
+        self.masked_map[:] = np.where(self.mask, game_map, -1)
@@ -0,0 +1,265 @@
+import argparse
+import functools
+import json
+import os
+import statistics
+
+import numpy as np
+
+from run_tournament import MatchPool, load_results, format_result
+
+
+# Ids of the teams, as which the checkpoints are shown in the environment
+ENV_PLAYER_IDS = (46, 47)
+
+_NORMAL = statistics.NormalDist()
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Rate the checkpoints of the DQN agent with TrueSkill, playing the '
+                                                 'most informative matches between them')
+    parser.add_argument('checkpoints_dir', type=str, nargs='?', default='agents', help='Directory with the .pth checkpoints')
+    parser.add_argument('--n_games', type=int, default=1000, help='Maximal number of played games')
+    parser.add_argument('--n_workers', type=int, default=os.cpu_count(), help='Number of games played in parallel')
+    parser.add_argument('--max_steps', type=int, default=2000, help='Number of steps, after which the game ends in a draw')
+    parser.add_argument('--time_limit', type=float, default=600, help='Time limit of a game in seconds')
+    parser.add_argument('--draw_probability', type=float, default=0.3, help='Prior probability of a draw between '
+                                                                           'equally strong checkpoints')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the rating intervals, '
+                                                                      'the rating stops once the best checkpoint is '
+                                                                      'separated from the rest at this level')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the maps')
+    parser.add_argument('--output', type=str, default='rating_results.jsonl', help='Path to the file with the results, '
+                                                                                   'one JSON line per game. Games already '
+                                                                                   'saved in it are used again')
+    return parser
+
+
+class TrueSkill:
+    """
+    TrueSkill ratings of players playing 1 vs 1 games, which can end in a draw. The skill of every player is
+    a Gaussian with the mean mu and the standard deviation sigma.
+
+    Args:
+        n_players: number of rated players
+        mu: initial mean of the skills
+        sigma: initial standard deviation of the skills
+        beta: standard deviation of the performance in a single game around the skill
+        tau: standard deviation added to the skills before every game, so they don't become completely certain
+        draw_probability: probability of a draw between players with equal skills
+    """
+
+    def __init__(
+            self,
+            n_players: int,
+            mu: float = 25.0,
+            sigma: float = 25 / 3,
+            beta: float = 25 / 6,
+            tau: float = 25 / 300,
+            draw_probability: float = 0.1
+    ):
+        self.mu = np.full(n_players, mu)
+        self.sigma = np.full(n_players, sigma)
+        self.n_games = np.zeros(n_players, dtype=int)
+        self.beta = beta
+        self.tau = tau
+        self.draw_margin = _NORMAL.inv_cdf((draw_probability + 1) / 2) * np.sqrt(2) * beta
+
+    def update(self, player_1: int, player_2: int, score: float):
+        """
+        Updates the ratings after a game, in which the 1st player scored 1 (win), 0.5 (draw) or 0 (loss)
+        """
+        if score < 0.5:
+            player_1, player_2 = player_2, player_1
+        variance_1 = self.sigma[player_1] ** 2 + self.tau ** 2
+        variance_2 = self.sigma[player_2] ** 2 + self.tau ** 2
+        c = np.sqrt(2 * self.beta ** 2 + variance_1 + variance_2)
+
+        # The 1st player is now the winner (or either of them in a draw)
+        t = (self.mu[player_1] - self.mu[player_2]) / c
+        eps = self.draw_margin / c
+        if score == 0.5:
+            v, w = _draw_v(t, eps), _draw_w(t, eps)
+        else:
+            v, w = _win_v(t, eps), _win_w(t, eps)
+
+        self.mu[player_1] += variance_1 / c * v
+        self.mu[player_2] -= variance_2 / c * v
+        self.sigma[player_1] = np.sqrt(variance_1 * max(1 - variance_1 / c ** 2 * w, 1e-6))
+        self.sigma[player_2] = np.sqrt(variance_2 * max(1 - variance_2 / c ** 2 * w, 1e-6))
+        self.n_games[[player_1, player_2]] += 1
+
+    def match_quality(self, player: int) -> np.ndarray:
+        """
+        Returns the quality of the games of the player against every player, i.e. how likely the game is to be a draw
+        (so how much its result is unknown), compared to a game between equal players
+        """
+        c2 = 2 * self.beta ** 2 + self.sigma[player] ** 2 + self.sigma ** 2
+        return np.sqrt(2 * self.beta ** 2 / c2) * np.exp(-(self.mu[player] - self.mu) ** 2 / (2 * c2))
+
+    def intervals(self, confidence: float) -> tuple:
+        """
+        :return: lower and upper bounds of the skills of all players at the given confidence level
+        """
+        z = _NORMAL.inv_cdf((confidence + 1) / 2)
+        return self.mu - z * self.sigma, self.mu + z * self.sigma
+
+
+def _win_v(t: float, eps: float) -> float:
+    # Far in the tail the cdf underflows, then v is approximated by its asymptote
+    denominator = _NORMAL.cdf(t - eps)
+    return _NORMAL.pdf(t - eps) / denominator if denominator > 1e-12 else eps - t
+
+
+def _win_w(t: float, eps: float) -> float:
+    v = _win_v(t, eps)
+    return v * (v + t - eps)
+
+
+def _draw_v(t: float, eps: float) -> float:
+    denominator = _NORMAL.cdf(eps - t) - _NORMAL.cdf(-eps - t)
+    if denominator < 1e-12:
+        return -t - eps if t > 0 else -t + eps
+    return (_NORMAL.pdf(-eps - t) - _NORMAL.pdf(eps - t)) / denominator
+
+
+def _draw_w(t: float, eps: float) -> float:
+    denominator = _NORMAL.cdf(eps - t) - _NORMAL.cdf(-eps - t)
+    if denominator < 1e-12:
+        return 1.0
+    v = _draw_v(t, eps)
+    return v ** 2 + ((eps - t) * _NORMAL.pdf(eps - t) + (eps + t) * _NORMAL.pdf(eps + t)) / denominator
+
+
+def choose_pairing(ratings: TrueSkill, confidence: float, pending: np.ndarray) -> tuple:
+    """
+    Chooses the next pair of players, whose game tells the most about which of them is the best
+
+    Only the contenders, which still can be the best player at the given confidence level, are paired: the least
+    certain of them with the opponent giving the most balanced game. Players with many pending (scheduled, but not
+    yet rated) games are avoided, so the parallel workers don't play the same pairing many times.
+
+    :param pending: number of pending games of every player
+    :return: indices of both players, or None if the best player is already known
+    """
+    lower, upper = ratings.intervals(confidence)
+    contenders = np.flatnonzero(upper >= lower.max())
+    if len(contenders) < 2:
+        return None
+
+    player = contenders[np.argmax(ratings.sigma[contenders] / (1 + pending[contenders]))]
+    quality = ratings.match_quality(player)[contenders] / (1 + pending[contenders])
+    quality[contenders == player] = -1
+    return int(player), int(contenders[np.argmax(quality)])
+
+
+class _FrozenAgent:
+    """
+    Passes only the observations to the DQN agent, so it doesn't learn (nor save its weights) during the rated games
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+
+    def get_action(self, obs: dict, info: dict = None) -> dict:
+        return self.agent.get_action(obs)
+
+
+def _setup_checkpoint_agent(checkpoints_dir: str, checkpoint: str, side: int) -> _FrozenAgent:
+    from dummy_ml_agent import Agent
+    from simulation import DEVICE
+
+    agent = Agent(side=side)
+    agent.load_checkpoint(os.path.join(checkpoints_dir, checkpoint))
+    agent.to(DEVICE)
+    agent.eval()
+    return _FrozenAgent(agent)
+
+
+def print_ratings(ratings: TrueSkill, checkpoints: list, confidence: float):
+    lower, upper = ratings.intervals(confidence)
+    print(f'{"":>4} {"Checkpoint":<16} {"Rating":>7} {f"{confidence:.0%} interval":>18} {"Games":>6}')
+    for place, i in enumerate(np.argsort(-lower), 1):
+        print(f'{place:>3}. {checkpoints[i]:<16} {ratings.mu[i]:>7.2f} {f"[{lower[i]:.2f}, {upper[i]:.2f}]":>18} '
+              f'{ratings.n_games[i]:>6}')
+
+
+def rate_checkpoints(
+        checkpoints_dir: str = 'agents',
+        n_games: int = 1000,
+        n_workers: int = None,
+        max_steps: int = 2000,
+        time_limit: float = 600,
+        draw_probability: float = 0.3,
+        confidence: float = 0.95,
+        seed: int = 0,
+        output: str = 'rating_results.jsonl'
+) -> TrueSkill:
+    checkpoints = sorted(name for name in os.listdir(checkpoints_dir) if name.endswith(".pth"))
+    index = {checkpoint: i for i, checkpoint in enumerate(checkpoints)}
+    ratings = TrueSkill(n_players=len(checkpoints), draw_probability=draw_probability)
+
+    # Games played by the previous runs are rated again, in the same order
+    results = [result for result in load_results(output)
+               if result["player_1_id"] in index and result["player_2_id"] in index]
+    for result in results:
+        if result["score"] is None:
+            continue
+        ratings.update(index[result["player_1_id"]], index[result["player_2_id"]], result["score"][0])
+    print(f'{len(checkpoints)} checkpoints, {len(results)} games already played')
+
+    n_workers = n_workers or os.cpu_count()
+    pending = np.zeros(len(checkpoints), dtype=int)
+    next_seed = max((result["seed"] + 1 for result in results), default=seed)
+    n_submitted = len(results)
+
+    setup_player_agent = functools.partial(_setup_checkpoint_agent, checkpoints_dir)
+    with open(output, "a") as f, MatchPool(setup_player_agent=setup_player_agent, n_workers=n_workers,
+                                           max_steps=max_steps, time_limit=time_limit,
+                                           env_player_ids=ENV_PLAYER_IDS) as pool:
+        while True:
+            # Keep every worker busy with a pair of games on the same map, one on each side
+            while pool.n_busy < n_workers and n_submitted < n_games:
+                pairing = choose_pairing(ratings, confidence=confidence, pending=pending)
+                if pairing is None:
+                    break
+                player_1, player_2 = pairing
+                for match in [(player_1, player_2), (player_2, player_1)]:
+                    pool.submit((checkpoints[match[0]], checkpoints[match[1]], next_seed))
+                    n_submitted += 1
+                pending[[player_1, player_2]] += 2
+                next_seed += 1
+
+            if len(pool) == 0:
+                break
+            for result in pool.wait():
+                f.write(json.dumps(result) + "\n")
+                f.flush()
+                results.append(result)
+
+                player_1, player_2 = index[result["player_1_id"]], index[result["player_2_id"]]
+                pending[[player_1, player_2]] -= 1
+                # A game which failed without a known culprit isn't rated
+                if result["score"] is not None:
+                    ratings.update(player_1, player_2, result["score"][0])
+                print(f'[{len(results)}] {result["player_1_id"]} vs {result["player_2_id"]}: {format_result(result)}')
+
+    print_ratings(ratings, checkpoints=checkpoints, confidence=confidence)
+    return ratings
+
+
+if __name__ == '__main__':
+    parse = get_parser()
+    args = parse.parse_args()
+
+    rate_checkpoints(checkpoints_dir=args.checkpoints_dir, n_games=args.n_games, n_workers=args.n_workers,
+                     max_steps=args.max_steps, time_limit=args.time_limit, draw_probability=args.draw_probability,
+                     confidence=args.confidence, seed=args.seed, output=args.output)
+
+    """
+    Example execution:
+        python rate_checkpoints.py agents --n_games=500 --n_workers=32
+        python rate_checkpoints.py agents32 --max_steps=500 --output=rating_agents32.jsonl
+
+    Running the same command again continues the rating from the games saved in the output file.
+    """
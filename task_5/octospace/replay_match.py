@@ -0,0 +1,78 @@
+import argparse
+
+import pygame
+
+from octospace.envs.match_recording import MatchReplay
+from octospace.envs.video import VideoRecorder
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Replay a match recorded with MatchRecorder (e.g. by run_tournament.py)')
+    parser.add_argument('path', type=str, help='Path to the recorded match')
+    parser.add_argument('--turn', type=int, default=None, help='Turn, from which the match is replayed (by default the first one)')
+    parser.add_argument('--last_turn', type=int, default=None, help='Turn, at which the replay stops (by default the last one)')
+    parser.add_argument('--render_mode', type=str, default=None, help='Render mode (human by default), "none" only '
+                                                                      'prints the state of the game at the last turn')
+    parser.add_argument('--record', type=str, default=None, help='Path to the video of the replayed turns, e.g. match.mp4')
+    return parser
+
+
+def replay_match(
+        path: str,
+        turn: int = None,
+        last_turn: int = None,
+        render_mode: str = None,
+        record: str = None
+):
+    # Recorded frames are rendered headless
+    if record is not None:
+        assert render_mode in [None, "rgb_array"], "The match can't be recorded while it is rendered to a window"
+        render_mode = "rgb_array"
+    elif render_mode is None:
+        render_mode = "human"
+    render_mode = None if render_mode == "none" else render_mode
+
+    replay = MatchReplay(path, render_mode=render_mode, renderer="numpy" if record is not None else "pygame")
+    turn = replay.first_turn if turn is None else turn
+    last_turn = replay.last_turn if last_turn is None else last_turn
+    print(f'Turns {replay.first_turn}-{replay.last_turn} of the match between the players {replay.meta["player_ids"]}')
+
+    recorder = VideoRecorder(record, fps=replay.env.metadata["render_fps"]) if record is not None else None
+    try:
+        for curr_turn in range(turn, last_turn + 1):
+            env = replay.seek(curr_turn)
+            if render_mode is None:
+                continue
+
+            frame = env.render()
+            if recorder is not None:
+                recorder.add_frame(frame)
+
+            if render_mode == "human":
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        return
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+    env = replay.env
+    print(f'Turn {env.turn}: {len(env._player_1_fleet)} vs {len(env._player_2_fleet)} ships, '
+          f'resources {env._player_1_resources.tolist()} vs {env._player_2_resources.tolist()}, '
+          f'victorious: {[bool(victorious) for victorious in env.victorious_player]}')
+    env.close()
+
+
+if __name__ == '__main__':
+    parse = get_parser()
+    args = parse.parse_args()
+
+    replay_match(path=args.path, turn=args.turn, last_turn=args.last_turn, render_mode=args.render_mode,
+                 record=args.record)
+
+    """
+    Example execution:
+        python replay_match.py matches/46_47_0.npz --turn=500
+        python replay_match.py matches/46_47_0.npz --turn=500 --last_turn=600 --record=match.mp4
+        python replay_match.py matches/46_47_0.npz --turn=1200 --render_mode=none
+    """
@@ -17,6 +17,8 @@ def get_parser():
     parser.add_argument('--verbose', action='store_true', help='Print additional information')
     parser.add_argument('--render_mode', type=str, default=None, help='Render mode')
     parser.add_argument('--turn_on_music', type=bool, default=False, help='Music')
+    parser.add_argument('--record', type=str, default=None, help='Path to the video of the match, e.g. match.mp4 '
+                                                                  '(frames are saved as .npz files if ffmpeg is not installed)')
     return parser
 
 
@@ -26,7 +28,8 @@ def run_match(
         agent_2_path: str,
         render_mode: str = None,
         verbose: bool = False,
-        turn_on_music: bool = False
+        turn_on_music: bool = False,
+        record: str = None
 ):
     # Disable warnings in the gym
     if not verbose:
@@ -40,7 +43,7 @@ def run_match(
 
     score = simulate_game(player_1_id=player_1_id, player_2_id=player_2_id, player_1_agent_class=agent_1.Agent,
                             player_2_agent_class=agent_2.Agent, n_games=n_matches,
-                            render_mode=render_mode, verbose=False, turn_on_music=turn_on_music)
+                            render_mode=render_mode, verbose=False, turn_on_music=turn_on_music, record=record)
 
     print(f'{TEAMS[player_1_id]} vs {TEAMS[player_2_id]}: {score}')
 
@@ -50,11 +53,12 @@ if __name__ == '__main__':
     args = parse.parse_args()
 
     run_match(n_matches=args.n_matches, agent_1_path=args.path_to_agent_1, agent_2_path=args.path_to_agent_2,
-              verbose=args.verbose, render_mode=args.render_mode, turn_on_music=args.turn_on_music)
+              verbose=args.verbose, render_mode=args.render_mode, turn_on_music=args.turn_on_music, record=args.record)
 
     """
     Example execution:
         python run_match.py ../agent.py ../agent.py --n_matches=1 --render_mode=human --turn_on_music=True
+        python run_match.py ../agent.py ../agent.py --n_matches=1 --record=match.mp4
         
     !IMPORTANT!
     If it happens, that you have a smaller screen on your computer and the game window doesn't render correctly,
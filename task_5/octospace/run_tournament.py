@@ -0,0 +1,474 @@
+import argparse
+import collections
+import concurrent.futures
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import time
+
+import gymnasium as gym
+import numpy as np
+
+# Don't delete this! It allows the environment to be registered
+import octospace
+from octospace.envs.match_recording import MatchRecorder
+
+from importlib.machinery import SourceFileLoader
+
+from matches_config import TEAMS
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Run a round-robin tournament between the agents of all teams')
+    parser.add_argument('agents_dir', type=str, help='Directory with the agents, the agent of the team with id i is '
+                                                     'read from agents_dir/i/agent.py and loads its weights from agents_dir/i/')
+    parser.add_argument('--teams', type=int, nargs='+', default=None, help='Ids of the teams taking part in the tournament '
+                                                                           '(by default all teams with an agent in agents_dir)')
+    parser.add_argument('--n_workers', type=int, default=os.cpu_count(), help='Number of matches played in parallel')
+    parser.add_argument('--n_rounds', type=int, default=1, help='Number of times every pair of teams meets '
+                                                                '(each time on a new map, once on each side)')
+    parser.add_argument('--max_steps', type=int, default=2000, help='Number of steps, after which the match ends in a draw')
+    parser.add_argument('--time_limit', type=float, default=600, help='Time limit of a match in seconds, the agent '
+                                                                     'which used more of it loses the match')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the maps')
+    parser.add_argument('--output', type=str, default='tournament_results.jsonl', help='Path to the file with the results, '
+                                                                                       'one JSON line per finished match. '
+                                                                                       'Matches already saved in it are not played again')
+    parser.add_argument('--overwrite', action='store_true', help='Discard the results saved in the output file')
+    parser.add_argument('--save_matches', type=str, default=None, help='Directory, into which every match is recorded '
+                                                                       '(it can be watched with replay_match.py)')
+    return parser
+
+
+class MatchTimeout(BaseException):
+    # Not an Exception, so agents catching all exceptions can't swallow the alarm
+    pass
+
+
+def schedule_matches(teams: list, n_rounds: int, seed: int) -> list:
+    """
+    Returns all matches of the tournament as (player 1 id, player 2 id, seed) tuples. Every pair of teams plays twice
+    on the same map, so each of them plays once on every side.
+
+    The seed of a match depends only on the pair of teams and the round, so adding new teams to the tournament
+    doesn't change the matches between the old ones.
+    """
+    matches = []
+    for curr_round in range(n_rounds):
+        for team_1, team_2 in itertools.combinations(sorted(teams), 2):
+            match_seed = seed + (curr_round * len(TEAMS) + team_1) * len(TEAMS) + team_2
+            matches.append((team_1, team_2, match_seed))
+            matches.append((team_2, team_1, match_seed))
+    return matches
+
+
+def _match_key(result: dict) -> tuple:
+    return result["player_1_id"], result["player_2_id"], result["seed"]
+
+
+def load_results(path: str) -> list:
+    """
+    Reads the results saved in the output file of a tournament. A line left unfinished by an interrupted run is
+    removed from the file, so the next results can be appended after it.
+    """
+    if not os.path.exists(path):
+        return []
+
+    with open(path, "rb+") as f:
+        content = f.read()
+        finished = content.rfind(b"\n") + 1
+        if finished != len(content):
+            f.truncate(finished)
+    return [json.loads(line) for line in content[:finished].decode().splitlines() if line.strip()]
+
+
+# State of the worker process, set by _init_worker
+_WORKER = {}
+
+
+def _init_worker(max_steps: int, time_limit: float, setup_player_agent, env_player_ids: tuple, save_matches: str,
+                 acting_side):
+    # Torch is imported only in the workers, the main process just schedules the matches
+    import torch
+
+    # Matches are already played in parallel, so every worker uses a single thread
+    torch.set_num_threads(1)
+    gym.logger.min_level = 40
+
+    _WORKER.update(max_steps=max_steps, time_limit=time_limit, setup_player_agent=setup_player_agent,
+                   env_player_ids=env_player_ids, save_matches=save_matches, acting_side=acting_side)
+    if hasattr(signal, "SIGALRM"):
+        signal.signal(signal.SIGALRM, _raise_timeout)
+
+
+def _raise_timeout(signum, frame):
+    raise MatchTimeout()
+
+
+def _publish_acting(side: int = None):
+    # The main process blames the published side, if the worker gets killed (e.g. out of memory) while it acts
+    acting_side = _WORKER["acting_side"]
+    if acting_side is not None:
+        acting_side.value = -1 if side is None else side
+
+
+@functools.lru_cache(maxsize=None)
+def _get_agent_class(agents_dir: str, team_id: int):
+    path = os.path.join(agents_dir, str(team_id), "agent.py")
+    return SourceFileLoader(f'agent_{team_id}', path).load_module().Agent
+
+
+def _setup_team_agent(agents_dir: str, team_id: int, side: int):
+    from simulation import setup_agent
+
+    return setup_agent(agent_class=_get_agent_class(agents_dir, team_id), player_id=team_id, side=side,
+                       agents_dir=agents_dir)
+
+
+def create_executor(
+        setup_player_agent,
+        n_workers: int = None,
+        max_steps: int = 2000,
+        time_limit: float = 600,
+        env_player_ids: tuple = None,
+        save_matches: str = None,
+        acting_side=None
+) -> concurrent.futures.ProcessPoolExecutor:
+    """
+    Creates a pool of processes, which play the matches submitted with play_match
+
+    :param setup_player_agent: picklable function (player id, side) -> agent, called in the workers
+    :param env_player_ids: ids of the teams, as which both players are shown in the environment. By default the ids of
+        the players are used, so they have to be the ids of the teams then
+    :param save_matches: optional directory, into which every match is recorded with MatchRecorder
+    :param acting_side: optional shared multiprocessing.Value, into which the workers publish the side whose agent is
+        being set up or choosing its action (-1 if none of them)
+    """
+    if save_matches is not None:
+        os.makedirs(save_matches, exist_ok=True)
+
+    # Agents are loaded in fresh processes, as the forked ones could inherit e.g. an initialized CUDA context.
+    # Unlike multiprocessing.Pool, the executor fails instead of hanging, when a worker gets killed (e.g. out of memory)
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker,
+        initargs=(max_steps, time_limit, setup_player_agent, env_player_ids, save_matches, acting_side))
+
+
+def play_match(match: tuple) -> dict:
+    """
+    Plays a single match in the worker process
+
+    :param match: (player 1 id, player 2 id, seed), see schedule_matches
+    :return: result of the match
+    """
+    player_1_id, player_2_id, seed = match
+    max_steps = _WORKER["max_steps"]
+    time_limit = _WORKER["time_limit"]
+    env_player_ids = _WORKER["env_player_ids"] or (player_1_id, player_2_id)
+
+    env = gym.make('OctoSpace-v0', player_1_id=env_player_ids[0], player_2_id=env_player_ids[1], max_steps=max_steps,
+                   render_mode=None)
+    result = {"player_1_id": player_1_id, "player_2_id": player_2_id, "seed": seed}
+    recorder = None
+    if _WORKER["save_matches"] is not None:
+        recorder = MatchRecorder(os.path.join(_WORKER["save_matches"], f"{player_1_id}_{player_2_id}_{seed}.npz"))
+    thinking_time = [0.0, 0.0]
+    acting = None
+    setting_up = True
+    start = time.perf_counter()
+    deadline = start + time_limit
+
+    # The alarm interrupts agents, which got stuck during a single action
+    if hasattr(signal, "SIGALRM"):
+        signal.setitimer(signal.ITIMER_REAL, time_limit)
+    try:
+        # Errors and timeouts while an agent is set up (e.g. missing weights) are the fault of its team
+        agents = []
+        for side, player_id in enumerate([player_1_id, player_2_id]):
+            acting = side
+            _publish_acting(acting)
+            agents.append(_WORKER["setup_player_agent"](player_id, side))
+        acting = None
+        _publish_acting(acting)
+        setting_up = False
+
+        obs, info = env.reset(seed=seed)
+        agents_info = [None, None]
+        if recorder is not None:
+            # Only a started recording is written, so matches forfeited during the setup have no recording
+            recorder.start(env)
+            result["recording"] = recorder.path
+
+        while True:
+            actions = []
+            for k, agent in enumerate(agents):
+                acting = k
+                _publish_acting(acting)
+                action_start = time.perf_counter()
+                actions.append(agent.get_action(obs[f"player_{k + 1}"], agents_info[k]))
+                thinking_time[k] += time.perf_counter() - action_start
+                acting = None
+                _publish_acting(acting)
+
+            prev_obs = obs
+            step_actions = {"player_1": actions[0], "player_2": actions[1]}
+            obs, reward, terminated, _, info = env.step(step_actions)
+            if recorder is not None:
+                recorder.record(step_actions)
+            agents_info = [
+                {
+                    "reward": info[k + 1],
+                    "terminated": terminated,
+                    "prev_obs": prev_obs[f"player_{k + 1}"],
+                    "actions": actions[k]
+                }
+                for k in range(2)
+            ]
+
+            if terminated or sum(reward.values()) != 0:
+                result["score"] = [reward["player_1"], reward["player_2"]]
+                result["status"] = "victory" if any(env.unwrapped.victorious_player) else "max_steps"
+                break
+            if time.perf_counter() > deadline:
+                raise MatchTimeout()
+
+    except MatchTimeout:
+        if setting_up:
+            loser = acting
+        else:
+            if acting is not None:
+                thinking_time[acting] += time.perf_counter() - action_start
+            loser = 0 if thinking_time[0] > thinking_time[1] else 1
+        result["score"] = [0, 1] if loser == 0 else [1, 0]
+        result["status"] = "timeout"
+
+    except Exception as e:
+        # Errors of the environment are not the fault of any of the agents
+        if acting is None:
+            raise
+        result["score"] = [0, 1] if acting == 0 else [1, 0]
+        result["status"] = "error"
+        result["error"] = repr(e)
+
+    finally:
+        if hasattr(signal, "SIGALRM"):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        _publish_acting(None)
+        # Matches ended by a timeout or an error are saved too, up to the last played turn
+        if recorder is not None:
+            recorder.close()
+        env.close()
+
+    result["turns"] = env.unwrapped.turn
+    result["time"] = time.perf_counter() - start
+    result["thinking_time"] = thinking_time
+    return result
+
+
+def _failed_match_result(match: tuple, error: Exception, loser: int = -1) -> dict:
+    player_1_id, player_2_id, seed = match
+    score = None if loser == -1 else [0, 1] if loser == 0 else [1, 0]
+    return {"player_1_id": player_1_id, "player_2_id": player_2_id, "seed": seed, "score": score, "status": "error",
+            "error": repr(error)}
+
+
+class MatchPool:
+    """
+    Plays the matches in a pool of processes (see create_executor) and returns their results as they finish.
+
+    A match, which raised an error not caused by any of the agents (see play_match), or whose worker got killed (e.g. out
+    of memory), gets a result with the "error" status and no score, instead of stopping the remaining matches. A killed
+    worker breaks the whole pool, so a new pool is started and the matches lost with the old one are played again, one
+    at a time in a separate worker, to find the match which kills its worker. If one of the agents was being set up or
+    was choosing its action then, its team forfeits the match (with the "error" status).
+
+    Args:
+        n_workers: number of matches played in parallel (besides the separate worker)
+        **kwargs: arguments of create_executor
+    """
+
+    def __init__(self, n_workers: int = None, **kwargs):
+        self.n_workers = n_workers or os.cpu_count()
+        self._kwargs = kwargs
+        # Whether the pool is the separate one -> pool, started when a match is submitted to it
+        self._executors = {False: None, True: None}
+        # Future -> (match, pool which plays it)
+        self._futures = {}
+        # Matches lost with a broken pool, waiting to be played in the separate worker
+        self._suspects = collections.deque()
+        # Side acting in the separate worker, published by play_match
+        self._acting_side = multiprocessing.get_context("spawn").Value("i", -1, lock=False)
+
+    def __len__(self):
+        # Number of submitted matches without a result yet
+        return len(self._futures) + len(self._suspects)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def n_busy(self) -> int:
+        """
+        Number of matches played (or queued) in the main pool
+        """
+        return sum(executor is not self._executors[True] for _, executor in self._futures.values())
+
+    def submit(self, match: tuple):
+        self._submit(match, isolated=False)
+
+    def wait(self) -> list:
+        """
+        Waits until at least one of the submitted matches finishes and returns the results of all finished matches
+        """
+        results = []
+        while not results and len(self) > 0:
+            if self._suspects and self.n_busy == len(self._futures):
+                self._submit(self._suspects.popleft(), isolated=True)
+
+            done, _ = concurrent.futures.wait(self._futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                match, executor = self._futures.pop(future)
+                try:
+                    results.append(future.result())
+                except concurrent.futures.process.BrokenProcessPool as e:
+                    if executor is self._executors[True]:
+                        results.append(_failed_match_result(match, e, loser=self._acting_side.value))
+                        self._acting_side.value = -1
+                    else:
+                        self._suspects.append(match)
+                    self._drop(executor)
+                except Exception as e:
+                    results.append(_failed_match_result(match, e))
+        return results
+
+    def close(self):
+        for future in self._futures:
+            future.cancel()
+        for executor in self._executors.values():
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def _submit(self, match: tuple, isolated: bool):
+        for attempt in range(2):
+            if self._executors[isolated] is None:
+                self._executors[isolated] = create_executor(n_workers=1 if isolated else self.n_workers,
+                                                            acting_side=self._acting_side if isolated else None,
+                                                            **self._kwargs)
+            try:
+                self._futures[self._executors[isolated].submit(play_match, match)] = (match, self._executors[isolated])
+                return
+            except concurrent.futures.process.BrokenProcessPool:
+                # The pool can break before any of its matches returns
+                self._drop(self._executors[isolated])
+        raise RuntimeError("Can't start a pool of workers")
+
+    def _drop(self, executor: concurrent.futures.ProcessPoolExecutor):
+        # All futures of a broken pool fail, but only the first of them replaces it with a new one
+        for isolated, current in self._executors.items():
+            if current is executor:
+                executor.shutdown(wait=False)
+                self._executors[isolated] = None
+
+
+def format_result(result: dict) -> str:
+    if result["score"] is None:
+        return f'failed ({result["error"]})'
+    if "turns" not in result:
+        # The worker got killed, while one of the agents was acting
+        return f'{result["score"]} ({result["status"]}, {result["error"]})'
+    return f'{result["score"]} ({result["status"]}, {result["turns"]} turns, {result["time"]:.1f}s)'
+
+
+def compute_standings(results: list) -> list:
+    """
+    Returns rows of the standings table, sorted from the best team: (team id, points, wins, draws, losses, forfeits).
+    Forfeits are the matches lost because of an error or exceeding the time limit. Matches which failed without a known
+    culprit (no score) aren't counted.
+    """
+    standings = {}
+    for result in results:
+        if result["score"] is None:
+            continue
+        for player_id, score in zip([result["player_1_id"], result["player_2_id"]], result["score"]):
+            row = standings.setdefault(player_id, np.zeros(5))
+            row += [score, score == 1, score == 0.5, score == 0, score == 0 and result["status"] in ("timeout", "error")]
+    return sorted(((player_id, *row) for player_id, row in standings.items()), key=lambda row: (-row[1], -row[2]))
+
+
+def print_standings(standings: list):
+    print(f'{"":>4} {"Team":<30} {"Points":>7} {"W":>4} {"D":>4} {"L":>4} {"Forfeits":>9}')
+    for place, (player_id, points, wins, draws, losses, forfeits) in enumerate(standings, 1):
+        print(f'{place:>3}. {TEAMS[player_id]:<30} {points:>7g} {wins:>4.0f} {draws:>4.0f} {losses:>4.0f} {forfeits:>9.0f}')
+
+
+def run_tournament(
+        agents_dir: str,
+        teams: list = None,
+        n_workers: int = None,
+        n_rounds: int = 1,
+        max_steps: int = 2000,
+        time_limit: float = 600,
+        seed: int = 0,
+        output: str = 'tournament_results.jsonl',
+        overwrite: bool = False,
+        save_matches: str = None
+):
+    if teams is None:
+        teams = [player_id for player_id in range(len(TEAMS))
+                 if os.path.isfile(os.path.join(agents_dir, str(player_id), "agent.py"))]
+    matches = schedule_matches(teams=teams, n_rounds=n_rounds, seed=seed)
+
+    # Results of the matches played by the previous runs are reused, also those from tournaments with fewer teams.
+    # Matches which failed without a score are played again
+    if overwrite and os.path.exists(output):
+        os.remove(output)
+    scheduled = set(matches)
+    results = [result for result in load_results(output)
+               if _match_key(result) in scheduled and result["score"] is not None]
+    finished = {_match_key(result) for result in results}
+    remaining = [match for match in matches if match not in finished]
+    print(f'{len(matches)} matches between {len(teams)} teams, {len(remaining)} of them left to play')
+
+    remaining = collections.deque(remaining)
+    with open(output, "a") as f, MatchPool(setup_player_agent=functools.partial(_setup_team_agent, agents_dir),
+                                           n_workers=n_workers, max_steps=max_steps, time_limit=time_limit,
+                                           save_matches=save_matches) as pool:
+        while remaining or len(pool) > 0:
+            # Matches are handed out one by one, so the workers stay busy even if some of the matches are much longer
+            while remaining and pool.n_busy < pool.n_workers:
+                pool.submit(remaining.popleft())
+
+            for result in pool.wait():
+                # Every result is saved as soon as its match ends, so an interrupted tournament can be resumed
+                f.write(json.dumps(result) + "\n")
+                f.flush()
+                results.append(result)
+                print(f'[{len(results)}/{len(matches)}] {TEAMS[result["player_1_id"]]} vs {TEAMS[result["player_2_id"]]}: '
+                      + format_result(result))
+
+    standings = compute_standings(results)
+    print_standings(standings)
+    return standings
+
+
+if __name__ == '__main__':
+    parse = get_parser()
+    args = parse.parse_args()
+
+    run_tournament(agents_dir=args.agents_dir, teams=args.teams, n_workers=args.n_workers, n_rounds=args.n_rounds,
+                   max_steps=args.max_steps, time_limit=args.time_limit, seed=args.seed, output=args.output,
+                   overwrite=args.overwrite, save_matches=args.save_matches)
+
+    """
+    Example execution:
+        python run_tournament.py tournament_agents --n_workers=32 --time_limit=300
+        python run_tournament.py tournament_agents --teams 46 47 --n_rounds=5 --output=results.jsonl
+
+    Running the same command again after an interruption, or with more teams, plays only the missing matches.
+    """
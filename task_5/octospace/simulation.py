@@ -8,14 +8,15 @@ import octospace
 import pygame
 
 from dummy_agent import Agent
+from octospace.envs.video import VideoRecorder
 
 
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 
-def setup_agent(agent_class: Agent.__class__, player_id: int, side: int):
+def setup_agent(agent_class: Agent.__class__, player_id: int, side: int, agents_dir: str = "task_5/octospace/agents"):
     agent = agent_class(side=side)
-    agent.load(os.path.abspath(f"task_5/octospace/agents/{player_id}/"))
+    agent.load(os.path.abspath(os.path.join(agents_dir, f"{player_id}/")))
     agent.to(DEVICE)
     agent.eval()
     return agent
@@ -30,12 +31,39 @@ def simulate_game(
     render_mode: str = "human",
     verbose: bool = False,
     turn_on_music: bool = False,
+    record: str = None,
 ):
     if not verbose:
         gym.logger.min_level = 40
 
+    # Recorded frames are rendered headless
+    if record is not None:
+        assert render_mode != "human", "The match can't be recorded while it is rendered to a window"
+        render_mode = "rgb_array"
+
     env = gym.make('OctoSpace-v0', player_1_id=player_1_id, player_2_id=player_2_id, max_steps=2000,
-                   render_mode=render_mode, turn_on_music=turn_on_music, volume=0.1)
+                   render_mode=render_mode, turn_on_music=turn_on_music, volume=0.1,
+                   renderer="numpy" if record is not None else "pygame")
+    recorder = VideoRecorder(record, fps=env.metadata["render_fps"]) if record is not None else None
+    try:
+        return _play_games(env=env, player_1_id=player_1_id, player_2_id=player_2_id,
+                           player_1_agent_class=player_1_agent_class, player_2_agent_class=player_2_agent_class,
+                           n_games=n_games, render_mode=render_mode, recorder=recorder)
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+
+def _play_games(
+    env: gym.Env,
+    player_1_id: int,
+    player_2_id: int,
+    player_1_agent_class: Agent.__class__,
+    player_2_agent_class: Agent.__class__,
+    n_games: int,
+    render_mode: str,
+    recorder: VideoRecorder = None,
+):
     obs, info = env.reset()
 
     agent_1 = setup_agent(agent_class=player_1_agent_class, player_id=player_1_id, side=0)
@@ -50,7 +78,7 @@ def simulate_game(
     info1 = None
     info2 = None
 
-    while True or curr_round / 2 != n_games:
+    while curr_round / 2 != n_games:
         if terminated or sum(reward.values()) != 0:
             curr_round += 1
             score += np.array(list(reward.values()))
@@ -69,7 +97,9 @@ def simulate_game(
 
             curr_round += 1
 
-        env.render()
+        frame = env.render()
+        if recorder is not None:
+            recorder.add_frame(frame)
 
         action_1 = agent_1.get_action(obs["player_1"], info1)
         action_2 = agent_2.get_action(obs["player_2"], info2)
@@ -97,7 +127,7 @@ def simulate_game(
             "actions": action_2
         }
 
-        if render_mode is not None:
+        if render_mode == "human":
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     return -1
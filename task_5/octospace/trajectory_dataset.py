@@ -0,0 +1,341 @@
+import argparse
+import collections
+import concurrent.futures
+import functools
+import glob
+import json
+import multiprocessing
+import os
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+from octospace.envs.match_recording import MatchReplay
+from utils import obs_to_states, action_to_val
+
+
+INDEX_VERSION = 1
+STATE_DIM = 28
+
+# Columns of the dataset, one row per ship per turn: the same experiences as in the replay buffer of the DQN agent,
+# and where they come from (index of the game in the index file, turn, player 0 or 1 and id of the ship)
+COLUMNS = {
+    "states": ((STATE_DIM,), np.float32),
+    "actions": ((), np.int64),
+    "rewards": ((), np.float32),
+    "next_states": ((STATE_DIM,), np.float32),
+    "dones": ((), np.float32),
+    "games": ((), np.int32),
+    "turns": ((), np.int16),
+    "players": ((), np.int8),
+    "ship_ids": ((), np.int32),
+}
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Build an offline dataset of the ships\' experiences (e.g. for behaviour '
+                                                 'cloning) from recorded or freshly played games')
+    parser.add_argument('output', type=str, help='Directory of the dataset')
+    parser.add_argument('--recordings', type=str, nargs='*', default=[], help='Matches recorded with MatchRecorder '
+                                                                              '(.npz files or directories with them)')
+    parser.add_argument('--agents_dir', type=str, default='tournament_agents', help='Directory with the agents of the '
+                                                                                    'teams playing the new games')
+    parser.add_argument('--player_ids', type=int, nargs=2, default=[46, 47], help='Ids of the teams playing the new games')
+    parser.add_argument('--n_games', type=int, default=0, help='Number of new games, they are recorded into the '
+                                                               'recordings directory of the dataset')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the maps of the new games')
+    parser.add_argument('--max_steps', type=int, default=2000, help='Number of steps, after which the game ends in a draw')
+    parser.add_argument('--time_limit', type=float, default=600, help='Time limit of a new game in seconds')
+    parser.add_argument('--n_workers', type=int, default=os.cpu_count(), help='Number of games played or converted in parallel')
+    parser.add_argument('--shard_size', type=int, default=500_000, help='Number of rows in a shard of the dataset')
+    return parser
+
+
+def _get_ships_states(obs: dict, side: int) -> tuple:
+    return np.array([ship[0] for ship in obs["allied_ships"]], dtype=int), obs_to_states(obs, side)
+
+
+def _get_ships_actions(ship_ids: np.ndarray, commands: dict) -> np.ndarray:
+    # Commands executed by the ships (see OctoSpaceEnv._get_executed_commands), ships without one get the action -1
+    actions = [action_to_val(commands[ship_id]) if ship_id in commands else None for ship_id in ship_ids.tolist()]
+    return np.array([-1 if action is None else action for action in actions], dtype=np.int64)
+
+
+def recording_transitions(path: str) -> dict:
+    """
+    Replays a recorded match headless and converts it into the experiences of the ships of both players
+
+    The state of a ship is its feature vector (see obs_to_states) before the turn, the next state is the one after the
+    turn (zeros if the ship was destroyed or the game has ended), the action is its executed command (the 1st valid
+    firing command, otherwise the 1st valid movement command) encoded with action_to_val.
+
+    :return: columns of the experiences (see COLUMNS), without the games column
+    """
+    replay = MatchReplay(path)
+    env = replay.seek(replay.first_turn)
+    # Features are computed only from the ships and planets, so the maps of the players aren't copied
+    obs = env._get_units_obs()
+    ships = [_get_ships_states(obs[f"player_{side + 1}"], side) for side in range(2)]
+
+    columns = {column: [] for column in COLUMNS if column != "games"}
+    for turn in range(replay.first_turn, replay.last_turn):
+        actions = replay.actions(turn)
+        info = env._step_game(actions)
+        commands = env._get_executed_commands()
+        obs = env._get_units_obs()
+        done = env.terminated or any(env.victorious_player)
+
+        for side in range(2):
+            player = f"player_{side + 1}"
+            ship_ids, states = ships[side]
+            next_ship_ids, next_states = _get_ships_states(obs[player], side)
+
+            # Destroyed ships end their trajectories
+            positions = {ship_id: position for position, ship_id in enumerate(next_ship_ids.tolist())}
+            alive = np.array([ship_id in positions for ship_id in ship_ids.tolist()], dtype=bool)
+            ships_next_states = np.zeros_like(states)
+            if not done:
+                ships_next_states[alive] = next_states[[positions[ship_id] for ship_id in ship_ids[alive].tolist()]]
+
+            columns["states"].append(states)
+            columns["actions"].append(_get_ships_actions(ship_ids, commands[side + 1]))
+            columns["rewards"].append(np.array([info[side + 1].get(ship_id, 0.0) for ship_id in ship_ids.tolist()]))
+            columns["next_states"].append(ships_next_states)
+            columns["dones"].append(done | ~alive)
+            columns["turns"].append(np.full(len(ship_ids), turn))
+            columns["players"].append(np.full(len(ship_ids), side))
+            columns["ship_ids"].append(ship_ids)
+            ships[side] = next_ship_ids, next_states
+
+        if done:
+            break
+
+    env.close()
+    return {column: np.concatenate(values).astype(COLUMNS[column][1]).reshape(-1, *COLUMNS[column][0])
+            if values else np.zeros((0, *COLUMNS[column][0]), dtype=COLUMNS[column][1])
+            for column, values in columns.items()}
+
+
+class ShardWriter:
+    """
+    Writes the rows of the dataset into shards of shard_size rows, every column of a shard is a separate .npy file
+    (e.g. shard_00000/states.npy), which can be memory-mapped. The index.json file lists the shards and the games,
+    it is rewritten after every shard, so an interrupted build leaves a valid dataset of the finished shards.
+
+    Args:
+        path: directory of the dataset
+        shard_size: number of rows in a shard, the last shard can be smaller
+    """
+
+    def __init__(self, path: str, shard_size: int = 500_000):
+        self.path = path
+        self.shard_size = shard_size
+        self.index = {
+            "version": INDEX_VERSION,
+            "columns": {column: {"shape": list(shape), "dtype": np.dtype(dtype).str} for column, (shape, dtype) in COLUMNS.items()},
+            "shards": [],
+            "games": []
+        }
+        self._buffer = {column: [] for column in COLUMNS}
+        self._n_buffered = 0
+        self._n_rows = 0
+        os.makedirs(path, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add_game(self, columns: dict, **meta):
+        """
+        Adds the experiences of a game (see recording_transitions), the meta information is saved in the index
+        """
+        n_rows = len(columns["states"])
+        game = len(self.index["games"])
+        self.index["games"].append({**meta, "rows": [self._n_rows, self._n_rows + n_rows]})
+        columns = {**columns, "games": np.full(n_rows, game, dtype=COLUMNS["games"][1])}
+        for column in COLUMNS:
+            self._buffer[column].append(columns[column])
+        self._n_rows += n_rows
+        self._n_buffered += n_rows
+
+        while self._n_buffered >= self.shard_size:
+            self._write_shard(self.shard_size)
+
+    def close(self):
+        if self._n_buffered:
+            self._write_shard(self._n_buffered)
+        self._write_index()
+
+    def _write_shard(self, n_rows: int):
+        name = f"shard_{len(self.index['shards']):05d}"
+        os.makedirs(os.path.join(self.path, name), exist_ok=True)
+        for column in COLUMNS:
+            values = np.concatenate(self._buffer[column])
+            np.save(os.path.join(self.path, name, f"{column}.npy"), values[:n_rows])
+            self._buffer[column] = [values[n_rows:]]
+        self._n_buffered -= n_rows
+
+        self.index["shards"].append({"name": name, "rows": n_rows})
+        self._write_index()
+
+    def _write_index(self):
+        # Written into a temporary file first, so the index is never left half-written
+        filename = os.path.join(self.path, "index.json")
+        with open(filename + ".tmp", "w") as f:
+            json.dump(self.index, f)
+        os.replace(filename + ".tmp", filename)
+
+
+class TrajectoryDataset(Dataset):
+    """
+    Dataset of the experiences written by build_dataset. The shards are memory-mapped, so rows are read directly from
+    the files, without any decoding, and the dataset can be larger than the memory.
+
+    An item is a tuple of tensors of the given columns. Indexing with a sequence of indices returns a whole batch at
+    once, e.g. DataLoader(dataset, sampler=BatchSampler(RandomSampler(dataset), 256, drop_last=False), batch_size=None)
+
+    Args:
+        path: directory of the dataset
+        columns: returned columns, by default the same as sampled from the replay buffer of the DQN agent
+    """
+
+    def __init__(self, path: str, columns: tuple = ("states", "actions", "rewards", "next_states", "dones")):
+        self.path = path
+        self.columns = columns
+        with open(os.path.join(path, "index.json")) as f:
+            self.index = json.load(f)
+        assert self.index["version"] == INDEX_VERSION, f"Unsupported version of the dataset: {self.index['version']}"
+
+        self._offsets = np.concatenate([[0], np.cumsum([shard["rows"] for shard in self.index["shards"]])]).astype(int)
+        # Memory maps are opened lazily, so every worker of a DataLoader opens its own ones
+        self._arrays = None
+
+    def __getstate__(self):
+        return {**self.__dict__, "_arrays": None}
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def __getitem__(self, index) -> tuple:
+        arrays = self._get_arrays()
+        if np.ndim(index) == 0:
+            index = int(index) + len(self) if index < 0 else int(index)
+            shard = np.searchsorted(self._offsets, index, side="right") - 1
+            return tuple(torch.from_numpy(np.array(arrays[column][shard][index - self._offsets[shard]]))
+                         for column in self.columns)
+
+        indices = np.asarray(index, dtype=int) % len(self)
+        shards = np.searchsorted(self._offsets, indices, side="right") - 1
+        rows = indices - self._offsets[shards]
+        batch = []
+        for column in self.columns:
+            spec = self.index["columns"][column]
+            values = np.empty((len(indices), *spec["shape"]), dtype=spec["dtype"])
+            for shard in np.unique(shards):
+                # Sorted rows read the memory-mapped file sequentially
+                selected = np.flatnonzero(shards == shard)
+                selected = selected[np.argsort(rows[selected])]
+                values[selected] = arrays[column][shard][rows[selected]]
+            batch.append(torch.from_numpy(values))
+        return tuple(batch)
+
+    def _get_arrays(self) -> dict:
+        if self._arrays is None:
+            self._arrays = {column: [np.load(os.path.join(self.path, shard["name"], f"{column}.npy"), mmap_mode="r")
+                                     for shard in self.index["shards"]]
+                            for column in self.columns}
+        return self._arrays
+
+
+def _find_recordings(recordings: list) -> list:
+    paths = []
+    for path in recordings:
+        paths.extend(sorted(glob.glob(os.path.join(path, "*.npz"))) if os.path.isdir(path) else [path])
+    return paths
+
+
+def _play_games(
+        output: str,
+        agents_dir: str,
+        player_ids: tuple,
+        n_games: int,
+        seed: int,
+        max_steps: int,
+        time_limit: float,
+        n_workers: int
+) -> list:
+    from run_tournament import MatchPool, format_result, _setup_team_agent
+
+    # Both teams play on every map, once on each side
+    matches = collections.deque((player_ids[k % 2], player_ids[1 - k % 2], seed + k // 2) for k in range(n_games))
+    recordings = []
+    with MatchPool(setup_player_agent=functools.partial(_setup_team_agent, agents_dir), n_workers=n_workers,
+                   max_steps=max_steps, time_limit=time_limit, save_matches=os.path.join(output, "recordings")) as pool:
+        while matches or len(pool) > 0:
+            while matches and pool.n_busy < pool.n_workers:
+                pool.submit(matches.popleft())
+
+            for result in pool.wait():
+                print(f'{result["player_1_id"]} vs {result["player_2_id"]} (seed {result["seed"]}): '
+                      + format_result(result))
+                # Matches which failed (or were forfeited) before the game started have no recording
+                if "recording" in result:
+                    recordings.append(result["recording"])
+    return sorted(recordings)
+
+
+def build_dataset(
+        output: str,
+        recordings: list = (),
+        agents_dir: str = 'tournament_agents',
+        player_ids: tuple = (46, 47),
+        n_games: int = 0,
+        seed: int = 0,
+        max_steps: int = 2000,
+        time_limit: float = 600,
+        n_workers: int = None,
+        shard_size: int = 500_000
+) -> dict:
+    """
+    Builds the dataset from the recorded matches and n_games new games played by the agents of the given teams
+
+    :return: index of the dataset
+    """
+    n_workers = n_workers or os.cpu_count()
+    paths = _find_recordings(recordings)
+    if n_games > 0:
+        paths += _play_games(output, agents_dir=agents_dir, player_ids=player_ids, n_games=n_games, seed=seed,
+                             max_steps=max_steps, time_limit=time_limit, n_workers=n_workers)
+
+    # Games are converted in parallel, but written in the order of the recordings
+    with ShardWriter(output, shard_size=shard_size) as writer, concurrent.futures.ProcessPoolExecutor(
+            max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        for path, columns in zip(paths, executor.map(recording_transitions, paths)):
+            writer.add_game(columns, recording=path)
+            print(f'{path}: {len(columns["states"])} experiences')
+
+    print(f'Saved {sum(shard["rows"] for shard in writer.index["shards"])} experiences of {len(paths)} games '
+          f'in {len(writer.index["shards"])} shards to {output}')
+    return writer.index
+
+
+if __name__ == '__main__':
+    parse = get_parser()
+    args = parse.parse_args()
+
+    build_dataset(output=args.output, recordings=args.recordings, agents_dir=args.agents_dir,
+                  player_ids=tuple(args.player_ids), n_games=args.n_games, seed=args.seed, max_steps=args.max_steps,
+                  time_limit=args.time_limit, n_workers=args.n_workers, shard_size=args.shard_size)
+
+    """
+    Example execution:
+        python trajectory_dataset.py dataset --recordings matches --n_workers=32
+        python trajectory_dataset.py dataset --agents_dir=tournament_agents --player_ids 46 47 --n_games=100
+
+    The dataset can be then loaded with:
+        dataset = TrajectoryDataset('dataset')
+        loader = DataLoader(dataset, sampler=BatchSampler(RandomSampler(dataset), 256, drop_last=False), batch_size=None)
+    """
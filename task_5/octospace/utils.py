@@ -1,5 +1,7 @@
 from typing import Tuple
 
+import numpy as np
+
 def get_self_ship(obs: dict, ship_id: int):
     return next((ship for ship in obs["allied_ships"] if ship[0] == ship_id), None)
 
@@ -43,7 +45,7 @@ def get_distance(coords_1, coords_2):
     x_1, y_1 = coords_1
     x_2, y_2 = coords_2
 
-    return (x_2 - x_1) ** 2 - (y_2 - y_1) ** 2
+    return (x_2 - x_1) ** 2 + (y_2 - y_1) ** 2
 
 def get_self_ship_coords(obs: dict, ship_id: int):
     ship = get_self_ship(obs, ship_id)
@@ -172,40 +174,84 @@ def get_self_ship_cooldown(obs: dict, ship_id: int):
     return int(self_ship[5] > 0)
 
 def obs_to_state(obs: dict, ship_id: int, side: int):
+    ship_ids = [ship[0] for ship in get_obs_table(obs, "allied_ships", "n_allied_ships", 6)]
+    return obs_to_states(obs, side)[ship_ids.index(ship_id)].tolist()
+
+def get_obs_table(obs: dict, key: str, n_key: str, n_columns: int):
+    # Observations in the "arrays" mode have tables padded with -1, their lengths are given separately
+    table = np.asarray(obs[key], dtype=int).reshape(-1, n_columns)
+    return table[:obs[n_key]] if n_key in obs else table
+
+def get_nearest_coords(distances: np.ndarray, targets: np.ndarray, default: Tuple[int, int]):
+    # distances: (sources, targets) matrix, missing targets have infinite distances
+    if distances.shape[1] == 0:
+        return np.broadcast_to(default, (len(distances), 2))
+
+    nearest = np.argmin(distances, axis=1)
+    found = np.isfinite(distances[np.arange(len(distances)), nearest])
+    return np.where(found[:, None], targets[nearest], default)
+
+def get_squared_distances(coords_1: np.ndarray, coords_2: np.ndarray):
+    return ((coords_1[:, None, :] - coords_2[None, :, :]) ** 2).sum(axis=2).astype(float)
+
+def get_base_planet_occupation(planets: np.ndarray, base_coords: Tuple[int, int], default: int):
+    base_planet = planets[(planets[:, 0] == base_coords[0]) & (planets[:, 1] == base_coords[1])]
+    return base_planet[0, 2] if len(base_planet) else default
+
+def obs_to_states(obs: dict, side: int, distance: int = 8):
+    """
+    Returns the states of all allied ships (in the order of obs["allied_ships"]) as an array of shape (n_ships, 28),
+    computing the features of all ships at once from the pairwise distance matrices
+    """
     self_base_coords = (9, 9) if side == 0 else (90, 90)
     enemy_base_coords = (90, 90) if side == 0 else (9, 9)
-
-    # print(list(map(len, [
-    #     get_self_ship_coords(obs, ship_id),
-    # self_base_coords,
-    # get_nearest_allied_ship_coords(obs, ship_id, side),
-    # get_nearest_enemy_ship_coords(obs, ship_id, side),
-    # get_nearest_unoccupied_planet_coords(obs, ship_id, enemy_base_coords),
-    # get_nearest_allied_planet_coords(obs, side, ship_id, self_base_coords),
-    # get_nearest_enemy_planet_coords(obs, side, ship_id, enemy_base_coords),
-    # enemy_base_coords,
-    # is_enemy_in_range(obs, ship_id)
-    # ])))
-
-    return [
-        *get_self_ship_coords(obs, ship_id),
-        *self_base_coords,
-        *get_nearest_allied_ship_coords(obs, ship_id, side),
-        *get_nearest_enemy_ship_coords(obs, ship_id, side),
-        *get_nearest_unoccupied_planet_coords(obs, ship_id, enemy_base_coords),
-        *get_nearest_allied_planet_coords(obs, side, ship_id, self_base_coords),
-        *get_nearest_enemy_planet_coords(obs, side, ship_id, enemy_base_coords),
-        *enemy_base_coords,
-        *is_enemy_in_range(obs, ship_id),
-        get_self_ship_health(obs, ship_id),
-        get_self_base_planet_health(obs, side, self_base_coords),
-        get_enemy_base_planet_health(obs, side, enemy_base_coords),
-        get_enemy_ships_count(obs),
-        get_allied_ships_count(obs, ship_id),
-        get_enemy_planets_count(obs, side),
-        get_allied_planets_count(obs, side),
-        get_self_ship_cooldown(obs, ship_id)
-    ]
+    missing_ship_coords = (9999, 9999) if side == 0 else (-9999, -9999)
+
+    allied_ships = get_obs_table(obs, "allied_ships", "n_allied_ships", 6)
+    enemy_ships = get_obs_table(obs, "enemy_ships", "n_enemy_ships", 6)
+    planets = get_obs_table(obs, "planets_occupation", "n_planets", 3)
+
+    # Unoccupied planets count as planets of the 1st player
+    player_1_planets = planets[planets[:, 2] < 50]
+    player_2_planets = planets[planets[:, 2] >= 50]
+    allied_planets, enemy_planets = (player_1_planets, player_2_planets) if side == 0 else (player_2_planets, player_1_planets)
+    unoccupied_planets = planets[planets[:, 2] == -1]
+
+    coords = allied_ships[:, 1:3]
+    enemy_coords = enemy_ships[:, 1:3]
+    states = np.empty((len(allied_ships), 28), dtype=np.float32)
+    states[:, 0:2] = coords
+    states[:, 2:4] = self_base_coords
+
+    # Ships aren't their own nearest allies
+    allied_distances = get_squared_distances(coords, coords)
+    np.fill_diagonal(allied_distances, np.inf)
+    states[:, 4:6] = get_nearest_coords(allied_distances, coords, missing_ship_coords)
+    states[:, 6:8] = get_nearest_coords(get_squared_distances(coords, enemy_coords), enemy_coords, missing_ship_coords)
+
+    for e, (collection, default) in enumerate([(unoccupied_planets, enemy_base_coords), (allied_planets, self_base_coords),
+                                               (enemy_planets, enemy_base_coords)]):
+        states[:, 8 + 2 * e:10 + 2 * e] = get_nearest_coords(get_squared_distances(coords, collection[:, :2]),
+                                                             collection[:, :2], default)
+    states[:, 14:16] = enemy_base_coords
+
+    # Enemies in the firing range in the directions [N, S, W, E]
+    dx = enemy_coords[None, :, 0] - coords[:, None, 0]
+    dy = enemy_coords[None, :, 1] - coords[:, None, 1]
+    states[:, 16] = ((dx == 0) & (0 < -dy) & (-dy <= distance)).any(axis=1)
+    states[:, 17] = ((dx == 0) & (0 < dy) & (dy <= distance)).any(axis=1)
+    states[:, 18] = ((dy == 0) & (0 < -dx) & (-dx <= distance)).any(axis=1)
+    states[:, 19] = ((dy == 0) & (0 < dx) & (dx <= distance)).any(axis=1)
+
+    states[:, 20] = allied_ships[:, 4]
+    states[:, 21] = get_base_planet_occupation(allied_planets, self_base_coords, default=0)
+    states[:, 22] = get_base_planet_occupation(enemy_planets, enemy_base_coords, default=100)
+    states[:, 23] = len(enemy_ships)
+    states[:, 24] = len(allied_ships) - 1
+    states[:, 25] = len(enemy_planets)
+    states[:, 26] = len(allied_planets)
+    states[:, 27] = allied_ships[:, 5] > 0
+    return states
 
 def val_to_action(ship_id: int, val: int):
     if val == 0: